@@ -1,21 +1,25 @@
 import os
 from importlib import import_module
 
+import click
 from dotenv import load_dotenv
 from flask import Flask, render_template
 from flask_login import LoginManager
-from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 
-# Load environment variables from the .env file
+# Load environment variables from the .env file, the one place that does, before
+# apps.config and the rest of the package read them
 load_dotenv()
 db = SQLAlchemy()
 login_manager = LoginManager()
 
 
 def register_extensions(app):
-    db.init_app(app)
+    # Pool size, SQLite WAL and the rest of the engine tuning from the config
+    from apps.home import database
+
+    database.init_app(app, db)
     login_manager.init_app(app)
 
 
@@ -26,21 +30,13 @@ def register_blueprints(app):
 
 
 def configure_database(app):
-    @app.before_first_request
-    def initialize_database():
-        try:
-            db.create_all()
-        except Exception as e:
-            print("> Error: DBMS Exception: " + str(e))
-
-            # fallback to SQLite
-            basedir = os.path.abspath(os.path.dirname(__file__))
-            app.config[
-                "SQLALCHEMY_DATABASE_URI"
-            ] = SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
-                basedir, "db.sqlite3"
-            )
-            db.create_all()
+    # The schema is created and migrated by `flask setup-database` before the
+    # workers start, they only prime their connection pool
+    from apps.home.queryplan import query_plan_checker
+    from apps.home.readiness import readiness
+
+    query_plan_checker.init_app(app)
+    readiness.init_app(app)
 
     @app.teardown_request
     def shutdown_session(exception=None):
@@ -49,39 +45,123 @@ def configure_database(app):
 
 def initialize_mail(app):
     # Flask-Mail
-    app.config["MAIL_SERVER"] = "smtp.googlemail.com"
-    app.config["MAIL_PORT"] = 587  # 465
-    app.config["MAIL_USE_TLS"] = True  # False
+    app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER", "smtp.googlemail.com")
+    app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", "587"))  # 465
+    app.config["MAIL_USE_TLS"] = os.getenv("MAIL_USE_TLS", "True") == "True"
     app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
     app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
-    # Initialize Flask-Mail
-    mail = Mail(app)
+    # Flask-Mail itself is set up by the first send, see get_mail
+
+
+def get_mail(app):
+    mail = app.extensions.get("mail")
+    if mail is None:
+        from flask_mail import Mail
+
+        mail = Mail(app)
     return mail
 
 
+def start_background_workers(app):
+    if app.config.get("NOTIFICATION_WORKER", True):
+        from apps.notifications.queue import notification_worker
+
+        # Started from the first request so every forked worker gets its own thread
+        @app.before_request
+        def ensure_notification_worker():
+            notification_worker.ensure_started(app)
+
+    if app.config.get("WEBHOOK_WORKER", True):
+        from apps.home.webhooks import webhook_worker
+
+        @app.before_request
+        def ensure_webhook_worker():
+            webhook_worker.ensure_started(app)
+
+
+def register_commands(app):
+    @app.cli.command("encrypt-account-credentials")
+    @click.option("--rotate", is_flag=True, help="Re-encrypt under the newest key.")
+    def encrypt_account_credentials_command(rotate):
+        """Encrypt monitor account credentials still stored in plain text."""
+        from apps.home.vault import encrypt_stored_credentials
+
+        print(f"> Rewrote {encrypt_stored_credentials(rotate)} monitor accounts")
+
+    @app.cli.command("setup-database")
+    def setup_database_command():
+        """Migrate the schema to the newest revision, run before starting workers."""
+        from apps.home.readiness import SchemaError, setup_database
+
+        try:
+            print(f"> Database at revision {setup_database(app)}")
+        except SchemaError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_command():
+        """Explain the hot queries, failing if any of them scans a whole table."""
+        from apps.home.queryplan import check_hot_queries
+
+        scans = 0
+        for name, (tables, plan) in check_hot_queries().items():
+            scans += bool(tables)
+            print(f"> {'SCAN' if tables else 'ok':<4} {name}: {'; '.join(plan)}")
+        if scans:
+            raise click.ClickException(f"{scans} hot queries scan a whole table")
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Write the hashed, precompressed CSS and JS bundles to static/build."""
+        from apps.home.assets import build_assets
+
+        for name, built in build_assets().items():
+            print(f"> {name} -> build/{built}")
+
+
 def create_app(config):
     app = Flask(__name__)
     app.config.from_object(config)
     register_extensions(app)
-    mail = initialize_mail(app)
+    initialize_mail(app)
     register_blueprints(app)
     configure_database(app)
+    # Compiles the page templates now rather than on their first request
+    from apps.home.pages import page_cache
+
+    page_cache.init_app(app)
+    # Request metrics and sampled profiles, only with PROFILING set
+    from apps.home.profiling import profiler
+
+    profiler.init_app(app)
+    # Statements repeated once per row, with NPLUSONE_LIMIT set
+    from apps.home.nplusone import nplusone_detector
+
+    nplusone_detector.init_app(app)
+    # Templates link the built bundles once `flask build-assets` has run
+    from apps.home import assets
+
+    assets.init_app(app)
+    start_background_workers(app)
+    register_commands(app)
     csrf = CSRFProtect(app)
+    # Stripe authenticates with its signature header instead
+    csrf.exempt("apps.home.routes.stripe_webhook")
 
     @app.errorhandler(404)
     def page_not_found(_):
         return render_template("home/page-404.html"), 404
 
     # Context processor to fetch categories
-    from apps.home.models import User
+    from apps.home.cache import user_summary
     from flask_login import current_user
 
     @app.context_processor
     def inject_categories():
-        # Get company details
-        users = User.query.all()
+        # `users` is lazy, it only hits the database if a template reads it
         return dict(
-            current_user=current_user, users=users  # Making current_user available
+            current_user=current_user,  # Making current_user available
+            users=user_summary,
         )
 
     return app
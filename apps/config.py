@@ -2,10 +2,7 @@ import os
 import random
 import string
 
-from dotenv import load_dotenv
-
-# Load environment variables from the .env file
-load_dotenv()
+# The environment is read from .env once, by the apps package
 
 
 class Config(object):
@@ -21,6 +18,33 @@ class Config(object):
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Deliver queued emails from a background thread in every worker
+    NOTIFICATION_WORKER = os.getenv("NOTIFICATION_WORKER", "True") == "True"
+    # Keep rendered catch-all pages in memory, see apps.home.pages
+    PAGE_CACHE = os.getenv("PAGE_CACHE", "True") == "True"
+
+    # Apply queued Stripe webhook events from a background thread in every worker
+    WEBHOOK_WORKER = os.getenv("WEBHOOK_WORKER", "True") == "True"
+
+    # Open the connection pool when a worker starts, see apps.home.readiness
+    DB_WARMUP = os.getenv("DB_WARMUP", "True") == "True"
+    # Log queries that scan whole tables, see apps.home.queryplan
+    QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "False") == "True"
+    # Per-endpoint latency, SQL and template metrics at /admin/metrics, see
+    # apps.home.profiling
+    PROFILING = os.getenv("PROFILING", "False") == "True"
+    # Share of requests run under cProfile, those slower than PROFILE_SLOW_MS
+    # are kept for /admin/profiles
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+    # Flag requests running one statement more than this many times, usually a
+    # relationship loaded row by row; raises under TESTING, see apps.home.nplusone
+    NPLUSONE_LIMIT = int(os.getenv("NPLUSONE_LIMIT", "0"))
+    # Where the price monitoring page opens the live stream: the reverse
+    # proxy's path on this origin, or the stream's own URL with this origin in
+    # its STREAM_ALLOWED_ORIGINS, see apps.monitor.stream
+    STREAM_URL = os.getenv("STREAM_URL", "/stream")
+
     DB_ENGINE = os.getenv("DB_ENGINE", None)
     DB_USERNAME = os.getenv("DB_USERNAME", None)
     DB_PASS = os.getenv("DB_PASS", None)
@@ -28,6 +52,24 @@ class Config(object):
     DB_PORT = os.getenv("DB_PORT", None)
     DB_NAME = os.getenv("DB_NAME", None)
 
+    # Engine tuning, turned into SQLALCHEMY_ENGINE_OPTIONS by apps.home.database.
+    # Pool settings apply to Postgres/MySQL, each worker process has its own pool
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Below the server's idle timeout (MySQL's wait_timeout defaults to 8 hours)
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+    # Compiled SQL kept per engine
+    DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1000"))
+    # WAL lets readers carry on while one connection writes
+    SQLITE_WAL = os.getenv("SQLITE_WAL", "True") == "True"
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    # Seconds a connection waits on a lock before "database is locked"
+    SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "15"))
+    # Prepared statements kept per connection by the sqlite3 module
+    SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "512"))
+
     USE_SQLITE = True
 
     # try to set up a Relational DBMS
@@ -57,10 +99,19 @@ class ProductionConfig(Config):
     REMEMBER_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_DURATION = 3600
 
+    # Cached pages are stored minified, run.py's Minify skips them
+    MINIFY_HTML = True
+
 
 class DebugConfig(Config):
     DEBUG = True
 
+    # Edited templates should show up on the next reload
+    PAGE_CACHE = False
+
+    QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "True") == "True"
+    NPLUSONE_LIMIT = int(os.getenv("NPLUSONE_LIMIT", "10"))
+
 
 # Load all possible configurations
 config_dict = {"Production": ProductionConfig, "Debug": DebugConfig}
@@ -0,0 +1,209 @@
+"""Hashed, minified and precompressed bundles of the layouts' CSS and JS.
+
+    flask build-assets
+
+writes every bundle in BUNDLES to static/build/ as <name>.<hash>.<ext> with .gz
+and .br siblings, copies the fonts and images the CSS points at the same way,
+and records the names in static/build/manifest.json. Templates load bundles
+through `asset_tags`, which falls back to the separate source files while no
+build exists.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+MANIFEST_PATH = os.path.join(BUILD_DIR, "manifest.json")
+# Hashed names never change content, browsers may keep them for a year
+BUILD_MAX_AGE = 365 * 24 * 3600
+
+# Paths relative to the static folder, in the order the layouts loaded them
+BUNDLES = {
+    "app.css": (
+        "assets/vendor/nucleo/css/nucleo.css",
+        "assets/vendor/@fortawesome/fontawesome-free/css/all.min.css",
+        "assets/css/argon.css",
+    ),
+    "vendor.js": (
+        "assets/vendor/jquery/dist/jquery.min.js",
+        "assets/vendor/bootstrap/dist/js/bootstrap.bundle.min.js",
+        "assets/vendor/js-cookie/js.cookie.js",
+        "assets/vendor/jquery.scrollbar/jquery.scrollbar.min.js",
+        "assets/vendor/jquery-scroll-lock/dist/jquery-scrollLock.min.js",
+    ),
+    # After the page's own scripts, it sets up the charts they define
+    "argon.js": ("assets/js/argon.js",),
+}
+# Worth compressing, fonts like woff2 and images already are
+COMPRESSIBLE = frozenset((".css", ".js", ".svg", ".ttf", ".eot", ".json"))
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _hashed_name(name, content):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _write(name, content, written):
+    """Write a build file with its compressed siblings, returning its name."""
+    path = os.path.join(BUILD_DIR, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    written.add(name)
+    if os.path.splitext(name)[1] not in COMPRESSIBLE:
+        return name
+    import brotli
+
+    for suffix, compressed in (
+        (".gz", gzip.compress(content, compresslevel=9, mtime=0)),
+        (".br", brotli.compress(content, quality=11)),
+    ):
+        if len(compressed) < len(content):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            written.add(name + suffix)
+    return name
+
+
+def _rewrite_urls(css, source, copied, written):
+    # Bundles live in build/, so relative references are copied over next to them
+    directory = os.path.dirname(os.path.join(STATIC_DIR, source))
+
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(("data:", "http:", "https:", "//", "/")):
+            return match.group(0)
+        target, suffix = re.match(r"([^?#]*)(.*)", url).groups()
+        path = os.path.normpath(os.path.join(directory, target))
+        if not os.path.isfile(path):
+            return f"url({os.path.relpath(path, BUILD_DIR)}{suffix})"
+        if path not in copied:
+            with open(path, "rb") as f:
+                content = f.read()
+            copied[path] = _write(
+                _hashed_name(os.path.basename(path), content), content, written
+            )
+        return f"url({copied[path]}{suffix})"
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _minify(name, source, text):
+    if ".min." in source:
+        return text
+    if name.endswith(".css"):
+        from rcssmin import cssmin
+
+        return cssmin(text)
+    from jsmin import jsmin
+
+    return jsmin(text)
+
+
+def build_assets(bundles=BUNDLES):
+    """Build every bundle and swap in a new manifest, returning it.
+
+    Files of the previous build are removed only after the new manifest is in
+    place, so pages rendered just before still find what they link to.
+    """
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    written = set()
+    copied = {}
+    manifest = {}
+    for name, sources in bundles.items():
+        parts = []
+        for source in sources:
+            path = os.path.join(STATIC_DIR, source)
+            # The layouts linked it all the same, so leave it out as they would
+            if not os.path.isfile(path):
+                logging.warning(f"{name}: {source} not found, left out")
+                continue
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            if name.endswith(".css"):
+                text = _rewrite_urls(text, source, copied, written)
+            parts.append(_minify(name, source, text))
+        # A lone statement at the end of one script must not run into the next
+        content = (";\n" if name.endswith(".js") else "\n").join(parts).encode()
+        manifest[name] = _write(_hashed_name(name, content), content, written)
+
+    partial = MANIFEST_PATH + ".tmp"
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(partial, MANIFEST_PATH)
+    written.add(os.path.basename(MANIFEST_PATH))
+    for stale in set(os.listdir(BUILD_DIR)) - written:
+        os.remove(os.path.join(BUILD_DIR, stale))
+    return manifest
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _tag(url, name):
+    url = escape(url)
+    if name.endswith(".css"):
+        return f'<link rel="stylesheet" href="{url}" type="text/css">'
+    return f'<script src="{url}"></script>'
+
+
+def init_app(app, manifest=None):
+    manifest = load_manifest() if manifest is None else manifest
+
+    def asset_tags(name):
+        if name in manifest:
+            urls = [url_for("static", filename=f"build/{manifest[name]}")]
+        else:
+            urls = [url_for("static", filename=source) for source in BUNDLES[name]]
+        return Markup("\n  ".join(_tag(url, name) for url in urls))
+
+    app.jinja_env.globals["asset_tags"] = asset_tags
+
+    send_static = app.view_functions["static"]
+    # The bundles and everything they point at
+    built = {
+        f"build/{name}"
+        for name in (os.listdir(BUILD_DIR) if manifest else ())
+        if not name.endswith((".gz", ".br", ".json"))
+    }
+
+    def static(filename):
+        if filename not in built:
+            return send_static(filename=filename)
+        name = filename[len("build/") :]
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        encodings = request.accept_encodings
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encodings[encoding] and os.path.isfile(
+                os.path.join(BUILD_DIR, name + suffix)
+            ):
+                response = send_from_directory(
+                    BUILD_DIR, name + suffix, mimetype=mimetype, max_age=BUILD_MAX_AGE
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(
+                BUILD_DIR, name, mimetype=mimetype, max_age=BUILD_MAX_AGE
+            )
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = static
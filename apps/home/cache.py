@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+
+# Other workers keep their own copy, so even without an explicit invalidation a
+# stale summary never outlives this many seconds
+USER_SUMMARY_TTL = 60
+
+
+class UserSummaryRow:
+    __slots__ = (
+        "id",
+        "first_name",
+        "last_name",
+        "username",
+        "email",
+        "is_active",
+        "is_admin",
+    )
+
+    def __init__(self, id, first_name, last_name, username, email, is_active, is_admin):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.username = username
+        self.email = email
+        self.is_active = is_active
+        self.is_admin = is_admin
+
+    def __repr__(self):
+        return str(self.username)
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+class UserSummary:
+    """A lazily loaded, cached, read-only list of every user.
+
+    It is handed to every template as `users` but only queries the database the
+    first time a template actually iterates, indexes or sizes it.
+    """
+
+    def __init__(self, ttl=USER_SUMMARY_TTL):
+        self.ttl = ttl
+        self._rows = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._rows = None
+
+    def _load(self):
+        from apps.home.models import User
+
+        query = User.query.with_entities(
+            User.id,
+            User.first_name,
+            User.last_name,
+            User.username,
+            User.email,
+            User.is_active,
+            User.is_admin,
+        ).order_by(User.id)
+        return [UserSummaryRow(*row) for row in query]
+
+    @property
+    def rows(self):
+        rows = self._rows
+        if rows is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return rows
+        with self._lock:
+            if self._rows is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._rows = self._load()
+                self._loaded_at = time.monotonic()
+            return self._rows
+
+    @property
+    def is_loaded(self):
+        return self._rows is not None
+
+    @property
+    def admins(self):
+        return [row for row in self.rows if row.is_admin]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __bool__(self):
+        return bool(self.rows)
+
+
+user_summary = UserSummary()
+
+
+def invalidate_user_summary():
+    user_summary.invalidate()
+
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class AuthenticatedUser:
+    """A detached, read-only snapshot of a `User` for `current_user`.
+
+    It carries the columns the pages and permission checks read, anything else
+    that exists on `User` (relationships, the password) loads the full row.
+    The snapshot is shared by every request in the process, so that row is kept
+    on `flask.g`, attached to the session of the request that asked for it.
+    """
+
+    __slots__ = (
+        "id",
+        "first_name",
+        "last_name",
+        "username",
+        "email",
+        "biography",
+        "house_address",
+        "is_active",
+        "is_admin",
+    )
+
+    def __init__(self, user):
+        self.id = user.id
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        self.username = user.username
+        self.email = user.email
+        self.biography = user.biography
+        self.house_address = user.house_address
+        self.is_active = user.is_active
+        self.is_admin = user.is_admin
+
+    def __repr__(self):
+        return str(self.username)
+
+    def __getattr__(self, name):
+        from apps import db
+        from apps.home.models import User
+
+        if name.startswith("_") or not hasattr(User, name):
+            raise AttributeError(name)
+        models = g.setdefault("user_models", {})
+        model = models.get(self.id)
+        if model is None:
+            model = models[self.id] = db.session.get(User, self.id)
+        return getattr(model, name)
+
+    def __eq__(self, other):
+        return isinstance(other, AuthenticatedUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+class UserCache:
+    """Per-process LRU of `AuthenticatedUser` snapshots with a TTL.
+
+    The TTL bounds how long another worker can serve a snapshot this worker has
+    already invalidated.
+    """
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                snapshot, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return snapshot
+                self._discard(user_id)
+            self.misses += 1
+            return None
+
+    def _put(self, user):
+        snapshot = AuthenticatedUser(user)
+        with self._lock:
+            self._discard(snapshot.id)
+            self._entries[snapshot.id] = (snapshot, time.monotonic() + self.ttl)
+            self._ids_by_username[snapshot.username.lower()] = snapshot.id
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+        return snapshot
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_username.pop(entry[0].username.lower(), None)
+
+    def get(self, user_id):
+        """The snapshot for `user_id`, loading it on a miss."""
+        from apps.home.models import User
+
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        snapshot = self._get(user_id)
+        if snapshot is not None:
+            return snapshot
+        user = User.query.get(user_id)
+        return self._put(user) if user else None
+
+    def get_by_username(self, username):
+        """The snapshot for `username`, ignoring case like the login form does."""
+        from apps.home.models import User
+
+        user_id = self._ids_by_username.get(username.lower())
+        if user_id is not None:
+            snapshot = self._get(user_id)
+            if snapshot is not None:
+                return snapshot
+        else:
+            with self._lock:
+                self.misses += 1
+        user = User.by_username(username)
+        return self._put(user) if user else None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._discard(int(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_username.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(user_id):
+    user_cache.invalidate(user_id)
@@ -0,0 +1,71 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+SQLITE_SYNCHRONOUS_MODES = frozenset(("OFF", "NORMAL", "FULL", "EXTRA"))
+
+
+def is_sqlite(config):
+    return make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == "sqlite"
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS win over the DB_* and
+    SQLITE_* settings.
+    """
+    options = {"query_cache_size": config.get("DB_QUERY_CACHE_SIZE", 1000)}
+    if is_sqlite(config):
+        # One file, no server to lose connections to, pool settings don't apply
+        options["connect_args"] = {
+            "timeout": config.get("SQLITE_BUSY_TIMEOUT", 15),
+            "cached_statements": config.get("SQLITE_CACHED_STATEMENTS", 512),
+        }
+    else:
+        options.update(
+            pool_size=config.get("DB_POOL_SIZE", 5),
+            max_overflow=config.get("DB_MAX_OVERFLOW", 10),
+            pool_timeout=config.get("DB_POOL_TIMEOUT", 30),
+            pool_recycle=config.get("DB_POOL_RECYCLE", 1800),
+            pool_pre_ping=config.get("DB_POOL_PRE_PING", True),
+        )
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    return options
+
+
+def sqlite_pragmas(wal=True, synchronous="NORMAL"):
+    """A connect listener setting the journal and sync mode on new connections.
+
+    In WAL mode readers see the last commit while a writer works, instead of
+    waiting for its lock. NORMAL only syncs at checkpoints, a power cut can lose
+    the last commits but never corrupts the file.
+    """
+    synchronous = synchronous.upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS mode: {synchronous}")
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            # Stored in the file, repeating it on a WAL database changes nothing
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+
+    return set_pragmas
+
+
+def init_app(app, db):
+    """Configure the engine options, then create the engine with `db`."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    db.init_app(app)
+    if is_sqlite(app.config):
+        with app.app_context():
+            event.listen(
+                db.engine,
+                "connect",
+                sqlite_pragmas(
+                    app.config.get("SQLITE_WAL", True),
+                    app.config.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+                ),
+            )
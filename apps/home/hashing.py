@@ -0,0 +1,136 @@
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Stored hashes look like b"$pbkdf2-sha512$<rounds>$<salt>$<hex digest>". Hashes
+# written before the format was versioned are a bare 64 char salt + hex digest.
+HASH_ALGORITHM = "pbkdf2-sha512"
+HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "100000"))
+LEGACY_ROUNDS = 100000
+
+# 0 workers hashes inline in the calling thread
+HASH_POOL_WORKERS = int(
+    os.getenv("HASH_POOL_WORKERS", str(min(2, os.cpu_count() or 1)))
+)
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", "32"))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "5"))
+
+_ALGORITHMS = {"pbkdf2-sha512": "sha512", "pbkdf2-sha256": "sha256"}
+
+
+class HashingBusy(Exception):
+    """Raised instead of queueing when the hashing pool is saturated."""
+
+
+def _pbkdf2(algorithm, password, salt, rounds):
+    digest = hashlib.pbkdf2_hmac(
+        _ALGORITHMS[algorithm], password.encode("utf-8"), salt.encode("ascii"), rounds
+    )
+    return binascii.hexlify(digest).decode("ascii")
+
+
+def _new_salt():
+    return hashlib.sha256(os.urandom(60)).hexdigest()
+
+
+def parse_hash(stored_password):
+    """Split a stored hash into (algorithm, rounds, salt, hex digest)."""
+    if isinstance(stored_password, (bytes, bytearray, memoryview)):
+        stored_password = bytes(stored_password).decode("ascii")
+    if stored_password.startswith("$"):
+        _, algorithm, rounds, salt, digest = stored_password.split("$")
+        return algorithm, int(rounds), salt, digest
+    return HASH_ALGORITHM, LEGACY_ROUNDS, stored_password[:64], stored_password[64:]
+
+
+def format_hash(algorithm, rounds, salt, digest):
+    return f"${algorithm}${rounds}${salt}${digest}".encode("ascii")
+
+
+def needs_rehash(stored_password):
+    """True when the hash is legacy or weaker than the current settings."""
+    if not bytes(stored_password).startswith(b"$"):
+        return True
+    algorithm, rounds, _, _ = parse_hash(stored_password)
+    return algorithm != HASH_ALGORITHM or rounds < HASH_ROUNDS
+
+
+def hash_password(password, algorithm=HASH_ALGORITHM, rounds=HASH_ROUNDS):
+    salt = _new_salt()
+    return format_hash(
+        algorithm, rounds, salt, _pbkdf2(algorithm, password, salt, rounds)
+    )
+
+
+def verify_password(provided_password, stored_password):
+    algorithm, rounds, salt, digest = parse_hash(stored_password)
+    candidate = _pbkdf2(algorithm, provided_password, salt, rounds)
+    return hmac.compare_digest(candidate, digest)
+
+
+class HashingService:
+    """A small process pool that keeps PBKDF2 off the request workers.
+
+    At most `queue_depth` jobs may be in flight, anything beyond that raises
+    `HashingBusy` straight away so the caller can answer 503 instead of piling
+    up behind a login burst.
+    """
+
+    def __init__(
+        self,
+        workers=HASH_POOL_WORKERS,
+        queue_depth=HASH_QUEUE_DEPTH,
+        timeout=HASH_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    @property
+    def pool(self):
+        # gunicorn forks after import, so every worker process builds its own pool
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Password hashing queue is full")
+        try:
+            future = self.pool.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingBusy("Password hashing timed out")
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, provided_password, stored_password):
+        return self._run(verify_password, provided_password, bytes(stored_password))
+
+    def shutdown(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+hashing_service = HashingService()
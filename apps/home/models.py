@@ -1,8 +1,18 @@
 from flask_login import UserMixin
 from apps import db, login_manager
 from apps.home.util import hash_pass
+from apps.home.cache import invalidate_user, user_cache
+from apps.home.vault import credential_vault, encrypt_secret
+from apps.monitor.engine import normalize_exchange, parse_symbols
 from datetime import datetime
+from itertools import chain
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import Session, selectinload, validates
+
+
+def lower_username(context):
+    # For Core inserts, ORM writes go through User.validate_username
+    return context.get_current_parameters()["username"].lower()
 
 
 class User(db.Model, UserMixin):
@@ -13,6 +23,11 @@ class User(db.Model, UserMixin):
     last_name = db.Column(db.String(128), unique=False, nullable=False)
     email = db.Column(db.String(128), nullable=False, unique=True, index=True)
     username = db.Column(db.String(128), nullable=False, unique=True, index=True)
+    # Logins match usernames case-insensitively through this column's index,
+    # not unique as accounts differing only in case may already exist
+    username_lower = db.Column(
+        db.String(128), nullable=False, index=True, default=lower_username
+    )
     biography = db.Column(db.String(256), nullable=False, unique=False, index=False)
     house_address = db.Column(db.String(256), unique=False, nullable=True)
     is_active = db.Column(db.Boolean, unique=False, nullable=True, default=True)
@@ -54,20 +69,39 @@ class User(db.Model, UserMixin):
     def __repr__(self):
         return str(self.username)
 
+    @validates("username")
+    def validate_username(self, key, username):
+        self.username_lower = username.lower()
+        return username
+
+    @classmethod
+    def by_username(cls, username):
+        """The user with this username, ignoring case."""
+        return cls.query.filter_by(username_lower=username.lower()).first()
+
+    # Everything `format` reads, listings select just these instead of whole rows
+    FORMAT_COLUMNS = (
+        "id",
+        "first_name",
+        "last_name",
+        "username",
+        "email",
+        "house_address",
+        "is_active",
+        "is_admin",
+    )
+
     def format(self):
-        return {
-            "id": self.id,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "username": self.username,
-            "email": self.email,
-            "house_address": self.house_address,
-            "is_active": self.is_active,
-            "is_admin": self.is_admin,
-        }
+        return {column: getattr(self, column) for column in self.FORMAT_COLUMNS}
+
+    @classmethod
+    def format_columns(cls):
+        return [getattr(cls, column) for column in cls.FORMAT_COLUMNS]
 
     def set_password(self, plain_password):
         self.password = hash_pass(plain_password)
+        if self.id is not None:
+            invalidate_user(self.id)
 
     def get_id(self):
         return str(self.id)
@@ -80,21 +114,39 @@ class User(db.Model, UserMixin):
 class UserAccountMonitor(db.Model):
     __tablename__ = "jd_monitor_accounts"
     ID = db.Column(db.Integer, primary_key=True, unique=True, index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("jd_users.id"), nullable=False)
-    api_key = db.Column(db.String(256), nullable=False, unique=False)
-    secret_key = db.Column(db.String(256), nullable=False, unique=False)
-    passphrase = db.Column(db.String(128), nullable=False, unique=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("jd_users.id"), nullable=False, index=True
+    )
+    # The credentials are Fernet tokens, set them with `set_credentials`
+    api_key = db.Column(db.String(512), nullable=False, unique=False)
+    secret_key = db.Column(db.String(512), nullable=False, unique=False)
+    passphrase = db.Column(db.String(256), nullable=False, unique=False)
     exchange_name = db.Column(db.String(16), nullable=False, unique=False)
     trade_type = db.Column(db.Integer, nullable=True, unique=False)
     task_status = db.Column(db.Integer, nullable=False, unique=False)
     date_added = db.Column(db.DateTime, nullable=False, unique=False)
-    date_updated = db.Column(db.DateTime, nullable=False, unique=False)
+    date_updated = db.Column(
+        db.DateTime, nullable=False, unique=False, onupdate=datetime.utcnow
+    )
+
+    def set_credentials(self, api_key, secret_key, passphrase=""):
+        self.api_key = encrypt_secret(api_key)
+        self.secret_key = encrypt_secret(secret_key)
+        self.passphrase = encrypt_secret(passphrase)
+        if self.ID is not None:
+            credential_vault.invalidate(self.ID)
+
+    @property
+    def sealed_credentials(self):
+        return (self.api_key, self.secret_key, self.passphrase)
 
 
 class Subscription(db.Model):
     __tablename__ = "jd_subscriptions"
     ID = db.Column(db.Integer, primary_key=True, unique=True, index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("jd_users.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("jd_users.id"), nullable=False, index=True
+    )
     is_active = db.Column(db.Boolean, default=False)
     start_date = db.Column(db.DateTime, nullable=False, unique=False)
     end_date = db.Column(db.DateTime, nullable=True, unique=False)
@@ -109,6 +161,7 @@ class SocialMediaChannel(db.Model):
     channel_name = db.Column(db.String(128), nullable=False, unique=False)
     username = db.Column(db.String(128), nullable=False, unique=False)
 
+    # Its index starts with user_id, so it serves the per-user lookups too
     __table_args__ = (
         UniqueConstraint(
             "user_id", "channel_name", "username", name="sm_unique_constraint"
@@ -121,7 +174,9 @@ class AssignedPricingTask(db.Model):
     id = db.Column(db.Integer, primary_key=True, unique=True, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey("jd_users.id"), nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    date_updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_updated = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
     symbols = db.Column(db.String(256), nullable=False, default="BTCUSDT")
     trade_type = db.Column(db.String(16), nullable=False, default="spot")
     exchange = db.Column(db.String(16), nullable=False)
@@ -130,13 +185,68 @@ class AssignedPricingTask(db.Model):
     time_ms = db.Column(db.Integer, unique=False, nullable=True)
     duration = db.Column(db.String(16), unique=False, nullable=True)
     status = db.Column(db.String(32), unique=False, nullable=True)
+    # One row per watched symbol, kept in step with the packed `symbols` column
+    symbol_rows = db.relationship(
+        "PricingTaskSymbol", backref="task", lazy=True, cascade="all, delete-orphan"
+    )
+
+    # A user's tasks, optionally in one status
+    __table_args__ = (db.Index("ix_jd_pricing_tasks_user_status", "user_id", "status"),)
+
+    @validates("symbols")
+    def validate_symbols(self, key, symbols):
+        parsed = parse_symbols(symbols)
+        existing = {row.symbol: row for row in self.symbol_rows}
+        self.symbol_rows = [
+            existing.get(symbol) or PricingTaskSymbol(symbol=symbol)
+            for symbol in parsed
+        ]
+        return ",".join(parsed)
+
+    @validates("exchange", "trade_type")
+    def validate_market(self, key, value):
+        if key == "exchange":
+            value = normalize_exchange(value)
+        for row in self.symbol_rows:
+            setattr(row, key, value)
+        return value
+
+
+class PricingTaskSymbol(db.Model):
+    __tablename__ = "jd_pricing_task_symbols"
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(
+        db.Integer,
+        db.ForeignKey("jd_pricing_tasks.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    exchange = db.Column(db.String(16), nullable=False)
+    trade_type = db.Column(db.String(16), nullable=False, default="spot")
+    symbol = db.Column(db.String(32), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "symbol", name="pts_unique_constraint"),
+        db.Index(
+            "ix_jd_pricing_task_symbols_market", "exchange", "trade_type", "symbol"
+        ),
+    )
+
+
+@db.event.listens_for(PricingTaskSymbol, "before_insert")
+def copy_task_market(mapper, connection, row):
+    # The task's exchange may be assigned after its symbols, so settle it here
+    if row.task is not None:
+        row.exchange = row.task.exchange
+        row.trade_type = row.task.trade_type or "spot"
 
 
 class PaymentInformation(db.Model):
     __tablename__ = "jd_payment_information"
 
     id = db.Column(db.Integer, primary_key=True)
-    belongs_to = db.Column(db.Integer, db.ForeignKey("jd_users.id"))
+    belongs_to = db.Column(db.Integer, db.ForeignKey("jd_users.id"), index=True)
     name_on_card = db.Column(db.String(64), unique=False, nullable=False)
     card_number = db.Column(db.String(64), unique=True, nullable=False)
     cvv2 = db.Column(db.String(16), unique=False, nullable=False)
@@ -144,6 +254,24 @@ class PaymentInformation(db.Model):
     expiry_year = db.Column(db.Integer, unique=False, nullable=False)
 
 
+class Product(db.Model):
+    __tablename__ = "jd_products"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+
+    def __init__(self, name, price):
+        self.name = name
+        self.price = price
+
+    def __repr__(self):
+        return str(self.name)
+
+    def format(self):
+        return {"productId": self.id, "name": self.name, "price": self.price}
+
+
 class Order(db.Model):
     __tablename__ = "jd_orders"
 
@@ -156,6 +284,9 @@ class Order(db.Model):
         "OrderItem", backref="order", lazy=True, cascade="all, delete-orphan"
     )
 
+    # A user's orders, newest first
+    __table_args__ = (db.Index("ix_jd_orders_user_date", "user_id", "order_date"),)
+
     def __init__(self, user_id, order_date, total_price, payment_status=False):
         self.user_id = user_id
         self.order_date = order_date
@@ -165,6 +296,20 @@ class Order(db.Model):
     def __repr__(self):
         return str(self.id)
 
+    @classmethod
+    def of_user(cls, user_id):
+        """A user's orders, newest first, with their items and products.
+
+        Items and products come in one IN query each rather than one query per
+        order and per item as the page walks them.
+        """
+        return (
+            cls.query.filter_by(user_id=user_id)
+            .options(selectinload(cls.order_items).selectinload(OrderItem.product))
+            .order_by(cls.order_date.desc())
+            .all()
+        )
+
     def format(self):
         return {
             "orderId": self.id,
@@ -178,12 +323,17 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = "jd_order_items"
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey("jd_orders.id"), nullable=False)
+    order_id = db.Column(
+        db.Integer, db.ForeignKey("jd_orders.id"), nullable=False, index=True
+    )
+    product_id = db.Column(db.Integer, db.ForeignKey("jd_products.id"), nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
+    product = db.relationship("Product", lazy=True)
 
-    def __init__(self, order_id, quantity, price):
+    def __init__(self, order_id, quantity, price, product_id=None):
         self.order_id = order_id
+        self.product_id = product_id
         self.quantity = quantity
         self.price = price
 
@@ -194,18 +344,120 @@ class OrderItem(db.Model):
         return {
             "orderItemId": self.id,
             "orderId": self.order_id,
+            "productId": self.product_id,
             "quantity": self.quantity,
             "price": self.price,
         }
 
 
+class OutboundNotification(db.Model):
+    __tablename__ = "jd_notifications"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("jd_users.id"), nullable=True)
+    kind = db.Column(db.String(32), nullable=False, default="email")
+    recipient = db.Column(db.String(128), nullable=False)
+    subject = db.Column(db.String(256), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=True)
+    reply_to = db.Column(db.String(128), nullable=True)
+    # Pending rows sharing a key are merged into a single email
+    coalesce_key = db.Column(db.String(64), nullable=True)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(256), nullable=True)
+    claimed_by = db.Column(db.String(64), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_sent = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_jd_notifications_due", "status", "next_attempt_at"),)
+
+
+class StripeEvent(db.Model):
+    """A verified Stripe webhook event, queued until its order is updated.
+
+    The unique event id is what drops Stripe's redeliveries of an event.
+    """
+
+    __tablename__ = "jd_stripe_events"
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), nullable=False)
+    event_type = db.Column(db.String(64), nullable=False)
+    order_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_applied = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_jd_stripe_events_event_id", "event_id", unique=True),
+        db.Index("ix_jd_stripe_events_status", "status", "id"),
+    )
+
+
+class ChangeLogEntry(db.Model):
+    """One insert, update or delete of a row the monitor mirrors in memory.
+
+    `seq` only ever grows, so a reader catches up by asking for everything past
+    the last sequence number it applied (see apps.monitor.sync).
+    """
+
+    __tablename__ = "jd_change_log"
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_jd_change_log_date_created", "date_created"),
+        # Without AUTOINCREMENT SQLite hands out max(seq) + 1, so pruning the
+        # newest entries would let new ones reuse sequence numbers readers
+        # have already passed
+        {"sqlite_autoincrement": True},
+    )
+
+
+TRACKED_TABLES = frozenset(
+    (AssignedPricingTask.__tablename__, UserAccountMonitor.__tablename__)
+)
+
+
+@db.event.listens_for(Session, "after_flush")
+def record_changes(session, flush_context):
+    # Writes made with Core statements bypass this and are not logged
+    entries = []
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table_name = getattr(obj, "__tablename__", None)
+        if table_name not in TRACKED_TABLES:
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        mapper = db.inspect(obj).mapper
+        entries.append(
+            {
+                "table_name": table_name,
+                "row_id": mapper.primary_key_from_instance(obj)[0],
+                "date_created": datetime.utcnow(),
+            }
+        )
+    if entries:
+        session.execute(db.insert(ChangeLogEntry), entries)
+
+
+# Both loaders answer from the per-process snapshot cache, so an authenticated
+# page hit normally runs no SQL at all
 @login_manager.user_loader
 def user_loader(user_id):
-    return User.query.filter_by(id=user_id).first()
+    return user_cache.get(user_id)
 
 
 @login_manager.request_loader
 def request_loader(request):
     username = request.form.get("username")
-    user = User.query.filter_by(username=username).first()
-    return user if user else None
+    if not username:
+        return None
+    return user_cache.get_by_username(username)
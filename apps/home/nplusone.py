@@ -0,0 +1,121 @@
+"""Catches requests that run the same statement once per row.
+
+With NPLUSONE_LIMIT above 0, statements are counted per request by their SQL
+text, IN lists and parameter styles folded together. A request running any
+one of them more than NPLUSONE_LIMIT times is logged as a warning, and under
+TESTING it raises NPlusOneError, so the test that made the request fails.
+
+Code outside a request, a worker loop or a test's own setup, can be checked
+the same way:
+
+    with nplusone_detector.watch(limit=3):
+        ...
+"""
+
+import logging
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from apps import db
+
+# "IN (?, ?, ?)" and "IN (%(id_1)s, ...)" are one statement whatever the count
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def normalize(statement):
+    statement = _PLACEHOLDER.sub("?", statement)
+    return " ".join(_IN_LIST.sub("(?)", statement).split())
+
+
+class NPlusOneDetector:
+    def __init__(self):
+        self.limit = 0
+        self.raise_errors = False
+        self._local = threading.local()
+        self._engines = set()
+
+    def init_app(self, app):
+        self.limit = app.config.get("NPLUSONE_LIMIT", 0)
+        if not self.limit:
+            return
+        self.raise_errors = app.testing
+        with app.app_context():
+            self._listen()
+        app.before_request(self._start)
+        app.after_request(self._check)
+
+    def _listen(self):
+        engine = db.engine
+        if engine not in self._engines:
+            self._engines.add(engine)
+            event.listen(engine, "before_cursor_execute", self._before_execute)
+
+    def _counts(self):
+        """The counter statements go to: a watch() block's, else the request's."""
+        watched = getattr(self._local, "counts", None)
+        if watched is not None:
+            return watched
+        if has_request_context():
+            return g.get("statement_counts")
+        return None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        counts = self._counts()
+        if counts is not None:
+            counts[normalize(statement)] += 1
+
+    def _start(self):
+        g.statement_counts = Counter()
+
+    def _check(self, response):
+        counts = g.pop("statement_counts", None)
+        if counts is not None:
+            self.report(
+                counts,
+                self.limit,
+                f"{request.method} {request.path}",
+                self.raise_errors,
+            )
+        return response
+
+    @staticmethod
+    def report(counts, limit, where, raise_errors):
+        repeated = {sql: n for sql, n in counts.items() if n > limit}
+        if not repeated:
+            return
+        message = f"{where} ran statements more than {limit} times:\n" + "\n".join(
+            f"  {n}x {sql}" for sql, n in sorted(repeated.items(), key=lambda i: -i[1])
+        )
+        if raise_errors:
+            raise NPlusOneError(message)
+        logging.warning(message)
+
+    @contextmanager
+    def watch(self, limit=None, where="block"):
+        """Count the statements run inside the block, raising past `limit`.
+
+        Yields the counter, so a caller can also look at the numbers itself.
+        Needs an app context, whether or not NPLUSONE_LIMIT is set.
+        """
+        self._listen()
+        previous = getattr(self._local, "counts", None)
+        counts = self._local.counts = Counter()
+        try:
+            yield counts
+        finally:
+            self._local.counts = previous
+        if limit is not None:
+            self.report(counts, limit, where, raise_errors=True)
+
+
+nplusone_detector = NPlusOneDetector()
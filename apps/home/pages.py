@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import abort, make_response, render_template, request
+from flask_login import current_user
+from jinja2 import meta
+
+from apps.home.cache import AuthenticatedUser
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "1000"))
+PAGE_TEMPLATE_PREFIX = "home/"
+# Names whose value changes from one request to the next, a page reading any of
+# them is rendered every time
+VOLATILE_NAMES = frozenset(
+    ("users", "request", "session", "g", "csrf_token", "get_flashed_messages")
+)
+# What a page that shows the user can depend on, all of it in the login snapshot
+USER_FIELDS = AuthenticatedUser.__slots__
+
+
+class PageCache:
+    """Rendered, minified bodies of the catch-all pages, with their ETags.
+
+    Templates are parsed once at start up to find out what they read. Pages that
+    only show `current_user` are cached per user snapshot, so an edited profile
+    is a new key rather than a stale entry. Pages reading anything in
+    VOLATILE_NAMES are never cached.
+    """
+
+    def __init__(self, max_size=PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._minifier = None
+        self._pages = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get("PAGE_CACHE", True)
+        if app.config.get("MINIFY_HTML"):
+            from flask_minify.parsers import Parser
+
+            self._minifier = Parser(fail_safe=True)
+            self._minifier.update_runtime_options(html=True)
+        self._pages = self.precompile(app.jinja_env)
+
+    def precompile(self, env):
+        """Compile every page template, returning what each one reads.
+
+        Compiled templates stay in Jinja's own cache, so the first request for a
+        page doesn't pay for parsing it either.
+        """
+        pages = {}
+        for name in env.list_templates(filter_func=self._is_page):
+            env.get_template(name)
+            pages[name[len(PAGE_TEMPLATE_PREFIX) : -len(".html")]] = self._names(
+                env, name
+            )
+        return pages
+
+    @staticmethod
+    def _is_page(name):
+        return name.startswith(PAGE_TEMPLATE_PREFIX) and name.endswith(".html")
+
+    @staticmethod
+    def _names(env, name, seen=None):
+        # The variables a template and everything it extends or includes read
+        seen = seen if seen is not None else set()
+        seen.add(name)
+        source = env.loader.get_source(env, name)[0]
+        tree = env.parse(source)
+        names = set(meta.find_undeclared_variables(tree))
+        for child in meta.find_referenced_templates(tree):
+            if child is not None and child not in seen:
+                names |= PageCache._names(env, child, seen)
+        return frozenset(names)
+
+    def _key(self, page, names):
+        if "current_user" not in names:
+            return page, None
+        if not current_user.is_authenticated:
+            return page, "anonymous"
+        return page, tuple(getattr(current_user, field) for field in USER_FIELDS)
+
+    def _render(self, page):
+        body = render_template(f"{PAGE_TEMPLATE_PREFIX}{page}.html")
+        if self._minifier is not None:
+            body = self._minifier.minify(body, "html")
+        body = body.encode()
+        return body, hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def response(self, page):
+        names = self._pages.get(page)
+        if names is None:
+            abort(404)
+        if not self.enabled or names & VOLATILE_NAMES:
+            body, etag = self._render(page)
+        else:
+            key = self._key(page, names)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = self._render(page)
+                with self._lock:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            else:
+                self.hits += 1
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            body, etag = entry
+
+        response = make_response(body)
+        response.set_etag(etag)
+        # Browsers revalidate every time, an unchanged page is a bodiless 304
+        response.cache_control.no_cache = True
+        if "current_user" in names:
+            response.cache_control.private = True
+        return response.make_conditional(request)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+page_cache = PageCache()
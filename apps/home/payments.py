@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from apps.home.profiling import external_call
+
+# Points the client at a stand-in such as apps.home.stripestub when set
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "")
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "16"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+
+
+def stripe_http_client(pool_size=STRIPE_POOL_SIZE, timeout=STRIPE_TIMEOUT):
+    """One keep-alive pool shared by every request thread.
+
+    Left alone the library opens a session per thread and waits up to 80 s on
+    a slow response, while the request that triggered it holds a worker.
+    """
+    import requests
+    import stripe
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return stripe.http_client.RequestsClient(timeout=timeout, session=session)
+
+
+def configure_stripe():
+    import stripe
+
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    if STRIPE_API_BASE:
+        stripe.api_base = STRIPE_API_BASE
+    # Retries resend the same Idempotency-Key, Stripe answers them from its cache
+    stripe.max_network_retries = STRIPE_MAX_RETRIES
+    stripe.default_http_client = stripe_http_client()
+    return stripe
+
+
+@lru_cache(maxsize=None)
+def get_stripe():
+    """The stripe module, imported and configured on first use.
+
+    Importing it takes about half a second, which every worker paid at boot
+    whether or not it ever served a checkout.
+    """
+    return configure_stripe()
+
+
+def checkout_idempotency_key(order_id, line_items):
+    """The same order and cart always map to the same key.
+
+    A retried request for the order gets the session Stripe already created
+    back, instead of a second one. The cart is part of the key so a changed
+    cart is not rejected as a key reused with different parameters.
+    """
+    digest = hashlib.sha256(json.dumps(line_items, sort_keys=True).encode()).hexdigest()
+    return f"checkout-order-{order_id}-{digest[:16]}"
+
+
+def line_item(product, quantity):
+    return {
+        "price_data": {
+            "currency": "usd",
+            "product_data": {"name": product.name},
+            "unit_amount": int(product.price * 100),
+        },
+        "quantity": quantity,
+    }
+
+
+def create_checkout_session(order_id, line_items, success_url, cancel_url):
+    stripe = get_stripe()
+    with external_call("stripe"):
+        return stripe.checkout.Session.create(
+            line_items=line_items,
+            mode="payment",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            # Comes back in the webhook events, see apps.home.webhooks
+            client_reference_id=str(order_id),
+            idempotency_key=checkout_idempotency_key(order_id, line_items),
+        )
@@ -0,0 +1,311 @@
+"""Where the time of a request goes, for the admin metrics endpoint.
+
+Off unless PROFILING is set. Then every request records its latency, the number
+and time of its SQL queries and the time spent rendering templates, per
+endpoint, and calls to Stripe, SMTP and Cloudinary are timed per service
+wherever they happen, background workers included. GET /admin/metrics returns
+all of it in Prometheus' text format.
+
+With PROFILE_SAMPLE_RATE above 0 that share of requests also runs under
+cProfile, and the stats of those slower than PROFILE_SLOW_MS are kept for
+GET /admin/profiles.
+
+Every worker process counts its own requests, so each scrape only sees the
+worker that answered it.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context, request, template_rendered
+from flask.signals import before_render_template
+from sqlalchemy import event
+
+from apps import db
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+# Profiles kept for /admin/profiles, the oldest are dropped first
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_LINES = 40
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """A Prometheus histogram, one set of cumulative buckets per label values."""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (values, list(counts), total, count)
+                for values, (counts, total, count) in self._series.items()
+            )
+        for values, counts, total, count in series:
+            labels = _labels(self.labels, values)
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(
+                    f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}}'
+                    f" {bucket}"
+                )
+            lines.append(
+                f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}'
+            )
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_seconds = PROFILE_SLOW_MS / 1000
+        self.profiles = deque(maxlen=PROFILE_KEEP)
+        self.requests = Counter(
+            "http_requests_total",
+            "Requests answered, by endpoint and status.",
+            ("endpoint", "method", "status"),
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "Time from the first request hook to the response.",
+            ("endpoint", "method"),
+        )
+        self.sql_queries = Histogram(
+            "http_request_sql_queries",
+            "SQL statements executed per request.",
+            ("endpoint",),
+            QUERY_COUNT_BUCKETS,
+        )
+        self.sql_time = Histogram(
+            "http_request_sql_duration_seconds",
+            "Time spent executing SQL per request.",
+            ("endpoint",),
+        )
+        self.template_time = Histogram(
+            "http_request_template_duration_seconds",
+            "Time spent rendering templates per request.",
+            ("endpoint",),
+        )
+        self.external_time = Histogram(
+            "external_call_duration_seconds",
+            "Calls to Stripe, SMTP and Cloudinary, in requests and workers.",
+            ("service",),
+        )
+        self.external_errors = Counter(
+            "external_call_errors_total",
+            "Calls to an outside service that raised.",
+            ("service",),
+        )
+        self.profiled = Counter(
+            "http_requests_profiled_total",
+            "Requests run under cProfile, and whether they were slow.",
+            ("slow",),
+        )
+
+    def init_app(self, app):
+        self.enabled = app.config.get("PROFILING", False)
+        if not self.enabled:
+            return
+        self.sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+        self.slow_seconds = app.config.get("PROFILE_SLOW_MS", PROFILE_SLOW_MS) / 1000
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._before_execute)
+            event.listen(db.engine, "after_cursor_execute", self._after_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        # Registered ahead of the other hooks so their time is counted too
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._response)
+        app.teardown_request(self._finish)
+
+    def _start(self):
+        g.profiling = {
+            "started": time.perf_counter(),
+            "status": 500,
+            "queries": 0,
+            "sql": 0.0,
+            "templates": 0.0,
+            "rendering": [],
+            "profile": None,
+        }
+        if self.sample_rate and random.random() < self.sample_rate:
+            g.profiling["profile"] = cProfile.Profile()
+            g.profiling["profile"].enable()
+
+    def _response(self, response):
+        state = g.get("profiling")
+        if state is not None:
+            state["status"] = response.status_code
+        return response
+
+    def _finish(self, exception=None):
+        state = g.pop("profiling", None)
+        if state is None:
+            return
+        elapsed = time.perf_counter() - state["started"]
+        profile = state["profile"]
+        if profile is not None:
+            profile.disable()
+        endpoint = request.endpoint or "unmatched"
+        self.requests.inc(endpoint, request.method, state["status"])
+        self.latency.observe(elapsed, endpoint, request.method)
+        self.sql_queries.observe(state["queries"], endpoint)
+        self.sql_time.observe(state["sql"], endpoint)
+        self.template_time.observe(state["templates"], endpoint)
+        if profile is not None:
+            slow = elapsed >= self.slow_seconds
+            self.profiled.inc(str(slow).lower())
+            if slow:
+                self._keep(profile, endpoint, elapsed, state)
+
+    def _keep(self, profile, endpoint, elapsed, state):
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        self.profiles.append(
+            {
+                "at": datetime.utcnow(),
+                "method": request.method,
+                "path": request.path,
+                "endpoint": endpoint,
+                "seconds": elapsed,
+                "queries": state["queries"],
+                "sql": state["sql"],
+                "templates": state["templates"],
+                "stats": out.getvalue(),
+            }
+        )
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        if has_request_context() and "profiling" in g:
+            context._profiling_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        started = getattr(context, "_profiling_started", None)
+        if started is None or not has_request_context():
+            return
+        state = g.get("profiling")
+        if state is not None:
+            state["queries"] += 1
+            state["sql"] += time.perf_counter() - started
+
+    def _before_render(self, sender, template, context, **extra):
+        state = g.get("profiling")
+        if state is not None:
+            state["rendering"].append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        state = g.get("profiling")
+        if state is not None and state["rendering"]:
+            started = state["rendering"].pop()
+            # An include rendered through render_template inside another
+            # template is already part of the outer one's time
+            if not state["rendering"]:
+                state["templates"] += time.perf_counter() - started
+
+    @contextmanager
+    def external_call(self, service):
+        """Time a call to an outside service, when profiling is on."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.external_errors.inc(service)
+            raise
+        finally:
+            self.external_time.observe(time.perf_counter() - started, service)
+
+    def metrics(self):
+        """Every metric in Prometheus' text exposition format."""
+        lines = []
+        for metric in (
+            self.requests,
+            self.latency,
+            self.sql_queries,
+            self.sql_time,
+            self.template_time,
+            self.external_time,
+            self.external_errors,
+            self.profiled,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """The kept slow-request profiles, newest first, as plain text."""
+        sections = []
+        for entry in reversed(self.profiles):
+            sections.append(
+                f"{entry['at']:%Y-%m-%d %H:%M:%S} {entry['method']} {entry['path']} "
+                f"({entry['endpoint']}) {entry['seconds'] * 1e3:.1f} ms, "
+                f"{entry['queries']} queries in {entry['sql'] * 1e3:.1f} ms, "
+                f"templates {entry['templates'] * 1e3:.1f} ms\n{entry['stats']}"
+            )
+        return "\n".join(sections) or "No slow requests profiled yet.\n"
+
+
+profiler = Profiler()
+external_call = profiler.external_call
@@ -0,0 +1,173 @@
+"""Finds queries the database answers by reading a whole table.
+
+In development (QUERY_PLAN_CHECK, on in DebugConfig) every distinct SELECT the
+app runs is explained once and a full scan is logged as a warning.
+
+    flask check-query-plans
+
+explains HOT_QUERIES, the lookups pages and workers make on every request or
+poll, and exits non-zero if any of them scans a table.
+"""
+
+import logging
+import os
+import re
+import threading
+
+from sqlalchemy import event
+
+from apps import db
+from apps.home.models import (
+    AssignedPricingTask,
+    Order,
+    OrderItem,
+    OutboundNotification,
+    PaymentInformation,
+    SocialMediaChannel,
+    StripeEvent,
+    Subscription,
+    User,
+    UserAccountMonitor,
+)
+
+# Bookkeeping tables read by SQLAlchemy's reflection and Alembic, never by pages
+INTERNAL_TABLES = frozenset(("sqlite_master", "sqlite_temp_master", "alembic_version"))
+# Tables small enough that scanning them is fine, comma separated
+QUERY_PLAN_IGNORE = INTERNAL_TABLES | frozenset(
+    name.strip() for name in os.getenv("QUERY_PLAN_IGNORE", "").split(",") if name
+)
+
+# SQLite: "SCAN jd_orders", also "SCAN t USING COVERING INDEX ix", which still
+# reads every entry. Postgres: "Seq Scan on jd_orders".
+_SQLITE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?:TABLE )?(\w+)")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+HOT_QUERIES = {
+    "user by username, any case": lambda: db.select(User).where(
+        User.username_lower == "user"
+    ),
+    "user by email": lambda: db.select(User).where(User.email == "user@example.com"),
+    "orders of a user": lambda: db.select(Order)
+    .where(Order.user_id == 1)
+    .order_by(Order.order_date.desc()),
+    "items of an order": lambda: db.select(OrderItem).where(OrderItem.order_id == 1),
+    "pricing tasks of a user": lambda: db.select(AssignedPricingTask).where(
+        AssignedPricingTask.user_id == 1, AssignedPricingTask.status == "active"
+    ),
+    "monitor accounts of a user": lambda: db.select(UserAccountMonitor).where(
+        UserAccountMonitor.user_id == 1
+    ),
+    "subscriptions of a user": lambda: db.select(Subscription).where(
+        Subscription.user_id == 1
+    ),
+    "social media of a user": lambda: db.select(SocialMediaChannel).where(
+        SocialMediaChannel.user_id == 1
+    ),
+    "payment information of a user": lambda: db.select(PaymentInformation).where(
+        PaymentInformation.belongs_to == 1
+    ),
+    "notifications due": lambda: db.select(OutboundNotification.id)
+    .where(OutboundNotification.status == "pending")
+    .order_by(OutboundNotification.next_attempt_at)
+    .limit(100),
+    "stripe events pending": lambda: db.select(StripeEvent.id)
+    .where(StripeEvent.status == "pending")
+    .order_by(StripeEvent.id)
+    .limit(500),
+}
+
+
+def explain(dbapi_connection, dialect, statement, parameters=()):
+    """The plan of a statement as text lines, through a cursor of its own."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if dialect == "sqlite":
+            # sqlite3 caches prepared statements by their text, and a cached
+            # EXPLAIN keeps describing the schema it was prepared against
+            version = cursor.execute("PRAGMA schema_version").fetchone()[0]
+            cursor.execute(
+                f"EXPLAIN QUERY PLAN /* schema {version} */ {statement}", parameters
+            )
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def scanned_tables(plan, dialect):
+    pattern = _SQLITE_SCAN if dialect == "sqlite" else _POSTGRES_SCAN
+    tables = set()
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) not in QUERY_PLAN_IGNORE:
+            tables.add(match.group(1))
+    return tables
+
+
+def check_hot_queries():
+    """Explain every HOT_QUERIES entry, returning the tables each one scans.
+
+    Postgres plans small tables as scans even when an index fits, so sequential
+    scans are disabled for the check: one still showing up has no usable index.
+    """
+    dialect = db.engine.dialect.name
+    results = {}
+    with db.engine.connect() as connection:
+        if dialect == "postgresql":
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        for name, query in HOT_QUERIES.items():
+            statement = str(
+                query().compile(
+                    dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+                )
+            )
+            plan = explain(connection.connection.dbapi_connection, dialect, statement)
+            results[name] = (scanned_tables(plan, dialect), plan)
+        connection.rollback()
+    return results
+
+
+class QueryPlanChecker:
+    """Logs each distinct SELECT that scans a table, for development only.
+
+    Every new statement costs an extra EXPLAIN round trip, later runs of it
+    only a set lookup.
+    """
+
+    def __init__(self):
+        self.findings = {}
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if not app.config.get("QUERY_PLAN_CHECK", False):
+            return
+        with app.app_context():
+            event.listen(db.engine, "after_cursor_execute", self._after_execute)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        if many or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        with self._lock:
+            if statement in self._seen:
+                return
+            self._seen.add(statement)
+        dialect = conn.dialect.name
+        try:
+            plan = explain(
+                conn.connection.dbapi_connection, dialect, statement, parameters
+            )
+        except Exception as e:
+            logging.debug(f"Could not explain query: {e}")
+            return
+        tables = scanned_tables(plan, dialect)
+        if tables:
+            self.findings[statement] = tables
+            logging.warning(
+                f"Full scan of {', '.join(sorted(tables))}:\n{statement}\n"
+                + "\n".join(plan)
+            )
+
+
+query_plan_checker = QueryPlanChecker()
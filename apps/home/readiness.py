@@ -0,0 +1,174 @@
+import os
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+from apps import db
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "migrations"
+)
+# The revision matching what db.create_all built before there were migrations,
+# and the tables it has
+INITIAL_REVISION = "72b5a7ff76f6"
+INITIAL_TABLES = frozenset(
+    (
+        "jd_users",
+        "jd_monitor_accounts",
+        "jd_orders",
+        "jd_order_items",
+        "jd_payment_information",
+        "jd_pricing_tasks",
+        "jd_social_media",
+        "jd_subscriptions",
+    )
+)
+# Connections opened at start up, 0 for the whole pool
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))
+
+
+def expected_heads():
+    from alembic.script import ScriptDirectory
+
+    return frozenset(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+
+
+def current_heads(connection):
+    from alembic.migration import MigrationContext
+
+    return frozenset(MigrationContext.configure(connection).get_current_heads())
+
+
+class SchemaError(RuntimeError):
+    pass
+
+
+def schema_differences(connection):
+    """What the live schema lacks or has beyond the models, empty if they match."""
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    return compare_metadata(MigrationContext.configure(connection), db.metadata)
+
+
+def setup_database(app):
+    """Upgrade the schema to the newest migration, returning its revision.
+
+    A database that db.create_all built before there were migrations is
+    stamped with the initial revision first, as long as its tables are that
+    revision's. Raises SchemaError if the upgraded schema and the models
+    still differ, rather than let workers report ready on it.
+    """
+    from flask_migrate import Migrate, stamp, upgrade
+
+    if "migrate" not in app.extensions:
+        Migrate(app, db)
+    tables = set(db.inspect(db.engine).get_table_names())
+    if "alembic_version" not in tables and "jd_users" in tables:
+        if tables != INITIAL_TABLES:
+            raise SchemaError(
+                "Database has no migration history and its tables are not the "
+                f"initial schema's, unexpected: {sorted(tables - INITIAL_TABLES)}, "
+                f"missing: {sorted(INITIAL_TABLES - tables)}"
+            )
+        stamp(directory=MIGRATIONS_DIR, revision=INITIAL_REVISION)
+    upgrade(directory=MIGRATIONS_DIR)
+    with db.engine.connect() as connection:
+        differences = schema_differences(connection)
+        if differences:
+            raise SchemaError(
+                "Schema differs from the models after migrating:\n"
+                + "\n".join(f"  {difference}" for difference in differences)
+            )
+        return ",".join(sorted(current_heads(connection)))
+
+
+class Readiness:
+    """Whether this process may take traffic: its pool is primed and the
+    schema is at the newest migration.
+
+    The pool is warmed when the app is created, and a forked web worker
+    replaces the pool it inherited and warms its own on its first request,
+    the load balancer's first /ready. Other children, such as the password
+    hashing pool's, never touch it. A worker that isn't ready answers 503 on
+    /ready and retries there, the schema itself is only ever changed by
+    `flask setup-database`.
+    """
+
+    def __init__(self, warmup=DB_POOL_WARMUP):
+        self.warmup = warmup
+        self.ready = False
+        self.reason = "not started"
+        self.revision = None
+        self._app = None
+        self._heads = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._process_lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self._pid = os.getpid()
+        app.before_request(self._ensure_process)
+        if app.config.get("DB_WARMUP", True):
+            self.warm()
+
+    def _ensure_process(self):
+        if self._pid == os.getpid():
+            return
+        with self._process_lock:
+            if self._pid == os.getpid():
+                return
+            # Connections must not be shared with the process gunicorn forked from
+            self.ready = False
+            db.engine.dispose(close=False)
+            self._pid = os.getpid()
+        if self._app.config.get("DB_WARMUP", True):
+            self.warm()
+
+    def warm(self):
+        """Open and test the pool's connections, returning whether ready."""
+        with self._lock, self._app.app_context():
+            pool = db.engine.pool
+            size = self.warmup or (pool.size() if isinstance(pool, QueuePool) else 1)
+            connections = []
+            try:
+                # All held at once, or the pool would hand back the same one
+                for _ in range(size):
+                    connections.append(db.engine.connect())
+                    connections[-1].execute(db.text("SELECT 1"))
+                heads = current_heads(connections[0])
+            except SQLAlchemyError as e:
+                self.ready = False
+                self.reason = f"database unavailable: {e}"
+                return False
+            finally:
+                for connection in connections:
+                    connection.close()
+
+            if self._heads is None:
+                self._heads = expected_heads()
+            self.revision = ",".join(sorted(heads)) or None
+            self.ready = heads == self._heads
+            self.reason = (
+                None
+                if self.ready
+                else f"schema at {self.revision}, run `flask setup-database`"
+            )
+            return self.ready
+
+    def check(self):
+        """Ping the database through the warm pool, warming it if needed."""
+        if not self.ready:
+            return self.warm()
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(db.text("SELECT 1"))
+        except SQLAlchemyError as e:
+            self.ready = False
+            self.reason = f"database unavailable: {e}"
+        return self.ready
+
+
+readiness = Readiness()
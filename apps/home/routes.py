@@ -1,15 +1,37 @@
+import json
 import logging
 from apps.home import blueprint
-from flask import jsonify
+from flask import Response, jsonify, stream_with_context
 from flask import render_template, redirect, request, url_for, flash, current_app
 from flask_login import login_user, logout_user, current_user, login_required
 from apps import db, login_manager
 from apps.home.forms import LoginForm, CreateAccountForm, SearchForm
 from apps.home.models import User
+from apps.home.cache import invalidate_user, invalidate_user_summary
 from apps.home.util import verify_pass
+from apps.home.hashing import HashingBusy, needs_rehash
+from apps.home.pages import page_cache
+from apps.home.readiness import readiness
+from apps.home.profiling import profiler
+from apps.monitor.history import (
+    DAY_MS,
+    HOUR_MS,
+    RESOLUTIONS,
+    PriceHistoryStore,
+    pick_resolution,
+)
 from apps.home.models import (
+    AssignedPricingTask,
     Order,
     OrderItem,
+    PricingTaskSymbol,
+    Product,
+)
+from apps.home.webhooks import WebhookNotConfigured, record_event
+from apps.home.payments import (
+    create_checkout_session as create_stripe_session,
+    get_stripe,
+    line_item,
 )
 from apps.home.util import (
     send_enquiry_email_to_admin,
@@ -20,21 +42,20 @@ from apps.home.util import (
     decrypt_order_id,
 )
 from flask_wtf.csrf import CSRFProtect
-from sqlalchemy import func
-from dotenv import load_dotenv
-import stripe
 import os
 from datetime import datetime
 
-# Load environment variables from the .env file
-load_dotenv()
-
-# This is your test secret API key.
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-
 # Access CSRFProtect directly
 csrf = CSRFProtect()
 
+# Written by the monitor process, the web workers only read it
+price_history = PriceHistoryStore(readonly=True)
+MAX_HISTORY_POINTS = 10000
+
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE = 1000
+USERS_EXPORT_CHUNK = 1000
+
 
 @blueprint.route("/index")
 @login_required
@@ -48,6 +69,14 @@ def route_default():
     return redirect(url_for("home_blueprint.price_monitoring_tasks_route"))
 
 
+# For the load balancer, a worker is only sent traffic once this answers 200
+@blueprint.route("/ready", methods=["GET"])
+def ready():
+    if not readiness.check():
+        return jsonify({"ready": False, "reason": readiness.reason}), 503
+    return jsonify({"ready": True, "revision": readiness.revision}), 200
+
+
 @blueprint.route("/support")
 @login_required
 def support_route():
@@ -63,7 +92,17 @@ def edit_profile_route():
 @blueprint.route("/price_monitoring")
 @login_required
 def price_monitoring_tasks_route():
-    return render_template("home/pricing.html")
+    # The live panel subscribes to the symbols of the user's own tasks
+    watched = db.session.execute(
+        db.select(PricingTaskSymbol.exchange, PricingTaskSymbol.symbol)
+        .join(AssignedPricingTask)
+        .where(AssignedPricingTask.user_id == current_user.id)
+        .distinct()
+    ).all()
+    return render_template(
+        "home/pricing.html",
+        stream_symbols=",".join(f"{exchange}:{symbol}" for exchange, symbol in watched),
+    )
 
 
 @blueprint.route("/account_monitoring")
@@ -72,6 +111,50 @@ def account_monitoring_tasks_route():
     return render_template("home/pricing.html")
 
 
+# Chart data: ?exchange=&symbol=&start=&end= (ms) and optionally &resolution=
+@blueprint.route("/api/price-history", methods=["GET"])
+@login_required
+def price_history_route():
+    exchange = request.args.get("exchange", "")
+    symbol = request.args.get("symbol", "")
+    if not exchange or not symbol:
+        return jsonify({"message": "exchange and symbol are required"}), 400
+    try:
+        end = int(request.args.get("end") or datetime.now().timestamp() * 1000)
+        start = int(request.args.get("start") or end - DAY_MS)
+    except ValueError:
+        return jsonify({"message": "start and end must be timestamps in ms"}), 400
+    resolution = request.args.get("resolution") or pick_resolution(start, end)
+    if resolution == "tick":
+        too_many = end - start > HOUR_MS
+    elif resolution in RESOLUTIONS:
+        too_many = (end - start) // RESOLUTIONS[resolution][0] > MAX_HISTORY_POINTS
+    else:
+        return jsonify({"message": "Unknown resolution"}), 400
+    if too_many:
+        return jsonify({"message": "Range too long for this resolution"}), 400
+
+    try:
+        data = price_history.query(exchange, symbol, start, end, resolution)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if data is None:
+        return jsonify({"message": "No history for this symbol"}), 404
+    response = {column: values.tolist() for column, values in data.items()}
+    response["resolution"] = resolution
+    return jsonify(response)
+
+
+# Password hashing is saturated, fail fast rather than queue behind the burst
+def hashing_busy_response(template, form):
+    msg = "We are handling a lot of sign-ins right now, please try again shortly."
+    return (
+        render_template(template, msg=msg, success=False, form=form),
+        503,
+        {"Retry-After": "2"},
+    )
+
+
 # Login & Registration
 @blueprint.route("/login", methods=["GET", "POST"])
 def login():
@@ -86,7 +169,7 @@ def login():
     # Query to check if the username already exists
     print(f"Username given is {username} and password is {password}")
 
-    user = User.query.filter(func.lower(User.username) == func.lower(username)).first()
+    user = User.by_username(username)
     if not user:
         msg = "Invalid Username or Password."
         logging.info(msg)
@@ -95,8 +178,22 @@ def login():
         )
 
     # check credentials
-    if verify_pass(password, user.password):
+    try:
+        verified = verify_pass(password, user.password)
+    except HashingBusy as e:
+        logging.warning(e)
+        return hashing_busy_response("accounts/login.html", login_form)
+
+    if verified:
         logging.info("Password Verified")
+        # Upgrade legacy or weaker hashes now that we know the plain password
+        if needs_rehash(user.password):
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except HashingBusy as e:
+                db.session.rollback()
+                logging.warning(e)
         # credentials are valid
         login_user(user, remember=remember_me)
         logging.info("Login successful")
@@ -168,10 +265,8 @@ def register():
                     success=False,
                     form=create_account_form,
                 )
-            # Check username exists
-            user = User.query.filter_by(
-                username=create_account_form.username.data
-            ).first()
+            # Check username exists, in any case
+            user = User.by_username(create_account_form.username.data)
             if user:
                 msg = "Username already registered"
                 logging.info(msg)
@@ -197,16 +292,23 @@ def register():
                 )
 
             # else we can create the user
-            user = User(
-                first_name=create_account_form.first_name.data,
-                last_name=create_account_form.last_name.data,
-                username=create_account_form.username.data,
-                email=create_account_form.email.data,
-                password=create_account_form.password.data,
-            )
+            try:
+                user = User(
+                    first_name=create_account_form.first_name.data,
+                    last_name=create_account_form.last_name.data,
+                    username=create_account_form.username.data,
+                    email=create_account_form.email.data,
+                    password=create_account_form.password.data,
+                )
+            except HashingBusy as e:
+                logging.warning(e)
+                return hashing_busy_response(
+                    "accounts/register.html", create_account_form
+                )
 
             db.session.add(user)
             db.session.commit()
+            invalidate_user_summary()
             logging.info("Registration successful")
 
             return redirect(url_for('home_blueprint.login'))
@@ -228,23 +330,58 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_summary()
+    invalidate_user(user_id)
 
     return jsonify({"message": "User deleted successfully"}), 201
 
 
-# Route to get all users
+# Route to get all users: ?after=<last id seen>&limit=<page size>, or
+# ?format=ndjson for the whole table as one JSON object per line
 @blueprint.route("/all-user", methods=["GET"])
 @admin_required
 def get_users():
+    if request.args.get("format") == "ndjson":
+        logging.info("Exporting all users")
+        return Response(
+            stream_with_context(export_users()), mimetype="application/x-ndjson"
+        )
     try:
-        logging.info("Fetching all users")
-        users = User.query.all()
-        return jsonify({"data": [user.format() for user in users], "total": len(users)})
+        limit = min(int(request.args.get("limit", USERS_PAGE_SIZE)), USERS_MAX_PAGE)
+        after = int(request.args.get("after", 0))
+    except ValueError:
+        return jsonify({"message": "after and limit must be integers"}), 400
+    # SQLite reads LIMIT -1 as no limit at all
+    if limit < 1:
+        return jsonify({"message": "limit must be at least 1"}), 400
+    try:
+        logging.info("Fetching users")
+        # Keyset pagination: the index on id finds the page, however deep it is
+        rows = db.session.execute(
+            db.select(*User.format_columns())
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(limit + 1)
+        ).all()
+        data = [row._asdict() for row in rows[:limit]]
+        next_cursor = data[-1]["id"] if len(rows) > limit else None
+        return jsonify({"data": data, "next_cursor": next_cursor})
     except Exception as e:
         logging.error(e)
         return jsonify({"message": str(e)}), 500
 
 
+def export_users():
+    # yield_per streams from a server-side cursor where the driver has one
+    result = db.session.execute(
+        db.select(*User.format_columns())
+        .order_by(User.id)
+        .execution_options(yield_per=USERS_EXPORT_CHUNK)
+    )
+    for rows in result.partitions():
+        yield "".join(json.dumps(row._asdict()) + "\n" for row in rows)
+
+
 @blueprint.route("/logout")
 def logout():
     logout_user()
@@ -328,7 +465,7 @@ def get_csrf_token():
 # handle all templates
 @blueprint.route("/<template_name>", methods=["GET"])
 def templates(template_name):
-    return render_template(f"home/{template_name}.html")
+    return page_cache.response(template_name)
 
 
 @blueprint.route("/admin-home", methods=["GET"])
@@ -346,6 +483,8 @@ def make_admin(user_id):
         return jsonify({"message": "User not found"}), 404
     user.is_admin = True
     db.session.commit()
+    invalidate_user_summary()
+    invalidate_user(user_id)
     return jsonify({"message": "User is now admin"}), 200
 
 
@@ -358,9 +497,29 @@ def remove_admin(user_id):
         return jsonify({"message": "User not found"}), 404
     user.is_admin = False
     db.session.commit()
+    invalidate_user_summary()
+    invalidate_user(user_id)
     return jsonify({"message": "User is no longer admin"}), 200
 
 
+# Request metrics of this worker in Prometheus' text format, see apps.home.profiling
+@blueprint.route("/admin/metrics", methods=["GET"])
+@admin_required
+def admin_metrics():
+    if not profiler.enabled:
+        return Response("Profiling is off\n", status=404, mimetype="text/plain")
+    return Response(profiler.metrics(), mimetype="text/plain; version=0.0.4")
+
+
+# cProfile stats of the slow requests sampled by this worker
+@blueprint.route("/admin/profiles", methods=["GET"])
+@admin_required
+def admin_profiles():
+    if not profiler.enabled:
+        return Response("Profiling is off\n", status=404, mimetype="text/plain")
+    return Response(profiler.report(), mimetype="text/plain")
+
+
 # Route to create a checkout session on stripe
 @blueprint.route("/create-checkout-session", methods=["POST"])
 def create_checkout_session():
@@ -370,65 +529,57 @@ def create_checkout_session():
         order_date = datetime.utcnow()
         total_price = data.get("total_price")
         cart_items = data.get("cart_items")
+
+        # Every product in the cart in one query
+        product_ids = {item["product_id"] for item in cart_items}
+        products = {
+            product.id: product
+            for product in db.session.execute(
+                db.select(Product).where(Product.id.in_(product_ids))
+            ).scalars()
+        }
+        for item in cart_items:
+            if item["product_id"] not in products:
+                return (
+                    jsonify(
+                        {"message": f'Product with ID {item["product_id"]} not found'}
+                    ),
+                    404,
+                )
+
         # Create a new Order instance
         new_order = Order(
             user_id=user_id, order_date=order_date, total_price=total_price
         )
         db.session.add(new_order)
-        db.session.commit()
+        db.session.flush()
+        # Read before the commit expires it, saving a reload
+        order_id = new_order.id
 
         line_items = []
+        order_items = []
         for item in cart_items:
-            product_id = item.get("product_id")
-            quantity = item.get("quantity")
-
-            product = Product.query.get(item["product_id"])
-            price = (
-                product.price
-            )  # Assuming the price is provided or fetched from the product
-
-            new_order_item = OrderItem(
-                product_id=product_id,
-                order_id=new_order.id,
-                quantity=quantity,
-                price=price,
+            product = products[item["product_id"]]
+            quantity = item.get("quantity", 1)
+            order_items.append(
+                {
+                    "order_id": order_id,
+                    "product_id": product.id,
+                    "quantity": quantity,
+                    "price": product.price,
+                }
             )
-            db.session.add(new_order_item)
-
-            if product:
-                line_items.append(
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {
-                                "name": product.name,
-                            },
-                            "unit_amount": int(product.price * 100),
-                        },
-                        "quantity": item.get(
-                            "quantity", 1
-                        ),  # Assuming each item in cart_items has a quantity
-                    }
-                )
-            else:
-                return (
-                    jsonify(
-                        {"message": f'Product with ID {item["product_id"]} not found'}
-                    ),
-                    404,
-                )
+            line_items.append(line_item(product, quantity))
+        db.session.execute(db.insert(OrderItem), order_items)
         db.session.commit()
-        print(line_items)
+
         # Get the domain dynamically
         YOUR_DOMAIN = request.url_root[:-1]
         # Encrypt order_id to embed in the success_url
-        encrypted_order_id = encrypt_order_id(new_order.id)
+        encrypted_order_id = encrypt_order_id(order_id)
         success_url = f"{request.url_root[:-1]}/success/{encrypted_order_id}?appreciate=thanksfortheorder"
-        checkout_session = stripe.checkout.Session.create(
-            line_items=line_items,
-            mode="payment",
-            success_url=success_url,
-            cancel_url=YOUR_DOMAIN + "/cancel",
+        checkout_session = create_stripe_session(
+            order_id, line_items, success_url, YOUR_DOMAIN + "/cancel"
         )
 
         return (
@@ -455,18 +606,31 @@ def success(encrypted_order_id):
     if secret_code != "thanksfortheorder":
         return jsonify({"message": "Invalid Request"}), 403
 
-    # Decrypt the encrypted_order_id to get the actual order_id
-    order_id = decrypt_order_id(encrypted_order_id)
+    from cryptography.fernet import InvalidToken
 
-    order = Order.query.get(order_id)
-    if not order:
+    # Only a landing page, the order is marked paid by the Stripe webhook
+    try:
+        decrypt_order_id(encrypted_order_id)
+    except (InvalidToken, ValueError):
         return jsonify({"message": "Order not found"}), 404
-
-    order.payment_status = True
-    db.session.commit()
     return render_template("home/payment-success.html")
 
 
+# Stripe calls this for every checkout event, see apps.home.webhooks
+@blueprint.route("/stripe/webhook", methods=["POST"])
+def stripe_webhook():
+    try:
+        record_event(request.get_data(), request.headers.get("Stripe-Signature", ""))
+    except WebhookNotConfigured as e:
+        # Stripe retries for days, the events arrive once the secret is set
+        logging.error(f"Stripe webhook refused: {e}")
+        return jsonify({"message": "Webhook not configured"}), 503
+    except (ValueError, get_stripe().error.SignatureVerificationError):
+        return jsonify({"message": "Invalid payload"}), 400
+    # Duplicates are acknowledged too, or Stripe keeps redelivering them
+    return jsonify({"received": True}), 200
+
+
 # Route to handle canceled payment
 @blueprint.route("/cancel", methods=["GET"])
 def cancel():
@@ -479,7 +643,9 @@ def cancel():
 def get_orders():
     user_id = current_user.id
     try:
-        orders = Order.query.filter_by(user_id=user_id).all()
+        # Newest first, straight from the (user_id, order_date) index, with the
+        # items and their products loaded up front
+        orders = Order.of_user(user_id)
         return render_template("home/order.html", orders=orders, Product=Product)
     except Exception as e:
         print(e)
@@ -0,0 +1,101 @@
+"""A local stand-in for the Stripe API's checkout sessions endpoint.
+
+    python -m apps.home.stripestub --port 12111 --latency 0.15
+    STRIPE_API_BASE=http://127.0.0.1:12111 flask run
+
+Creates sessions that only exist in memory and replays the stored response
+for a repeated Idempotency-Key, like Stripe does. /stats reports how many
+sessions were created and how many requests were answered as replays.
+"""
+
+import argparse
+import asyncio
+import random
+import uuid
+
+from aiohttp import web
+
+
+class StripeStub:
+    def __init__(self, latency=(0.1, 0.2), seed=None):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.created = 0
+        self.replayed = 0
+        self._sessions = {}
+        self._idempotent = {}
+
+    async def create_session(self, request):
+        self.requests += 1
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            raise web.HTTPUnauthorized()
+        key = request.headers.get("Idempotency-Key")
+        if key in self._idempotent:
+            self.replayed += 1
+            return web.json_response(
+                self._idempotent[key], headers={"Idempotent-Replayed": "true"}
+            )
+        form = await request.post()
+        await asyncio.sleep(self.rng.uniform(*self.latency))
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": form.get("mode"),
+            "payment_status": "unpaid",
+            "success_url": form.get("success_url"),
+            "cancel_url": form.get("cancel_url"),
+            "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+        }
+        self.created += 1
+        self._sessions[session_id] = session
+        if key:
+            self._idempotent[key] = session
+        return web.json_response(session)
+
+    async def stats(self, request):
+        return web.json_response(
+            {
+                "requests": self.requests,
+                "created": self.created,
+                "replayed": self.replayed,
+            }
+        )
+
+    def application(self):
+        app = web.Application()
+        app.router.add_post("/v1/checkout/sessions", self.create_session)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def serve(self, host="127.0.0.1", port=12111):
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port, backlog=4096).start()
+        return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument(
+        "--latency", type=float, default=0.15, help="mean seconds per session"
+    )
+    args = parser.parse_args()
+
+    stub = StripeStub(latency=(args.latency * 0.5, args.latency * 1.5))
+
+    async def run():
+        runner = await stub.serve(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,43 @@
 import os
-import hashlib
-import binascii
 from flask import current_app, render_template
-from flask_mail import Mail, Message
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import redirect, url_for
 from flask_login import current_user
-from dotenv import load_dotenv
-import cloudinary.uploader
-from cryptography.fernet import Fernet
+from apps.home.hashing import hashing_service
+from apps.home.profiling import external_call
 
 
-load_dotenv(".env")
+# The Fernet cipher suite, built the first time an order id is encrypted
+@lru_cache(maxsize=None)
+def cipher_suite():
+    from cryptography.fernet import Fernet
 
-# Initialise the Fernet cipher suite
-cipher_suite = Fernet(os.getenv("FERNET_KEY").encode())
+    key = os.getenv("FERNET_KEY")
+    if not key:
+        raise RuntimeError("FERNET_KEY is not set, order ids cannot be encrypted")
+    return Fernet(key.encode())
 
 
 # Function to encrypt the order_id
 def encrypt_order_id(order_id):
-    return cipher_suite.encrypt(str(order_id).encode()).decode()
+    return cipher_suite().encrypt(str(order_id).encode()).decode()
 
 
 # Function to decrypt the encrypted order_id
 def decrypt_order_id(encrypted_order_id):
-    return int(cipher_suite.decrypt(encrypted_order_id.encode()).decode())
+    return int(cipher_suite().decrypt(encrypted_order_id.encode()).decode())
 
 
 def get_image_url(image_name):
+    import cloudinary.uploader
+
     cloudinary.config(
         cloud_name=os.getenv("CLOUD_NAME"),
         api_key=os.getenv("API_KEY"),
         api_secret=os.getenv("API_SECRET"),
     )
-    return cloudinary.uploader.upload(image_name)["url"]
+    with external_call("cloudinary"):
+        return cloudinary.uploader.upload(image_name)["url"]
 
 
 def admin_required(func):
@@ -73,38 +77,28 @@ def is_valid_password(password: str) -> bool:
 
 
 # Inspiration -> https://www.vitoshacademy.com/hashing-passwords-in-python/
+# The PBKDF2 work runs in `hashing_service`'s process pool, both of these raise
+# HashingBusy when it is saturated.
 def hash_pass(password):
     """Hash a password for storing."""
 
-    salt = hashlib.sha256(os.urandom(60)).hexdigest().encode("ascii")
-    pwdhash = hashlib.pbkdf2_hmac("sha512", password.encode("utf-8"), salt, 100000)
-    pwdhash = binascii.hexlify(pwdhash)
-    return salt + pwdhash  # return bytes
+    return hashing_service.hash(password)  # return bytes
 
 
 def verify_pass(provided_password, stored_password):
     """Verify a stored password against one provided by user"""
 
-    stored_password = stored_password.decode("ascii")
-    salt = stored_password[:64]
-    stored_password = stored_password[64:]
-    pwdhash = hashlib.pbkdf2_hmac(
-        "sha512", provided_password.encode("utf-8"), salt.encode("ascii"), 100000
-    )
-    pwdhash = binascii.hexlify(pwdhash).decode("ascii")
-    return pwdhash == stored_password
+    return hashing_service.verify(provided_password, stored_password)
 
 
 def send_enquiry_email_to_admin(company_email, company_name, name, email, message):
-    mail = Mail(current_app)
+    # Delivered by the background notification worker, not inside the request
+    from apps.notifications.queue import enqueue_email
+
     try:
-        sender = "noreply@app.com"
         # Send a notification email to the admin
         admin_msg_title = "New Message Received"
-        admin_msg = Message(admin_msg_title, sender=sender, recipients=[company_email])
         admin_msg_body = f"New message received from {name} ({email})."
-        admin_msg.body = admin_msg_body
-        admin_msg.reply_to = company_email
         admin_data = {
             "app_name": company_name,
             "title": admin_msg_title,
@@ -112,9 +106,12 @@ def send_enquiry_email_to_admin(company_email, company_name, name, email, messag
             "name": name,
             "message": message,
         }
-        admin_msg.html = render_template("emails/contact_admin.html", data=admin_data)
-
-        # Send the notification email to the admin
-        mail.send(admin_msg)
+        enqueue_email(
+            company_email,
+            admin_msg_title,
+            admin_msg_body,
+            html=render_template("emails/contact_admin.html", data=admin_data),
+            reply_to=company_email,
+        )
     except Exception as e:
         print(e)
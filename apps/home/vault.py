@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+VAULT_CACHE_SIZE = int(os.getenv("VAULT_CACHE_SIZE", "10000"))
+# Plaintext never stays in memory longer than this without being decrypted again
+VAULT_CACHE_TTL = float(os.getenv("VAULT_CACHE_TTL", "300"))
+ENCRYPT_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def cipher():
+    # Built on first use, so importing the models needs neither the keys nor
+    # cryptography. Newest key first, older keys stay listed until every row
+    # has been rotated
+    from cryptography.fernet import Fernet, MultiFernet
+
+    keys = os.getenv("CREDENTIALS_KEYS") or os.getenv("FERNET_KEY") or ""
+    keys = [key.strip() for key in keys.split(",") if key.strip()]
+    if not keys:
+        raise RuntimeError(
+            "No credentials key configured, set CREDENTIALS_KEYS (or FERNET_KEY) "
+            "to one or more comma-separated Fernet keys"
+        )
+    return MultiFernet([Fernet(key.encode()) for key in keys])
+
+
+def encrypt_secret(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode()
+    return cipher().encrypt(bytes(value)).decode()
+
+
+def decrypt_secret(token):
+    """Decrypt into a bytearray, which `zeroize` can wipe later."""
+    if token is None:
+        return None
+    return bytearray(cipher().decrypt(token.encode()))
+
+
+def is_encrypted(value):
+    from cryptography.fernet import InvalidToken
+
+    try:
+        cipher().decrypt(value.encode())
+    except (InvalidToken, TypeError, ValueError):
+        return False
+    return True
+
+
+def zeroize(buffer):
+    if isinstance(buffer, bytearray):
+        buffer[:] = bytes(len(buffer))
+
+
+class Credentials:
+    """Decrypted exchange credentials, held as wipeable bytearrays."""
+
+    __slots__ = ("api_key", "secret_key", "passphrase", "expires")
+
+    def __init__(self, api_key, secret_key, passphrase, expires):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.expires = expires
+
+    def wipe(self):
+        zeroize(self.api_key)
+        zeroize(self.secret_key)
+        zeroize(self.passphrase)
+
+
+class CredentialVault:
+    """A bounded, expiring cache of decrypted credentials keyed by account id.
+
+    Callers hand in the sealed (encrypted) column values along with the id, so a
+    miss decrypts in memory and never goes back to the database. Anything that
+    leaves the cache, by TTL, LRU eviction or invalidation, is zeroed first.
+    """
+
+    def __init__(self, max_size=VAULT_CACHE_SIZE, ttl=VAULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _unseal(self, sealed, now):
+        api_key, secret_key, passphrase = sealed
+        return Credentials(
+            decrypt_secret(api_key),
+            decrypt_secret(secret_key),
+            decrypt_secret(passphrase),
+            now + self.ttl,
+        )
+
+    def _store(self, account_id, credentials):
+        previous = self._entries.pop(account_id, None)
+        if previous is not None:
+            previous.wipe()
+        self._entries[account_id] = credentials
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            evicted.wipe()
+            self.evictions += 1
+
+    def get(self, account_id, sealed, now=None):
+        now = now or time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        with self._lock:
+            credentials = self._entries.get(account_id)
+            if credentials is not None and credentials.expires > now:
+                self._entries.move_to_end(account_id)
+                self.hits += 1
+                return credentials
+            self.misses += 1
+            credentials = self._unseal(sealed, now)
+            self._store(account_id, credentials)
+            return credentials
+
+    def preload(self, items, now=None):
+        """Decrypt many (account_id, sealed) pairs at once, e.g. on start up."""
+        now = now or time.monotonic()
+        unsealed = [
+            (account_id, self._unseal(sealed, now)) for account_id, sealed in items
+        ]
+        with self._lock:
+            for account_id, credentials in unsealed:
+                self._store(account_id, credentials)
+        return len(unsealed)
+
+    def invalidate(self, account_id):
+        with self._lock:
+            credentials = self._entries.pop(account_id, None)
+        if credentials is not None:
+            credentials.wipe()
+
+    def sweep(self, now=None):
+        """Wipe and drop every expired entry."""
+        now = now or time.monotonic()
+        with self._lock:
+            self._next_sweep = now + self.ttl / 4
+            expired = [k for k, c in self._entries.items() if c.expires <= now]
+            for account_id in expired:
+                self._entries.pop(account_id).wipe()
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            for credentials in self._entries.values():
+                credentials.wipe()
+            self._entries.clear()
+
+
+credential_vault = CredentialVault()
+
+
+def encrypt_stored_credentials(rotate=False, batch_size=ENCRYPT_BATCH_SIZE):
+    """Encrypt account credentials still stored in plain text.
+
+    With `rotate` every value is also re-encrypted under the newest key. Safe to
+    run repeatedly, returns the number of rows rewritten. Needs an app context.
+    """
+    from apps import db
+    from apps.home.models import ChangeLogEntry, UserAccountMonitor
+
+    Account = UserAccountMonitor
+    rewritten = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(
+                Account.ID, Account.api_key, Account.secret_key, Account.passphrase
+            )
+            .where(Account.ID > last_id)
+            .order_by(Account.ID)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return rewritten
+        last_id = rows[-1].ID
+        updates = []
+        for row in rows:
+            values = {}
+            for column in ("api_key", "secret_key", "passphrase"):
+                value = getattr(row, column)
+                if value is None:
+                    continue
+                if not is_encrypted(value):
+                    values[column] = encrypt_secret(value)
+                elif rotate:
+                    values[column] = cipher().rotate(value.encode()).decode()
+            if values:
+                updates.append((row.ID, values))
+        for account_id, values in updates:
+            db.session.execute(
+                db.update(Account).where(Account.ID == account_id).values(**values)
+            )
+        if updates:
+            # Core updates skip the ORM hook, log them so running pollers reload
+            db.session.execute(
+                db.insert(ChangeLogEntry),
+                [
+                    {"table_name": Account.__tablename__, "row_id": account_id}
+                    for account_id, _ in updates
+                ],
+            )
+        db.session.commit()
+        rewritten += len(updates)
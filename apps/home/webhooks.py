@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from apps import db
+from apps.home.models import Order, StripeEvent
+from apps.home.payments import get_stripe
+
+# Without it nothing is verified, stripe accepts a payload signed with an empty key
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+
+STATUS_PENDING = "pending"
+STATUS_APPLIED = "applied"
+STATUS_IGNORED = "ignored"
+
+# Events after which the order counts as paid
+PAID_EVENTS = frozenset(
+    ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+)
+
+
+def event_order_id(event):
+    """The order a checkout event is about, from the session's reference."""
+    session = event["data"]["object"]
+    reference = session.get("client_reference_id") or (
+        session.get("metadata") or {}
+    ).get("order_id")
+    try:
+        return int(reference)
+    except (TypeError, ValueError):
+        return None
+
+
+class WebhookNotConfigured(RuntimeError):
+    pass
+
+
+def record_event(payload, signature, secret=None):
+    """Verify a webhook delivery and queue it.
+
+    Raises WebhookNotConfigured when there is no signing secret to verify
+    against, ValueError for a malformed body and stripe's
+    SignatureVerificationError for a bad signature. Returns False when the
+    event had already been received.
+    """
+    secret = secret or STRIPE_WEBHOOK_SECRET
+    if not secret:
+        raise WebhookNotConfigured("STRIPE_WEBHOOK_SECRET is not set")
+    event = get_stripe().Webhook.construct_event(payload, signature, secret)
+    paid = event["type"] in PAID_EVENTS
+    # A completed session paid by bank transfer is still waiting on the money
+    if event["type"] == "checkout.session.completed":
+        paid = event["data"]["object"].get("payment_status") != "unpaid"
+    db.session.add(
+        StripeEvent(
+            event_id=event["id"],
+            event_type=event["type"],
+            order_id=event_order_id(event) if paid else None,
+            payload=payload if isinstance(payload, str) else payload.decode(),
+        )
+    )
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    webhook_worker.wake()
+    return True
+
+
+class WebhookWorker:
+    """Applies queued `jd_stripe_events` to orders on a background thread.
+
+    A batch is one transaction: a single UPDATE marks every paid order and
+    another marks the events done. Both are idempotent, so two processes
+    draining the queue at once only repeat each other's work.
+    """
+
+    def __init__(
+        self, batch_size=WEBHOOK_BATCH_SIZE, poll_interval=WEBHOOK_POLL_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.applied = 0
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+    def ensure_started(self, app):
+        # Threads don't survive gunicorn's fork, so check per process
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._app = app
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._loop, name="webhook-worker", daemon=True
+            )
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stopping:
+            processed = 0
+            with self._app.app_context():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    logging.exception(e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            # A full batch means there is probably more waiting
+            if processed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self, now=None):
+        """Apply one batch of events, returning how many it covered."""
+        E = StripeEvent
+        now = now or datetime.utcnow()
+        events = db.session.execute(
+            db.select(E.id, E.order_id)
+            .where(E.status == STATUS_PENDING)
+            .order_by(E.id)
+            .limit(self.batch_size)
+        ).all()
+        if not events:
+            db.session.commit()
+            return 0
+
+        order_ids = {event.order_id for event in events if event.order_id}
+        if order_ids:
+            db.session.execute(
+                db.update(Order)
+                .where(Order.id.in_(order_ids), Order.payment_status.is_(False))
+                .values(payment_status=True)
+            )
+        event_ids = [event.id for event in events]
+        db.session.execute(
+            db.update(E)
+            .where(E.id.in_(event_ids))
+            .values(
+                status=db.case(
+                    (E.order_id.is_not(None), STATUS_APPLIED), else_=STATUS_IGNORED
+                ),
+                date_applied=now,
+            )
+        )
+        db.session.commit()
+        self.applied += len(order_ids)
+        return len(events)
+
+
+webhook_worker = WebhookWorker()
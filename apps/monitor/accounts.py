@@ -0,0 +1,537 @@
+"""Polls the exchange accounts registered in `jd_monitor_accounts`.
+
+    python -m apps.monitor.accounts
+    ACCOUNT_API_BASE_URL=http://127.0.0.1:9700 python -m apps.monitor.accounts
+
+Thousands of accounts share one asyncio loop and one pooled HTTP session per
+exchange. Every request first takes a token from its API key's bucket and then
+from its exchange's, so neither limit is ever exceeded however many accounts
+come due together.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import heapq
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from apps.home.vault import credential_vault
+from apps.monitor.engine import normalize_exchange
+
+ACCOUNT_POLL_INTERVAL = float(os.getenv("ACCOUNT_POLL_INTERVAL", "30"))
+ACCOUNT_POLL_MIN_SECONDS = float(os.getenv("ACCOUNT_POLL_MIN_SECONDS", "5"))
+ACCOUNT_POLL_MAX_SECONDS = float(os.getenv("ACCOUNT_POLL_MAX_SECONDS", "300"))
+# Each poll is rescheduled somewhere within +/- this share of its interval
+ACCOUNT_POLL_JITTER = 0.2
+ACCOUNT_POLL_TIMEOUT = float(os.getenv("ACCOUNT_POLL_TIMEOUT", "10"))
+ACCOUNT_MAX_IN_FLIGHT = int(os.getenv("ACCOUNT_MAX_IN_FLIGHT", "256"))
+ACCOUNT_CONNECTIONS_PER_EXCHANGE = int(
+    os.getenv("ACCOUNT_CONNECTIONS_PER_EXCHANGE", "32")
+)
+# Points every exchange at one base URL, e.g. apps.monitor.mockexchange
+ACCOUNT_API_BASE_URL = os.getenv("ACCOUNT_API_BASE_URL")
+
+# (requests per second, burst), kept well inside each exchange's published limits
+EXCHANGE_RATE_LIMITS = {
+    "binance": (20.0, 40),
+    "kucoin": (10.0, 20),
+    "okx": (10.0, 20),
+}
+DEFAULT_EXCHANGE_RATE_LIMIT = (5.0, 10)
+KEY_RATE_LIMIT = (float(os.getenv("ACCOUNT_KEY_RATE", "1")), 3)
+
+ACCOUNT_STATUS_STOPPED = 0
+
+ACCOUNT_CLIENTS = {}
+
+
+def register_account_client(name):
+    """Class decorator making a client available to `AccountScheduler`."""
+
+    def decorator(cls):
+        cls.exchange = name
+        ACCOUNT_CLIENTS[name] = cls
+        return cls
+
+    return decorator
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AccountPollError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `capacity`.
+
+    `delay` reserves a token even when none is left, the balance going negative
+    queues callers fairly behind one another.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Reserve a token, returning how long to wait before using it."""
+        self._refill(now or time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now=None):
+        """Take a token only if one is available right now."""
+        self._refill(now or time.monotonic())
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self):
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class AccountSpec:
+    """What the scheduler needs of a UserAccountMonitor, plus its poll state."""
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "exchange",
+        "trade_type",
+        "sealed",
+        "interval",
+        "due",
+        "snapshot",
+        "failures",
+        "polls",
+    )
+
+    def __init__(
+        self,
+        id,
+        user_id,
+        exchange,
+        sealed,
+        trade_type=None,
+        interval=ACCOUNT_POLL_INTERVAL,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.exchange = normalize_exchange(exchange)
+        self.trade_type = trade_type
+        # Encrypted (api_key, secret_key, passphrase), opened by the vault per poll
+        self.sealed = tuple(sealed)
+        self.interval = interval
+        self.due = 0.0
+        self.snapshot = None
+        self.failures = 0
+        self.polls = 0
+
+    @classmethod
+    def from_model(cls, account):
+        return cls(
+            id=account.ID,
+            user_id=account.user_id,
+            exchange=account.exchange_name,
+            sealed=account.sealed_credentials,
+            trade_type=account.trade_type,
+        )
+
+
+def load_account_specs(account_ids=None):
+    """AccountSpecs for the running monitors (only `account_ids` if given).
+
+    Needs an application context.
+    """
+    from apps.home.models import UserAccountMonitor
+
+    accounts = UserAccountMonitor.query.filter(
+        UserAccountMonitor.task_status != ACCOUNT_STATUS_STOPPED
+    )
+    if account_ids is not None:
+        accounts = accounts.filter(UserAccountMonitor.ID.in_(account_ids))
+    for account in accounts.yield_per(1000):
+        if normalize_exchange(account.exchange_name) in ACCOUNT_CLIENTS:
+            yield AccountSpec.from_model(account)
+
+
+def next_interval(interval, changes):
+    """Busy accounts are polled twice as often, quiet ones gradually less."""
+    if changes:
+        return max(ACCOUNT_POLL_MIN_SECONDS, interval / 2)
+    return min(ACCOUNT_POLL_MAX_SECONDS, interval * 1.25)
+
+
+def count_changes(before, after):
+    if before is None:
+        return 0
+    return sum(
+        1 for key in before.keys() | after.keys() if before.get(key) != after.get(key)
+    )
+
+
+def _hmac(secret, message):
+    # `secret` is the vault's bytearray, it is never copied into a str
+    return hmac.new(secret, message.encode(), hashlib.sha256)
+
+
+class AccountClient:
+    """Reads an account's balances from one exchange's REST API.
+
+    `fetch` returns a {key: value} snapshot; the scheduler only compares
+    successive snapshots, so each exchange picks whatever key suits it.
+    """
+
+    exchange = None
+    base_url = None
+
+    def __init__(self, session, base_url=None):
+        self.session = session
+        self.base_url = (base_url or self.base_url).rstrip("/")
+
+    async def _get(self, path, headers):
+        async with self.session.get(self.base_url + path, headers=headers) as response:
+            if response.status in (418, 429):
+                raise RateLimited(float(response.headers.get("Retry-After", "1")))
+            if response.status != 200:
+                raise AccountPollError(f"{self.exchange} answered {response.status}")
+            return await response.json(content_type=None)
+
+    async def fetch(self, account, credentials):
+        """Sign before the first await, the vault may wipe `credentials` after."""
+        raise NotImplementedError
+
+
+@register_account_client("binance")
+class BinanceAccountClient(AccountClient):
+    base_url = "https://api.binance.com"
+
+    async def fetch(self, account, credentials):
+        query = urlencode({"timestamp": int(time.time() * 1000), "recvWindow": 5000})
+        signature = _hmac(credentials.secret_key, query).hexdigest()
+        data = await self._get(
+            f"/api/v3/account?{query}&signature={signature}",
+            {"X-MBX-APIKEY": credentials.api_key.decode()},
+        )
+        return {
+            item["asset"]: (item["free"], item["locked"])
+            for item in data["balances"]
+            if float(item["free"]) or float(item["locked"])
+        }
+
+
+@register_account_client("kucoin")
+class KucoinAccountClient(AccountClient):
+    base_url = "https://api.kucoin.com"
+
+    async def fetch(self, account, credentials):
+        path = "/api/v1/accounts"
+        stamp = str(int(time.time() * 1000))
+        data = await self._get(
+            path,
+            {
+                "KC-API-KEY": credentials.api_key.decode(),
+                "KC-API-SIGN": base64.b64encode(
+                    _hmac(credentials.secret_key, stamp + "GET" + path).digest()
+                ).decode(),
+                "KC-API-TIMESTAMP": stamp,
+                "KC-API-PASSPHRASE": base64.b64encode(
+                    hmac.new(
+                        credentials.secret_key,
+                        credentials.passphrase or b"",
+                        hashlib.sha256,
+                    ).digest()
+                ).decode(),
+                "KC-API-KEY-VERSION": "2",
+            },
+        )
+        return {
+            (item["type"], item["currency"]): (item["available"], item["holds"])
+            for item in data["data"]
+        }
+
+
+@register_account_client("okx")
+class OkxAccountClient(AccountClient):
+    base_url = "https://www.okx.com"
+
+    async def fetch(self, account, credentials):
+        path = "/api/v5/account/balance"
+        stamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        stamp = stamp.replace("+00:00", "Z")
+        data = await self._get(
+            path,
+            {
+                "OK-ACCESS-KEY": credentials.api_key.decode(),
+                "OK-ACCESS-SIGN": base64.b64encode(
+                    _hmac(credentials.secret_key, stamp + "GET" + path).digest()
+                ).decode(),
+                "OK-ACCESS-TIMESTAMP": stamp,
+                "OK-ACCESS-PASSPHRASE": (credentials.passphrase or b"").decode(),
+            },
+        )
+        return {
+            item["ccy"]: (item["availBal"], item["frozenBal"])
+            for entry in data["data"]
+            for item in entry["details"]
+        }
+
+
+class AccountScheduler:
+    """Runs every account's poll on its own jittered, adaptive schedule.
+
+    Due times live in a heap; removed or rescheduled accounts leave stale heap
+    entries behind that are skipped when popped.
+    """
+
+    def __init__(
+        self,
+        on_update=None,
+        base_url=ACCOUNT_API_BASE_URL,
+        rate_limits=None,
+        key_rate_limit=KEY_RATE_LIMIT,
+        max_in_flight=ACCOUNT_MAX_IN_FLIGHT,
+        vault=None,
+    ):
+        self.on_update = on_update
+        self.vault = vault or credential_vault
+        self.base_url = base_url
+        self.rate_limits = {**EXCHANGE_RATE_LIMITS, **(rate_limits or {})}
+        self.key_rate_limit = key_rate_limit
+        self.max_in_flight = max_in_flight
+        self.polls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._accounts = {}
+        self._heap = []
+        self._sessions = {}
+        self._clients = {}
+        self._exchange_buckets = {}
+        self._key_buckets = {}
+        self._in_flight = set()
+        self._wakeup = None
+        self._slots = None
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __contains__(self, account_id):
+        return account_id in self._accounts
+
+    def _schedule(self, account, delay):
+        jitter = random.uniform(1 - ACCOUNT_POLL_JITTER, 1 + ACCOUNT_POLL_JITTER)
+        account.due = time.monotonic() + delay * jitter
+        heapq.heappush(self._heap, (account.due, account.id))
+        if self._wakeup is not None and self._heap[0][1] == account.id:
+            self._wakeup.set()
+
+    def add(self, account: AccountSpec):
+        previous = self._accounts.get(account.id)
+        if previous is not None:
+            account.interval = previous.interval
+            account.snapshot = previous.snapshot
+            if previous.sealed != account.sealed:
+                self.vault.invalidate(account.id)
+        self._accounts[account.id] = account
+        # New accounts are spread over a whole interval instead of all polling now
+        self._schedule(account, random.uniform(0, account.interval))
+
+    def account_ids(self):
+        return list(self._accounts)
+
+    def remove(self, account_id):
+        self.vault.invalidate(account_id)
+        return self._accounts.pop(account_id, None) is not None
+
+    def preload_credentials(self):
+        """Decrypt every account's credentials in one go rather than per poll."""
+        return self.vault.preload(
+            (account.id, account.sealed) for account in self._accounts.values()
+        )
+
+    def apply(self, specs, removed):
+        """Take a batch of changes, as produced for `EngineSync`."""
+        for account_id in removed or ():
+            self.remove(account_id)
+        for spec in specs:
+            self.add(spec)
+        return len(specs) + len(removed or ())
+
+    def _client(self, exchange):
+        client = self._clients.get(exchange)
+        if client is None:
+            import aiohttp
+
+            session = self._sessions[exchange] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=ACCOUNT_CONNECTIONS_PER_EXCHANGE, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=ACCOUNT_POLL_TIMEOUT),
+            )
+            client = ACCOUNT_CLIENTS[exchange](session, self.base_url)
+            self._clients[exchange] = client
+        return client
+
+    def _exchange_bucket(self, exchange):
+        bucket = self._exchange_buckets.get(exchange)
+        if bucket is None:
+            rate, burst = self.rate_limits.get(exchange, DEFAULT_EXCHANGE_RATE_LIMIT)
+            bucket = self._exchange_buckets[exchange] = TokenBucket(rate, burst)
+        return bucket
+
+    def _key_bucket(self, api_key):
+        # Several monitors may share a key, the exchange counts them together
+        key = hashlib.sha256(api_key).digest()
+        bucket = self._key_buckets.get(key)
+        if bucket is None:
+            bucket = self._key_buckets[key] = TokenBucket(*self.key_rate_limit)
+        return bucket
+
+    async def _poll(self, account):
+        delay = account.interval
+        try:
+            credentials = self.vault.get(account.id, account.sealed)
+            await self._key_bucket(credentials.api_key).acquire()
+            await self._exchange_bucket(account.exchange).acquire()
+            # Looked up again, an eviction while waiting would have wiped them
+            credentials = self.vault.get(account.id, account.sealed)
+            snapshot = await self._client(account.exchange).fetch(account, credentials)
+            self.polls += 1
+            account.polls += 1
+            account.failures = 0
+            changes = count_changes(account.snapshot, snapshot)
+            account.snapshot = snapshot
+            delay = account.interval = next_interval(account.interval, changes)
+            if self.on_update is not None:
+                self.on_update(account, snapshot, changes)
+        except asyncio.CancelledError:
+            raise
+        except RateLimited as e:
+            self.rate_limited += 1
+            delay = max(e.retry_after, account.interval)
+        except Exception as e:
+            self.errors += 1
+            account.failures += 1
+            delay = min(
+                ACCOUNT_POLL_MAX_SECONDS, account.interval * 2**account.failures
+            )
+            logging.warning(f"Polling account {account.id} failed: {e}")
+        finally:
+            self._slots.release()
+        if self._accounts.get(account.id) is account:
+            self._schedule(account, delay)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        heap = self._heap
+        while True:
+            if not heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            due, account_id = heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(heap)
+            account = self._accounts.get(account_id)
+            if account is None or account.due != due:
+                continue
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._poll(account))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def close(self):
+        for task in list(self._in_flight):
+            task.cancel()
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+        self._clients.clear()
+
+
+def main():
+    from apps import create_app
+    from apps.config import config_dict
+    from apps.monitor.sync import SYNC_INTERVAL, ChangeTracker
+
+    logging.basicConfig(level=logging.INFO)
+    debug = os.getenv("DEBUG", "False") == "True"
+    app = create_app(config_dict["Debug" if debug else "Production"])
+    table_name = "jd_monitor_accounts"
+
+    def fetch_changes(tracker):
+        with app.app_context():
+            changed = tracker.pull()
+            if changed is None:
+                tracker.start()
+                return list(load_account_specs()), None
+            ids = changed.get(table_name)
+            if not ids:
+                return [], ()
+            specs = list(load_account_specs(ids))
+            return specs, ids - {spec.id for spec in specs}
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        scheduler = AccountScheduler()
+        tracker = ChangeTracker()
+        with app.app_context():
+            tracker.start()
+            specs = list(load_account_specs())
+        scheduler.apply(specs, ())
+        scheduler.preload_credentials()
+        logging.info(f"Polling {len(scheduler)} exchange accounts")
+        runner = asyncio.ensure_future(scheduler.run())
+        try:
+            while True:
+                await asyncio.sleep(SYNC_INTERVAL)
+                try:
+                    specs, removed = await loop.run_in_executor(
+                        None, fetch_changes, tracker
+                    )
+                    if removed is None:
+                        loaded = {spec.id for spec in specs}
+                        removed = [
+                            i for i in scheduler.account_ids() if i not in loaded
+                        ]
+                    scheduler.apply(specs, removed)
+                except Exception as e:
+                    logging.exception(e)
+        finally:
+            runner.cancel()
+            await scheduler.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+import bisect
+import csv
+import math
+from typing import NamedTuple
+
+# Tasks in one of these states are never loaded into the engine
+INACTIVE_TASK_STATUSES = frozenset(
+    ("stopped", "paused", "completed", "cancelled", "deleted", "expired")
+)
+
+DIRECTION_UP = "up"
+DIRECTION_DOWN = "down"
+DIRECTION_BOTH = "both"
+
+_DIRECTION_ALIASES = {
+    "up": DIRECTION_UP,
+    "rise": DIRECTION_UP,
+    "increase": DIRECTION_UP,
+    "long": DIRECTION_UP,
+    "down": DIRECTION_DOWN,
+    "fall": DIRECTION_DOWN,
+    "drop": DIRECTION_DOWN,
+    "decrease": DIRECTION_DOWN,
+    "short": DIRECTION_DOWN,
+}
+
+
+class Tick(NamedTuple):
+    exchange: str
+    symbol: str
+    ts_ms: int
+    price: float
+    volume: float = 0.0
+
+
+class Alert(NamedTuple):
+    task_id: int
+    user_id: int
+    exchange: str
+    symbol: str
+    direction: str
+    move: float  # observed move in percent, always positive
+    ts_ms: int
+    price: float
+
+
+def normalize_exchange(exchange: str) -> str:
+    return exchange.strip().lower()
+
+
+def normalize_symbol(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def normalize_direction(direction) -> str:
+    if not direction:
+        return DIRECTION_BOTH
+    return _DIRECTION_ALIASES.get(direction.strip().lower(), DIRECTION_BOTH)
+
+
+def parse_symbols(symbols) -> tuple:
+    """Split the comma packed `AssignedPricingTask.symbols` column."""
+    if not symbols:
+        return ()
+    return tuple(
+        dict.fromkeys(
+            normalize_symbol(symbol) for symbol in symbols.split(",") if symbol.strip()
+        )
+    )
+
+
+def is_task_active(status) -> bool:
+    return not status or status.strip().lower() not in INACTIVE_TASK_STATUSES
+
+
+class TaskSpec:
+    """The subset of an AssignedPricingTask the engine needs to evaluate it."""
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "exchange",
+        "symbols",
+        "percentage",
+        "direction",
+        "time_ms",
+        "muted_until",
+    )
+
+    def __init__(self, id, user_id, exchange, symbols, percentage, direction, time_ms):
+        self.id = id
+        self.user_id = user_id
+        self.exchange = normalize_exchange(exchange)
+        self.symbols = symbols if isinstance(symbols, tuple) else parse_symbols(symbols)
+        self.percentage = float(percentage)
+        self.direction = normalize_direction(direction)
+        self.time_ms = int(time_ms)
+        self.muted_until = 0
+
+    @classmethod
+    def from_model(cls, task):
+        return cls(
+            id=task.id,
+            user_id=task.user_id,
+            exchange=task.exchange,
+            symbols=task.symbols,
+            percentage=task.percentage,
+            direction=task.direction,
+            time_ms=task.time_ms,
+        )
+
+    @property
+    def is_evaluable(self) -> bool:
+        return bool(self.symbols) and self.percentage > 0 and self.time_ms > 0
+
+
+def load_task_specs(task_ids=None):
+    """TaskSpecs for the active, evaluable tasks (only `task_ids` if given).
+
+    Needs an application context.
+    """
+    from apps import db
+    from apps.home.models import AssignedPricingTask, PricingTaskSymbol
+
+    tasks = AssignedPricingTask.query
+    symbol_rows = db.select(PricingTaskSymbol.task_id, PricingTaskSymbol.symbol)
+    if task_ids is not None:
+        tasks = tasks.filter(AssignedPricingTask.id.in_(task_ids))
+        symbol_rows = symbol_rows.where(PricingTaskSymbol.task_id.in_(task_ids))
+
+    symbols = {}
+    for task_id, symbol in db.session.execute(symbol_rows):
+        symbols.setdefault(task_id, []).append(symbol)
+
+    for task in tasks.yield_per(1000):
+        if is_task_active(task.status) and task.percentage and task.time_ms:
+            spec = TaskSpec.from_model(task)
+            # Tasks not yet backfilled fall back to the packed column
+            if task.id in symbols:
+                spec.symbols = tuple(symbols[task.id])
+            yield spec
+
+
+class _MoveWindow:
+    """The tasks on one symbol that share a window length, sorted by threshold."""
+
+    __slots__ = (
+        "span_ms",
+        "up_thresholds",
+        "up_tasks",
+        "down_thresholds",
+        "down_tasks",
+    )
+
+    def __init__(self, span_ms):
+        self.span_ms = span_ms
+        self.up_thresholds = []
+        self.up_tasks = []
+        self.down_thresholds = []
+        self.down_tasks = []
+
+    def __len__(self):
+        return len(self.up_tasks) + len(self.down_tasks)
+
+    def add(self, task):
+        if task.direction != DIRECTION_DOWN:
+            index = bisect.bisect_right(self.up_thresholds, task.percentage)
+            self.up_thresholds.insert(index, task.percentage)
+            self.up_tasks.insert(index, task)
+        if task.direction != DIRECTION_UP:
+            index = bisect.bisect_right(self.down_thresholds, task.percentage)
+            self.down_thresholds.insert(index, task.percentage)
+            self.down_tasks.insert(index, task)
+
+    def remove(self, task_id):
+        for thresholds, tasks in (
+            (self.up_thresholds, self.up_tasks),
+            (self.down_thresholds, self.down_tasks),
+        ):
+            for index, task in enumerate(tasks):
+                if task.id == task_id:
+                    del thresholds[index]
+                    del tasks[index]
+                    break
+
+
+class _MonotonicQueue:
+    """Sliding-window minimum (or maximum, with `keep_max`) over timestamped prices.
+
+    Entries are kept in two parallel lists so the minimum of any shorter suffix
+    window is one bisect on the timestamps away. Expired entries are skipped with a
+    head offset and compacted away in bulk.
+    """
+
+    __slots__ = ("keep_max", "stamps", "prices", "head")
+
+    def __init__(self, keep_max=False):
+        self.keep_max = keep_max
+        self.stamps = []
+        self.prices = []
+        self.head = 0
+
+    def push(self, ts_ms, price, cutoff):
+        stamps, prices, head = self.stamps, self.prices, self.head
+        if self.keep_max:
+            while len(prices) > head and prices[-1] <= price:
+                prices.pop()
+                stamps.pop()
+        else:
+            while len(prices) > head and prices[-1] >= price:
+                prices.pop()
+                stamps.pop()
+        stamps.append(ts_ms)
+        prices.append(price)
+        while stamps[head] < cutoff:
+            head += 1
+        if head > 256 and head * 2 > len(stamps):
+            del stamps[:head]
+            del prices[:head]
+            head = 0
+        self.head = head
+
+    def extreme(self, cutoff):
+        """The min (max) over entries at or after `cutoff`."""
+        return self.prices[bisect.bisect_left(self.stamps, cutoff, self.head)]
+
+
+class _SymbolBook:
+    """Everything subscribed to one (exchange, symbol).
+
+    One pair of monotonic queues spanning the longest task window serves all the
+    shorter windows too. A tick whose move over the longest window is below the
+    smallest threshold on the book is dismissed without visiting any task.
+    """
+
+    __slots__ = (
+        "exchange",
+        "symbol",
+        "windows",
+        "lows",
+        "highs",
+        "max_span",
+        "min_up",
+        "min_down",
+        "_by_span",
+    )
+
+    def __init__(self, exchange, symbol):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.windows = []
+        self.lows = _MonotonicQueue()
+        self.highs = _MonotonicQueue(keep_max=True)
+        self.max_span = 0
+        self.min_up = math.inf
+        self.min_down = math.inf
+        self._by_span = {}
+
+    def __len__(self):
+        return len(self.windows)
+
+    def add(self, task):
+        window = self._by_span.get(task.time_ms)
+        if window is None:
+            window = self._by_span[task.time_ms] = _MoveWindow(task.time_ms)
+            self.windows.append(window)
+        window.add(task)
+        self.max_span = max(self.max_span, task.time_ms)
+        if task.direction != DIRECTION_DOWN:
+            self.min_up = min(self.min_up, task.percentage)
+        if task.direction != DIRECTION_UP:
+            self.min_down = min(self.min_down, task.percentage)
+
+    def remove(self, task):
+        window = self._by_span.get(task.time_ms)
+        if window is None:
+            return
+        window.remove(task.id)
+        if not len(window):
+            del self._by_span[task.time_ms]
+            self.windows.remove(window)
+        self._refresh()
+
+    def _refresh(self):
+        windows = self.windows
+        self.max_span = max((window.span_ms for window in windows), default=0)
+        self.min_up = min(
+            (w.up_thresholds[0] for w in windows if w.up_thresholds), default=math.inf
+        )
+        self.min_down = min(
+            (w.down_thresholds[0] for w in windows if w.down_thresholds),
+            default=math.inf,
+        )
+
+    def push(self, ts_ms, price, alerts):
+        cutoff = ts_ms - self.max_span
+        lows = self.lows
+        highs = self.highs
+        lows.push(ts_ms, price, cutoff)
+        highs.push(ts_ms, price, cutoff)
+
+        low = lows.prices[lows.head]
+        if low > 0 and (price - low) * 100.0 / low >= self.min_up:
+            for window in self.windows:
+                if not window.up_thresholds:
+                    continue
+                low = lows.extreme(ts_ms - window.span_ms)
+                move = (price - low) * 100.0 / low
+                count = bisect.bisect_right(window.up_thresholds, move)
+                if count:
+                    self._fire(
+                        window,
+                        window.up_tasks,
+                        count,
+                        DIRECTION_UP,
+                        move,
+                        ts_ms,
+                        price,
+                        alerts,
+                    )
+        high = highs.prices[highs.head]
+        if high > 0 and (high - price) * 100.0 / high >= self.min_down:
+            for window in self.windows:
+                if not window.down_thresholds:
+                    continue
+                high = highs.extreme(ts_ms - window.span_ms)
+                move = (high - price) * 100.0 / high
+                count = bisect.bisect_right(window.down_thresholds, move)
+                if count:
+                    self._fire(
+                        window,
+                        window.down_tasks,
+                        count,
+                        DIRECTION_DOWN,
+                        move,
+                        ts_ms,
+                        price,
+                        alerts,
+                    )
+
+    def _fire(self, window, tasks, count, direction, move, ts_ms, price, alerts):
+        # A task that fired stays quiet for one window so it does not re-fire per tick
+        mute_until = ts_ms + window.span_ms
+        for index in range(count):
+            task = tasks[index]
+            if task.muted_until > ts_ms:
+                continue
+            task.muted_until = mute_until
+            alerts.append(
+                Alert(
+                    task.id,
+                    task.user_id,
+                    self.exchange,
+                    self.symbol,
+                    direction,
+                    move,
+                    ts_ms,
+                    price,
+                )
+            )
+
+
+class PriceAlertEngine:
+    """Evaluates pricing tasks against a stream of ticks.
+
+    Tasks are indexed by (exchange, symbol) so a tick only touches the tasks
+    subscribed to it; everything else costs a single dict miss. Feeds that have
+    interned their symbols can skip the string key entirely with `process_id`.
+    `book_factory` picks the per-symbol detector, see `apps.monitor.window` for
+    the NumPy one.
+    """
+
+    def __init__(self, tasks=(), on_alert=None, book_factory=None, registry=None):
+        from apps.monitor.symbols import symbol_registry
+
+        self.on_alert = on_alert
+        self.book_factory = book_factory or _SymbolBook
+        self.registry = registry or symbol_registry
+        self._books = {}
+        # The same books, indexed by interned symbol id
+        self._books_by_id = []
+        self._tasks = {}
+        self.tick_count = 0
+        self.alert_count = 0
+        for task in tasks:
+            self.add_task(task)
+
+    @classmethod
+    def from_database(cls, on_alert=None, book_factory=None, registry=None):
+        # Needs an application context
+        engine = cls(on_alert=on_alert, book_factory=book_factory, registry=registry)
+        for spec in load_task_specs():
+            engine.add_task(spec)
+        return engine
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def task_ids(self):
+        return list(self._tasks)
+
+    def subscriptions(self):
+        """The (exchange, symbol) pairs at least one task is watching."""
+        return list(self._books)
+
+    def add_task(self, task: TaskSpec) -> bool:
+        if not task.is_evaluable:
+            return False
+        previous = self._tasks.get(task.id)
+        if previous is not None:
+            # An edited task keeps its mute so it does not re-fire straight away
+            task.muted_until = previous.muted_until
+            self.remove_task(task.id)
+        self._tasks[task.id] = task
+        for symbol in task.symbols:
+            key = (task.exchange, symbol)
+            book = self._books.get(key)
+            if book is None:
+                book = self._books[key] = self.book_factory(*key)
+                symbol_id = self.registry.intern(*key)
+                if symbol_id >= len(self._books_by_id):
+                    self._books_by_id.extend(
+                        [None] * (symbol_id + 1 - len(self._books_by_id))
+                    )
+                self._books_by_id[symbol_id] = book
+            book.add(task)
+        return True
+
+    def remove_task(self, task_id) -> bool:
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return False
+        for symbol in task.symbols:
+            key = (task.exchange, symbol)
+            book = self._books.get(key)
+            if book is None:
+                continue
+            book.remove(task)
+            if not len(book):
+                del self._books[key]
+                self._books_by_id[self.registry.get(*key)] = None
+        return True
+
+    def symbol_id(self, exchange, symbol) -> int:
+        return self.registry.intern(exchange, symbol)
+
+    def process(self, exchange, symbol, ts_ms, price) -> list:
+        """Feed one already normalised tick, returning the alerts it raised."""
+        self.tick_count += 1
+        book = self._books.get((exchange, symbol))
+        if book is None:
+            return []
+        return self._push(book, ts_ms, price)
+
+    def process_id(self, symbol_id, ts_ms, price) -> list:
+        """`process` for a tick whose symbol was interned with `symbol_id`."""
+        self.tick_count += 1
+        books = self._books_by_id
+        book = books[symbol_id] if symbol_id < len(books) else None
+        if book is None:
+            return []
+        return self._push(book, ts_ms, price)
+
+    def _push(self, book, ts_ms, price):
+        alerts = []
+        book.push(ts_ms, price, alerts)
+        if alerts:
+            self.alert_count += len(alerts)
+            if self.on_alert is not None:
+                for alert in alerts:
+                    self.on_alert(alert)
+        return alerts
+
+    def process_tick(self, tick: Tick) -> list:
+        return self.process(tick.exchange, tick.symbol, tick.ts_ms, tick.price)
+
+    def replay(self, ticks) -> int:
+        """Feed an iterable of ticks, returning the number of alerts raised."""
+        process = self.process
+        raised = 0
+        for tick in ticks:
+            raised += len(process(tick[0], tick[1], tick[2], tick[3]))
+        return raised
+
+
+# Tick files are plain CSV: ts_ms,exchange,symbol,price[,volume]; '#' starts a comment
+def read_tick_file(path):
+    with open(path, newline="") as tick_file:
+        for row in csv.reader(tick_file):
+            if not row or row[0].startswith("#"):
+                continue
+            yield Tick(
+                normalize_exchange(row[1]),
+                normalize_symbol(row[2]),
+                int(row[0]),
+                float(row[3]),
+                float(row[4]) if len(row) > 4 and row[4] else 0.0,
+            )
+
+
+def write_tick_file(path, ticks):
+    with open(path, "w", newline="") as tick_file:
+        writer = csv.writer(tick_file)
+        writer.writerow(["# ts_ms", "exchange", "symbol", "price", "volume"])
+        for tick in ticks:
+            writer.writerow(
+                [tick.ts_ms, tick.exchange, tick.symbol, tick.price, tick.volume]
+            )
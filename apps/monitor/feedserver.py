@@ -0,0 +1,142 @@
+"""A local stand-in for an exchange market-data feed.
+
+    python -m apps.monitor.feedserver --port 9500 --rate 200000
+    python -m apps.monitor.feedserver --tick-file ticks.csv
+
+Clients speak the protocol of `LocalFeedAdapter`: newline delimited JSON, with
+{"op": "subscribe" | "unsubscribe", "symbols": [...]} requests and batches of
+{"s", "p", "t", "v"} ticks streamed back for the subscribed symbols.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from apps.monitor.engine import normalize_symbol, read_tick_file
+
+
+class RandomWalkSource:
+    def __init__(self, volatility=0.0005, seed=None):
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+        self.prices = {}
+
+    def next(self, symbol):
+        price = self.prices.get(symbol)
+        if price is None:
+            price = self.rng.uniform(1, 1000)
+        price *= 1 + self.rng.gauss(0, self.volatility)
+        self.prices[symbol] = price
+        return {"s": symbol, "p": price, "t": int(time.time() * 1000), "v": 1.0}
+
+
+class TickFileSource:
+    """Loops over a recorded tick file, only yielding subscribed symbols."""
+
+    def __init__(self, path):
+        self.by_symbol = {}
+        for tick in read_tick_file(path):
+            self.by_symbol.setdefault(tick.symbol, []).append(tick)
+        self.positions = {}
+
+    def next(self, symbol):
+        ticks = self.by_symbol.get(symbol)
+        if not ticks:
+            return None
+        position = self.positions.get(symbol, 0)
+        self.positions[symbol] = (position + 1) % len(ticks)
+        tick = ticks[position]
+        return {"s": symbol, "p": tick.price, "t": tick.ts_ms, "v": tick.volume}
+
+
+class FeedServer:
+    def __init__(self, source, rate=10_000, batch=100, drop_after=None):
+        self.source = source
+        self.rate = rate
+        self.batch = batch
+        # Simulate an exchange dropping the connection after this many ticks
+        self.drop_after = drop_after
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        symbols = []
+        sender = asyncio.ensure_future(self._stream(writer, symbols))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                requested = [normalize_symbol(s) for s in request.get("symbols", ())]
+                if request.get("op") == "subscribe":
+                    symbols.extend(s for s in requested if s not in symbols)
+                elif request.get("op") == "unsubscribe":
+                    symbols[:] = [s for s in symbols if s not in requested]
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def _stream(self, writer, symbols):
+        interval = self.batch / self.rate
+        sent = 0
+        next_send = time.monotonic()
+        try:
+            while True:
+                if symbols:
+                    batch = []
+                    for _ in range(self.batch):
+                        tick = self.source.next(random.choice(symbols))
+                        if tick is not None:
+                            batch.append(tick)
+                    writer.write(json.dumps(batch).encode() + b"\n")
+                    await writer.drain()
+                    sent += len(batch)
+                    if self.drop_after and sent >= self.drop_after:
+                        writer.close()
+                        return
+                next_send += interval
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # Running behind, yield without falling further back
+                    next_send = time.monotonic()
+                    await asyncio.sleep(0)
+        except ConnectionError:
+            pass
+
+    async def serve(self, host="127.0.0.1", port=9500):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--rate", type=int, default=10_000, help="ticks/s per client")
+    parser.add_argument("--batch", type=int, default=100, help="ticks per line")
+    parser.add_argument("--tick-file", help="replay this tick file instead")
+    parser.add_argument("--volatility", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    if args.tick_file:
+        source = TickFileSource(args.tick_file)
+    else:
+        source = RandomWalkSource(args.volatility)
+    feed = FeedServer(source, rate=args.rate, batch=args.batch)
+
+    async def run():
+        server = await feed.serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
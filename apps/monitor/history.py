@@ -0,0 +1,523 @@
+"""Append-only price history on disk, with OHLC rollups kept up as ticks arrive.
+
+Every (exchange, symbol) gets a directory with one series per resolution:
+
+    <root>/<exchange>/<SYMBOL>/tick/<segment start ms>.<column>.npy
+    <root>/<exchange>/<SYMBOL>/1m/<segment start ms>.<column>.npy
+
+Each column of a segment is its own preallocated, memory-mapped .npy file, so
+a range query maps just the segments overlapping the range and slices them
+without reading anything else. Unused rows are zero, which is how the number
+of rows in a segment is recovered after a restart.
+"""
+
+import bisect
+import os
+import re
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+from apps.monitor.engine import normalize_exchange, normalize_symbol
+
+PRICE_HISTORY_DIR = os.getenv(
+    "PRICE_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "price_history"),
+)
+
+SECOND_MS = 1000
+MINUTE_MS = 60 * SECOND_MS
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+TICK_COLUMNS = ("ts", "price", "volume")
+BAR_COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+
+# name: (bar length, time covered per segment file, rows per segment file)
+RESOLUTIONS = {
+    "1s": (SECOND_MS, DAY_MS, DAY_MS // SECOND_MS),
+    "1m": (MINUTE_MS, 30 * DAY_MS, 30 * DAY_MS // MINUTE_MS),
+    "1h": (HOUR_MS, 365 * DAY_MS, 365 * DAY_MS // HOUR_MS),
+}
+TICK_SEGMENT_SPAN_MS = HOUR_MS
+TICK_SEGMENT_ROWS = int(os.getenv("PRICE_HISTORY_TICK_SEGMENT_ROWS", str(1 << 18)))
+# Live ticks are buffered per symbol and written this many at a time
+HISTORY_BATCH_SIZE = int(os.getenv("PRICE_HISTORY_BATCH_SIZE", "256"))
+# Segments a series keeps mapped between queries, the least recently used go
+HISTORY_OPEN_SEGMENTS = int(os.getenv("PRICE_HISTORY_OPEN_SEGMENTS", "8"))
+# Symbols a read-only store keeps open, the least recently queried are closed
+HISTORY_READER_SYMBOLS = int(os.getenv("PRICE_HISTORY_READER_SYMBOLS", "256"))
+
+# Exchange and symbol names become directories, nothing else may reach the path
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def _retention_days(name, default):
+    value = os.getenv(f"PRICE_HISTORY_RETENTION_{name.upper()}", default)
+    return float(value) if value else None
+
+
+# Days kept per series, an empty setting keeps it forever
+RETENTION_DAYS = {
+    "tick": _retention_days("tick", "7"),
+    "1s": _retention_days("1s", "30"),
+    "1m": _retention_days("1m", "730"),
+    "1h": _retention_days("1h", ""),
+}
+
+
+def _dtype(column):
+    return np.int64 if column == "ts" else np.float64
+
+
+class _Segment:
+    """One memory-mapped file per column, filled front to back."""
+
+    __slots__ = ("start", "columns", "arrays", "size", "capacity")
+
+    def __init__(self, directory, start, columns, capacity=None, readonly=False):
+        self.start = start
+        self.columns = columns
+        self.arrays = {}
+        # Timestamps are created last, a reader only lists segments that have them
+        for column in reversed(columns):
+            path = os.path.join(directory, f"{start}.{column}.npy")
+            if os.path.exists(path):
+                self.arrays[column] = np.load(path, mmap_mode="r" if readonly else "r+")
+            else:
+                self.arrays[column] = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=_dtype(column), shape=(capacity,)
+                )
+        self.capacity = len(self.arrays["ts"])
+        self.size = self.count()
+
+    def count(self):
+        stamps = self.arrays["ts"]
+        # Rows are written in time order and a timestamp is never 0
+        return self.capacity if stamps[-1] else int(np.argmin(stamps))
+
+    @property
+    def full(self):
+        return self.size >= self.capacity
+
+    def last_stamp(self):
+        return int(self.arrays["ts"][self.size - 1]) if self.size else None
+
+    def write(self, values):
+        """Append rows given as one array (or scalar) per column."""
+        count = len(values[0]) if np.ndim(values[0]) else 1
+        end = self.size + count
+        # Timestamps last, so a reader never counts a row that is half written
+        for column, value in reversed(list(zip(self.columns, values))):
+            self.arrays[column][self.size : end] = value
+        self.size = end
+
+    def read(self, start_ms, end_ms):
+        stamps = self.arrays["ts"][: self.size]
+        lo = np.searchsorted(stamps, start_ms, side="left")
+        hi = np.searchsorted(stamps, end_ms, side="right")
+        return {column: self.arrays[column][lo:hi] for column in self.columns}
+
+    def flush(self):
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap) and array.mode != "r":
+                array.flush()
+
+
+class _Series:
+    """A time ordered run of segments for one symbol at one resolution."""
+
+    def __init__(self, directory, columns, span_ms, rows, readonly=False):
+        self.directory = directory
+        self.columns = columns
+        self.span_ms = span_ms
+        self.rows = rows
+        self.readonly = readonly
+        self.starts = []
+        self._open = OrderedDict()
+        self.tail = None
+        self.refresh()
+
+    def refresh(self):
+        if not os.path.isdir(self.directory):
+            self.starts = []
+        else:
+            self.starts = sorted(
+                int(name.split(".", 1)[0])
+                for name in os.listdir(self.directory)
+                if name.endswith(".ts.npy")
+            )
+        # Unmap segments the writer pruned, or their disk space is never freed
+        starts = set(self.starts)
+        for start in [start for start in self._open if start not in starts]:
+            del self._open[start]
+
+    def _segment(self, start):
+        segment = self._open.get(start)
+        if segment is None:
+            segment = _Segment(
+                self.directory, start, self.columns, self.rows, self.readonly
+            )
+            self._open[start] = segment
+            if len(self._open) > HISTORY_OPEN_SEGMENTS:
+                for oldest in list(self._open):
+                    if self.tail is None or oldest != self.tail.start:
+                        del self._open[oldest]
+                        break
+        else:
+            self._open.move_to_end(start)
+        return segment
+
+    def _boundary(self, segment):
+        # Segments never straddle a span, one that fills up early is followed
+        # by another starting at its next row
+        return segment.start - segment.start % self.span_ms + self.span_ms
+
+    def _writable_tail(self, ts_ms):
+        tail = self.tail
+        if tail is None and self.starts:
+            tail = self.tail = self._segment(self.starts[-1])
+        if tail is None or tail.full or ts_ms >= self._boundary(tail):
+            if tail is not None:
+                tail.flush()
+                # Only the tail is written to, older segments need not stay mapped
+                self._open.pop(tail.start, None)
+            os.makedirs(self.directory, exist_ok=True)
+            if tail is None or ts_ms >= self._boundary(tail):
+                start = ts_ms - ts_ms % self.span_ms
+            else:
+                start = max(ts_ms, tail.start + 1)
+            tail = self.tail = self._segment(start)
+            self.starts.append(start)
+        return tail
+
+    def write(self, stamps, *values):
+        """Append rows, all later than anything already written."""
+        if not np.ndim(stamps):
+            self._writable_tail(stamps).write((stamps, *values))
+            return
+        offset = 0
+        total = len(stamps)
+        while offset < total:
+            tail = self._writable_tail(int(stamps[offset]))
+            room = tail.capacity - tail.size
+            boundary = np.searchsorted(stamps, self._boundary(tail), side="left")
+            end = min(offset + room, boundary, total)
+            tail.write([stamps[offset:end]] + [v[offset:end] for v in values])
+            offset = end
+
+    def read(self, start_ms, end_ms):
+        if self.readonly:
+            self.refresh()
+        starts = self.starts
+        # A segment starts at or before its first row, so one before the range may
+        # still hold part of it
+        first = max(bisect.bisect_left(starts, start_ms) - 1, 0)
+        parts = []
+        for start in starts[first:]:
+            if start > end_ms:
+                break
+            segment = self._segment(start)
+            if self.readonly and not segment.full:
+                # Another process appends through the same mapping, recount its rows
+                segment.size = segment.count()
+            parts.append(segment.read(start_ms, end_ms))
+        if not parts:
+            return {column: np.empty(0, _dtype(column)) for column in self.columns}
+        return {
+            column: np.concatenate([part[column] for part in parts])
+            for column in self.columns
+        }
+
+    def last_stamp(self):
+        if self.readonly:
+            self.refresh()
+        if not self.starts:
+            return None
+        segment = self._segment(self.starts[-1])
+        if self.readonly:
+            segment.size = segment.count()
+        return segment.last_stamp()
+
+    def prune(self, before_ms):
+        """Delete whole segments holding nothing at or after `before_ms`."""
+        removed = 0
+        while len(self.starts) > 1 and self.starts[1] <= before_ms:
+            start = self.starts.pop(0)
+            self._open.pop(start, None)
+            for column in self.columns:
+                path = os.path.join(self.directory, f"{start}.{column}.npy")
+                if os.path.exists(path):
+                    os.remove(path)
+            removed += 1
+        return removed
+
+    def flush(self):
+        if self.tail is not None:
+            self.tail.flush()
+
+
+def rollup(stamps, prices, volumes, length):
+    """OHLCV bars of `length` ms from time ordered ticks, one row per bar."""
+    buckets = stamps - stamps % length
+    edges = np.flatnonzero(np.diff(buckets)) + 1
+    firsts = np.concatenate(([0], edges))
+    lasts = np.concatenate((edges - 1, [len(stamps) - 1]))
+    return (
+        buckets[firsts],
+        prices[firsts],
+        np.maximum.reduceat(prices, firsts),
+        np.minimum.reduceat(prices, firsts),
+        prices[lasts],
+        np.add.reduceat(volumes, firsts),
+    )
+
+
+class _OpenBar:
+    __slots__ = ("start", "open", "high", "low", "close", "volume")
+
+    def __init__(self, start, open, high, low, close, volume):
+        self.start = start
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def values(self):
+        return (self.start, self.open, self.high, self.low, self.close, self.volume)
+
+
+class SymbolHistory:
+    """Ticks and 1s/1m/1h bars of one symbol.
+
+    Bars are built as ticks are written. The bar still in progress lives in
+    memory and is only written once a tick lands in the next one; after a
+    restart, or in a reader, it is rolled up again from the latest ticks.
+    """
+
+    def __init__(self, directory, readonly=False):
+        self.directory = directory
+        self.readonly = readonly
+        self.ticks = _Series(
+            os.path.join(directory, "tick"),
+            TICK_COLUMNS,
+            TICK_SEGMENT_SPAN_MS,
+            TICK_SEGMENT_ROWS,
+            readonly,
+        )
+        self.bars = {
+            name: _Series(
+                os.path.join(directory, name), BAR_COLUMNS, span_ms, rows, readonly
+            )
+            for name, (_, span_ms, rows) in RESOLUTIONS.items()
+        }
+        self._open_bars = dict.fromkeys(RESOLUTIONS)
+        self.last_stamp = 0
+        if self.ticks.starts and not readonly:
+            self.last_stamp = self.ticks.last_stamp() or 0
+            for name, (length, _, _) in RESOLUTIONS.items():
+                self._open_bars[name] = self._bar_from_ticks(
+                    self.last_stamp - self.last_stamp % length, length
+                )
+
+    def _bar_from_ticks(self, start_ms, length):
+        ticks = self.ticks.read(start_ms, start_ms + length - 1)
+        if not len(ticks["ts"]):
+            return None
+        return _OpenBar(*(values[0] for values in rollup(*ticks.values(), length)))
+
+    def append(self, ts_ms, price, volume=0.0):
+        if ts_ms < self.last_stamp:
+            return False
+        self.last_stamp = ts_ms
+        self.ticks.write(ts_ms, price, volume)
+        for name, (length, _, _) in RESOLUTIONS.items():
+            start = ts_ms - ts_ms % length
+            bar = self._open_bars[name]
+            if bar is not None and bar.start == start:
+                if price > bar.high:
+                    bar.high = price
+                elif price < bar.low:
+                    bar.low = price
+                bar.close = price
+                bar.volume += volume
+                continue
+            if bar is not None:
+                self.bars[name].write(*bar.values())
+            self._open_bars[name] = _OpenBar(start, price, price, price, price, volume)
+        return True
+
+    def extend(self, stamps, prices, volumes=None):
+        """Append a batch of ticks, rolling them up with NumPy instead of per tick."""
+        stamps = np.asarray(stamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = (
+            np.zeros(len(stamps)) if volumes is None else np.asarray(volumes, float)
+        )
+        # Late ticks are dropped, history only moves forward
+        keep = (
+            stamps
+            >= np.maximum.accumulate(np.concatenate(([self.last_stamp], stamps)))[:-1]
+        )
+        if not keep.all():
+            stamps, prices, volumes = stamps[keep], prices[keep], volumes[keep]
+        if not len(stamps):
+            return 0
+        self.last_stamp = int(stamps[-1])
+        self.ticks.write(stamps, prices, volumes)
+
+        for name, (length, _, _) in RESOLUTIONS.items():
+            starts, opens, highs, lows, closes, sums = rollup(
+                stamps, prices, volumes, length
+            )
+            bar = self._open_bars[name]
+            if bar is not None and bar.start == starts[0]:
+                # The batch starts inside the bar already in progress
+                opens[0] = bar.open
+                highs[0] = max(highs[0], bar.high)
+                lows[0] = min(lows[0], bar.low)
+                sums[0] += bar.volume
+            elif bar is not None:
+                self.bars[name].write(*bar.values())
+            if len(starts) > 1:
+                self.bars[name].write(
+                    starts[:-1],
+                    opens[:-1],
+                    highs[:-1],
+                    lows[:-1],
+                    closes[:-1],
+                    sums[:-1],
+                )
+            self._open_bars[name] = _OpenBar(
+                int(starts[-1]), opens[-1], highs[-1], lows[-1], closes[-1], sums[-1]
+            )
+        return len(stamps)
+
+    def query(self, start_ms, end_ms, resolution="1m"):
+        """Columns for [start_ms, end_ms], the bar in progress included."""
+        if resolution == "tick":
+            return self.ticks.read(start_ms, end_ms)
+        series = self.bars[resolution]
+        data = series.read(start_ms, end_ms)
+        if self.readonly:
+            # The writer only has the bar in progress in memory
+            length = RESOLUTIONS[resolution][0]
+            last = self.ticks.last_stamp()
+            bar = last and self._bar_from_ticks(last - last % length, length)
+            written = series.last_stamp()
+            if bar is not None and written is not None and bar.start <= written:
+                bar = None
+        else:
+            bar = self._open_bars[resolution]
+        if bar is not None and start_ms <= bar.start <= end_ms:
+            data = {
+                column: np.append(data[column], np.array([value], _dtype(column)))
+                for column, value in zip(BAR_COLUMNS, bar.values())
+            }
+        return data
+
+    def prune(self, now_ms):
+        removed = 0
+        for name, series in (("tick", self.ticks), *self.bars.items()):
+            days = RETENTION_DAYS.get(name)
+            if days:
+                removed += series.prune(now_ms - int(days * DAY_MS))
+        return removed
+
+    def flush(self):
+        self.ticks.flush()
+        for series in self.bars.values():
+            series.flush()
+
+
+class PriceHistoryStore:
+    """The history of every symbol under one root directory.
+
+    A single writer (the monitor) appends; any number of `readonly` stores in
+    other processes, the web workers, can query concurrently. Ticks from the
+    feed are batched, readers see them once `write_pending` has run.
+    """
+
+    def __init__(self, root=PRICE_HISTORY_DIR, readonly=False):
+        self.root = root
+        self.readonly = readonly
+        self._symbols = OrderedDict()
+        self._pending = {}
+
+    def _history(self, exchange, symbol):
+        key = (exchange, symbol)
+        history = self._symbols.get(key)
+        if history is None:
+            directory = os.path.join(self.root, exchange, symbol)
+            history = self._symbols[key] = SymbolHistory(directory, self.readonly)
+            # The writer holds bars in progress, only a reader can forget a symbol
+            if self.readonly and len(self._symbols) > HISTORY_READER_SYMBOLS:
+                self._symbols.popitem(last=False)
+        elif self.readonly:
+            self._symbols.move_to_end(key)
+        return history
+
+    def append(self, exchange, symbol, ts_ms, price, volume=0.0):
+        return self._history(exchange, symbol).append(ts_ms, price, volume)
+
+    def append_tick(self, tick):
+        """A `FeedHub` sink."""
+        key = (tick.exchange, tick.symbol)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = ([], [], [])
+        stamps, prices, volumes = pending
+        stamps.append(tick.ts_ms)
+        prices.append(tick.price)
+        volumes.append(tick.volume)
+        if len(stamps) >= HISTORY_BATCH_SIZE:
+            self._write_pending(key)
+
+    def _write_pending(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self._history(*key).extend(*pending)
+
+    def write_pending(self):
+        for key in list(self._pending):
+            self._write_pending(key)
+
+    def extend(self, exchange, symbol, stamps, prices, volumes=None):
+        return self._history(exchange, symbol).extend(stamps, prices, volumes)
+
+    def query(self, exchange, symbol, start_ms, end_ms, resolution="1m"):
+        exchange, symbol = normalize_exchange(exchange), normalize_symbol(symbol)
+        if not _NAME.fullmatch(exchange) or not _NAME.fullmatch(symbol):
+            raise ValueError("Exchange and symbol may only use A-Z, 0-9, _ and -")
+        if resolution != "tick" and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution}")
+        if self.readonly and not os.path.isdir(
+            os.path.join(self.root, exchange, symbol)
+        ):
+            return None
+        self._write_pending((exchange, symbol))
+        return self._history(exchange, symbol).query(start_ms, end_ms, resolution)
+
+    def prune(self, now_ms):
+        return sum(history.prune(now_ms) for history in self._symbols.values())
+
+    def flush(self):
+        self.write_pending()
+        for history in self._symbols.values():
+            history.flush()
+
+    def drop(self, exchange, symbol):
+        self._pending.pop((exchange, symbol), None)
+        self._symbols.pop((exchange, symbol), None)
+        shutil.rmtree(os.path.join(self.root, exchange, symbol), ignore_errors=True)
+
+
+def pick_resolution(start_ms, end_ms, max_points=2000):
+    """The finest bar length that keeps a chart of the range under `max_points`."""
+    span = max(end_ms - start_ms, 1)
+    for name, (length, _, _) in RESOLUTIONS.items():
+        if span // length <= max_points:
+            return name
+    return "1h"
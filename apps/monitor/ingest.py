@@ -0,0 +1,338 @@
+import asyncio
+import json
+import logging
+import random
+
+from apps.monitor.engine import Tick, normalize_exchange, normalize_symbol
+from apps.monitor.symbols import symbol_registry
+
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+ADAPTERS = {}
+
+
+def register_adapter(name):
+    """Class decorator making an adapter available to `FeedHub` by exchange name."""
+
+    def decorator(cls):
+        cls.exchange = name
+        ADAPTERS[name] = cls
+        return cls
+
+    return decorator
+
+
+class ExchangeAdapter:
+    """One upstream market-data connection for one exchange.
+
+    Subclasses speak the exchange's wire protocol and turn its messages into
+    `Tick`s; reconnecting, resubscribing and fan-out are handled by `FeedHub`.
+    """
+
+    exchange = None
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def subscribe(self, symbols):
+        raise NotImplementedError
+
+    async def unsubscribe(self, symbols):
+        raise NotImplementedError
+
+    async def recv(self):
+        """Wait for the next raw message, raising ConnectionError when closed."""
+        raise NotImplementedError
+
+    def parse(self, message):
+        """Normalise a raw message into zero or more ticks."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+@register_adapter("local")
+class LocalFeedAdapter(ExchangeAdapter):
+    """Newline delimited JSON over TCP, as served by `apps.monitor.feedserver`."""
+
+    def __init__(self, host="127.0.0.1", port=9500, exchange=None):
+        self.host = host
+        self.port = port
+        if exchange:
+            # The stand-in server can impersonate any exchange
+            self.exchange = exchange
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, limit=1 << 20
+        )
+
+    async def _send(self, payload):
+        self._writer.write(json.dumps(payload).encode() + b"\n")
+        await self._writer.drain()
+
+    async def subscribe(self, symbols):
+        await self._send({"op": "subscribe", "symbols": list(symbols)})
+
+    async def unsubscribe(self, symbols):
+        await self._send({"op": "unsubscribe", "symbols": list(symbols)})
+
+    async def recv(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("feed closed the connection")
+        return line
+
+    def parse(self, message):
+        data = json.loads(message)
+        # Servers may batch several ticks per line
+        for item in data if isinstance(data, list) else (data,):
+            yield Tick(
+                self.exchange,
+                item["s"],
+                int(item["t"]),
+                float(item["p"]),
+                float(item.get("v", 0.0)),
+            )
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+@register_adapter("binance")
+class BinanceAdapter(ExchangeAdapter):
+    """Binance spot trade streams over a single combined websocket."""
+
+    url = "wss://stream.binance.com:9443/ws"
+
+    def __init__(self, url=None):
+        self.url = url or self.url
+        self._socket = None
+        self._request_id = 0
+
+    async def connect(self):
+        import websockets
+
+        self._socket = await websockets.connect(self.url, max_queue=4096)
+
+    async def _send(self, method, symbols):
+        self._request_id += 1
+        params = [f"{symbol.lower()}@trade" for symbol in symbols]
+        await self._socket.send(
+            json.dumps({"method": method, "params": params, "id": self._request_id})
+        )
+
+    async def subscribe(self, symbols):
+        await self._send("SUBSCRIBE", symbols)
+
+    async def unsubscribe(self, symbols):
+        await self._send("UNSUBSCRIBE", symbols)
+
+    async def recv(self):
+        import websockets
+
+        try:
+            return await self._socket.recv()
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError(str(e)) from e
+
+    def parse(self, message):
+        data = json.loads(message)
+        if data.get("e") != "trade":
+            return ()
+        return (
+            Tick(
+                self.exchange,
+                data["s"],
+                int(data["T"]),
+                float(data["p"]),
+                float(data["q"]),
+            ),
+        )
+
+    async def close(self):
+        if self._socket is not None:
+            await self._socket.close()
+            self._socket = None
+
+
+class _Connection:
+    """Keeps one adapter connected and subscribed, with exponential backoff."""
+
+    def __init__(self, hub, adapter):
+        self.hub = hub
+        self.adapter = adapter
+        self.symbols = set()
+        # Interned once per subscription, so a tick costs one lookup of the
+        # symbol string as the adapter parsed it
+        self.symbol_ids = {}
+        self.connected = asyncio.Event()
+        self.reconnects = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.adapter.close()
+
+    async def subscribe(self, symbols):
+        self.symbols.update(symbols)
+        for symbol in symbols:
+            self.symbol_ids[symbol] = self.hub.registry.intern(
+                self.adapter.exchange, symbol
+            )
+        if self.connected.is_set():
+            await self.adapter.subscribe(symbols)
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+        for symbol in symbols:
+            self.symbol_ids.pop(symbol, None)
+        if self.connected.is_set():
+            await self.adapter.unsubscribe(symbols)
+
+    async def _run(self):
+        delay = RECONNECT_BASE_DELAY
+        adapter = self.adapter
+        while True:
+            try:
+                await adapter.connect()
+                # Mark connected first so symbols added meanwhile are sent too
+                self.connected.set()
+                if self.symbols:
+                    await adapter.subscribe(sorted(self.symbols))
+                delay = RECONNECT_BASE_DELAY
+                dispatch = self.hub.dispatch
+                symbol_ids = self.symbol_ids
+                while True:
+                    for tick in adapter.parse(await adapter.recv()):
+                        dispatch(tick, symbol_ids.get(tick.symbol))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(
+                    "Feed %s disconnected (%s), retrying in %.1fs",
+                    adapter.exchange,
+                    e,
+                    delay,
+                )
+            self.connected.clear()
+            self.reconnects += 1
+            await adapter.close()
+            # Full jitter so a restarted exchange isn't hit by every worker at once
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+class FeedHub:
+    """Fans ticks from one upstream subscription per (exchange, symbol) out to sinks.
+
+    Subscriptions are reference counted, however many tasks watch a symbol the
+    exchange only ever sees it subscribed once.
+    """
+
+    def __init__(self, adapters=None, registry=None):
+        self._adapters = dict(adapters or {})
+        self._connections = {}
+        self._refcounts = {}
+        self._sinks = []
+        self._id_sinks = []
+        self.registry = registry or symbol_registry
+        self.tick_count = 0
+
+    def add_sink(self, sink, symbol_id=False):
+        """`sink(tick)` is called on the event loop for every tick received.
+
+        With `symbol_id` it is called as `sink(tick, symbol_id)` instead, the id
+        `registry` interned for the tick's symbol when it was subscribed, or None
+        for a symbol the hub never subscribed.
+        """
+        (self._id_sinks if symbol_id else self._sinks).append(sink)
+
+    def remove_sink(self, sink):
+        if sink in self._id_sinks:
+            self._id_sinks.remove(sink)
+        else:
+            self._sinks.remove(sink)
+
+    def dispatch(self, tick, symbol_id=None):
+        self.tick_count += 1
+        for sink in self._sinks:
+            sink(tick)
+        for sink in self._id_sinks:
+            sink(tick, symbol_id)
+
+    def _connection(self, exchange):
+        connection = self._connections.get(exchange)
+        if connection is None:
+            adapter = self._adapters.get(exchange)
+            if adapter is None:
+                adapter_class = ADAPTERS.get(exchange)
+                if adapter_class is None:
+                    raise KeyError(f"No market-data adapter for exchange {exchange}")
+                adapter = adapter_class()
+            connection = self._connections[exchange] = _Connection(self, adapter)
+            connection.start()
+        return connection
+
+    def subscriptions(self):
+        return set(self._refcounts)
+
+    async def subscribe(self, exchange, symbol):
+        key = (normalize_exchange(exchange), normalize_symbol(symbol))
+        count = self._refcounts.get(key, 0)
+        self._refcounts[key] = count + 1
+        if not count:
+            await self._connection(key[0]).subscribe([key[1]])
+
+    async def unsubscribe(self, exchange, symbol):
+        key = (normalize_exchange(exchange), normalize_symbol(symbol))
+        count = self._refcounts.get(key, 0)
+        if count > 1:
+            self._refcounts[key] = count - 1
+        elif count:
+            del self._refcounts[key]
+            await self._connection(key[0]).unsubscribe([key[1]])
+
+    async def sync(self, pairs):
+        """Hold exactly one reference on each (exchange, symbol) in `pairs`.
+
+        Handy for mirroring `PriceAlertEngine.subscriptions()`, subscribes are
+        batched per exchange.
+        """
+        wanted = {(normalize_exchange(e), normalize_symbol(s)) for e, s in pairs}
+        added, removed = {}, {}
+        for key in wanted - self._refcounts.keys():
+            self._refcounts[key] = 1
+            added.setdefault(key[0], []).append(key[1])
+        for key in self._refcounts.keys() - wanted:
+            del self._refcounts[key]
+            removed.setdefault(key[0], []).append(key[1])
+        for exchange, symbols in removed.items():
+            await self._connection(exchange).unsubscribe(symbols)
+        for exchange, symbols in added.items():
+            await self._connection(exchange).subscribe(symbols)
+
+    async def wait_connected(self, timeout=None):
+        await asyncio.wait_for(
+            asyncio.gather(*(c.connected.wait() for c in self._connections.values())),
+            timeout,
+        )
+
+    async def close(self):
+        for connection in self._connections.values():
+            await connection.stop()
+        self._connections.clear()
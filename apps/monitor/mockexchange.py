@@ -0,0 +1,174 @@
+"""A local stand-in for the exchanges' account REST APIs.
+
+    python -m apps.monitor.mockexchange --port 9700 --key-rate 2
+
+Answers the balance endpoints `apps.monitor.accounts` polls for Binance, KuCoin
+and OKX, with made-up balances that change more often for a share of "busy"
+API keys. Limits are enforced per key and overall, requests over them get a 429
+with Retry-After just like the real thing.
+"""
+
+import argparse
+import asyncio
+import random
+import zlib
+
+from aiohttp import web
+
+from apps.monitor.accounts import TokenBucket
+
+ASSETS = ("BTC", "ETH", "USDT", "BNB", "SOL", "XRP")
+
+
+class MockExchange:
+    def __init__(
+        self,
+        key_rate=2.0,
+        key_burst=5,
+        global_rate=5000.0,
+        latency=(0.005, 0.02),
+        busy_share=0.1,
+        seed=None,
+    ):
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.latency = latency
+        self.busy_share = busy_share
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self._key_buckets = {}
+        self._balances = {}
+
+    def is_busy(self, api_key):
+        return zlib.crc32(api_key.encode()) % 1000 < self.busy_share * 1000
+
+    def _balances_for(self, api_key):
+        balances = self._balances.get(api_key)
+        if balances is None:
+            balances = self._balances[api_key] = {
+                asset: round(self.rng.uniform(0, 100), 8) for asset in ASSETS[:3]
+            }
+        # Busy accounts trade on most polls, the rest hardly ever
+        if self.rng.random() < (0.5 if self.is_busy(api_key) else 0.02):
+            asset = self.rng.choice(ASSETS)
+            balances[asset] = round(self.rng.uniform(0, 100), 8)
+        return balances
+
+    async def _admit(self, request, key_header):
+        self.requests += 1
+        api_key = request.headers.get(key_header)
+        if not api_key:
+            raise web.HTTPUnauthorized()
+        bucket = self._key_buckets.get(api_key)
+        if bucket is None:
+            bucket = self._key_buckets[api_key] = TokenBucket(
+                self.key_rate, self.key_burst
+            )
+        if not bucket.take() or not self.global_bucket.take():
+            self.rate_limited += 1
+            raise web.HTTPTooManyRequests(headers={"Retry-After": "1"})
+        await asyncio.sleep(self.rng.uniform(*self.latency))
+        return self._balances_for(api_key)
+
+    async def binance_account(self, request):
+        if "signature" not in request.query:
+            raise web.HTTPBadRequest()
+        balances = await self._admit(request, "X-MBX-APIKEY")
+        return web.json_response(
+            {
+                "balances": [
+                    {"asset": asset, "free": f"{amount:.8f}", "locked": "0.00000000"}
+                    for asset, amount in balances.items()
+                ]
+            }
+        )
+
+    async def kucoin_accounts(self, request):
+        balances = await self._admit(request, "KC-API-KEY")
+        return web.json_response(
+            {
+                "code": "200000",
+                "data": [
+                    {
+                        "currency": asset,
+                        "type": "trade",
+                        "balance": f"{amount:.8f}",
+                        "available": f"{amount:.8f}",
+                        "holds": "0",
+                    }
+                    for asset, amount in balances.items()
+                ],
+            }
+        )
+
+    async def okx_balance(self, request):
+        balances = await self._admit(request, "OK-ACCESS-KEY")
+        return web.json_response(
+            {
+                "code": "0",
+                "data": [
+                    {
+                        "details": [
+                            {
+                                "ccy": asset,
+                                "availBal": f"{amount:.8f}",
+                                "frozenBal": "0",
+                            }
+                            for asset, amount in balances.items()
+                        ]
+                    }
+                ],
+            }
+        )
+
+    async def stats(self, request):
+        return web.json_response(
+            {"requests": self.requests, "rate_limited": self.rate_limited}
+        )
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get("/api/v3/account", self.binance_account)
+        app.router.add_get("/api/v1/accounts", self.kucoin_accounts)
+        app.router.add_get("/api/v5/account/balance", self.okx_balance)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def serve(self, host="127.0.0.1", port=9700):
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port, backlog=4096).start()
+        return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9700)
+    parser.add_argument(
+        "--key-rate", type=float, default=2.0, help="requests/s per key"
+    )
+    parser.add_argument("--global-rate", type=float, default=5000.0)
+    parser.add_argument("--busy-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    exchange = MockExchange(
+        key_rate=args.key_rate,
+        global_rate=args.global_rate,
+        busy_share=args.busy_share,
+    )
+
+    async def run():
+        runner = await exchange.serve(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""The price monitor process: ingestion, evaluation, history, live stream and alerts.
+
+python -m apps.monitor.service
+FEED_ADAPTER=local python -m apps.monitor.service   # against the feed server
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from apps.monitor.engine import PriceAlertEngine, normalize_exchange
+from apps.monitor.history import PriceHistoryStore
+from apps.monitor.ingest import FeedHub, LocalFeedAdapter
+from apps.monitor.stream import StreamBroker, StreamServer, session_authenticator
+from apps.monitor.sync import SYNC_INTERVAL, ChangeTracker, EngineSync, prune_change_log
+
+# Browsers reach it through the app's reverse proxy or with CORS, see apps.monitor.stream
+STREAM_HOST = os.getenv("STREAM_HOST", "0.0.0.0")
+STREAM_PORT = int(os.getenv("STREAM_PORT", "9600"))
+# "local" routes every exchange to apps.monitor.feedserver instead of the real one
+FEED_ADAPTER = os.getenv("FEED_ADAPTER", "")
+ALERT_FLUSH_SECONDS = 1.0
+HISTORY_FLUSH_SECONDS = 1.0
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class MonitorService:
+    def __init__(self, app, hub=None, broker=None, history=None):
+        self.app = app
+        self.hub = hub or FeedHub()
+        self.broker = broker or StreamBroker()
+        self.history = history or PriceHistoryStore()
+        self.engine = None
+        self.sync = None
+        self._alerts = []
+        self._tasks = []
+
+    def _on_tick(self, tick, symbol_id):
+        # The hub and the engine share the symbol registry, the id indexes the
+        # engine's books directly
+        if symbol_id is None:
+            self.engine.process_tick(tick)
+        else:
+            self.engine.process_id(symbol_id, tick.ts_ms, tick.price)
+        self.broker.publish_tick(tick)
+
+    def _on_alert(self, alert):
+        self.broker.publish_alert(alert)
+        self._alerts.append(alert)
+
+    def _store_alerts(self, alerts):
+        from apps.notifications.queue import enqueue_price_alerts
+
+        with self.app.app_context():
+            enqueue_price_alerts(alerts)
+
+    async def _flush_alerts(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(ALERT_FLUSH_SECONDS)
+            if not self._alerts:
+                continue
+            alerts, self._alerts = self._alerts, []
+            try:
+                # Database writes stay off the event loop
+                await loop.run_in_executor(None, self._store_alerts, alerts)
+            except Exception as e:
+                logging.exception(e)
+
+    async def _flush_history(self):
+        while True:
+            await asyncio.sleep(HISTORY_FLUSH_SECONDS)
+            try:
+                self.history.write_pending()
+            except Exception as e:
+                logging.exception(e)
+
+    def _fetch_changes(self):
+        with self.app.app_context():
+            return self.sync.fetch()
+
+    def _prune(self):
+        with self.app.app_context():
+            return prune_change_log()
+
+    async def _sync_tasks(self):
+        loop = asyncio.get_running_loop()
+        last_prune = loop.time()
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                changes = await loop.run_in_executor(None, self._fetch_changes)
+                # Applied on the loop, between ticks
+                if self.sync.apply(*changes):
+                    await self.hub.sync(self.engine.subscriptions())
+                if loop.time() - last_prune > PRUNE_INTERVAL_SECONDS:
+                    last_prune = loop.time()
+                    await loop.run_in_executor(None, self._prune)
+                    # Like the sinks, on the loop: the history is not thread safe
+                    self.history.prune(int(time.time() * 1000))
+            except Exception as e:
+                logging.exception(e)
+
+    async def start(self, host=STREAM_HOST, port=STREAM_PORT):
+        tracker = ChangeTracker()
+        with self.app.app_context():
+            # Anything changed while loading is picked up again by the first sync
+            tracker.start()
+            self.engine = PriceAlertEngine.from_database(
+                on_alert=self._on_alert, registry=self.hub.registry
+            )
+        self.sync = EngineSync(self.engine, tracker)
+        logging.info(
+            f"Monitoring {len(self.engine)} tasks on "
+            f"{len(self.engine.subscriptions())} symbols"
+        )
+        self.hub.add_sink(self._on_tick, symbol_id=True)
+        self.hub.add_sink(self.history.append_tick)
+        await self.hub.sync(self.engine.subscriptions())
+
+        server = StreamServer(self.broker, session_authenticator(self.app))
+        self._server = await server.serve(host, port)
+        self._tasks = [
+            asyncio.ensure_future(self.broker.run()),
+            asyncio.ensure_future(self._flush_alerts()),
+            asyncio.ensure_future(self._flush_history()),
+            asyncio.ensure_future(self._sync_tasks()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._server.close()
+        await self.hub.close()
+        self.history.flush()
+
+
+def main():
+    from apps import create_app
+    from apps.config import config_dict
+
+    logging.basicConfig(level=logging.INFO)
+    debug = os.getenv("DEBUG", "False") == "True"
+    app = create_app(config_dict["Debug" if debug else "Production"])
+
+    async def run():
+        adapters = None
+        if FEED_ADAPTER == "local":
+            with app.app_context():
+                from apps.home.models import AssignedPricingTask
+
+                exchanges = {
+                    normalize_exchange(exchange)
+                    for (exchange,) in AssignedPricingTask.query.with_entities(
+                        AssignedPricingTask.exchange
+                    ).distinct()
+                }
+            adapters = {e: LocalFeedAdapter(exchange=e) for e in exchanges}
+        service = MonitorService(app, hub=FeedHub(adapters))
+        await service.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Server-Sent Events fan-out of live prices and task triggers to dashboards.
+
+Clients connect to /stream?symbols=binance:BTCUSDT,kucoin:ETHUSDT (a bare symbol
+matches it on every exchange, no filter at all gets every tick). Everything runs on
+one asyncio loop next to the `FeedHub`, so a viewer costs a socket and a few small
+buffers rather than a worker thread.
+
+Viewers authenticate with the Flask session cookie, so the browser has to send
+it. Either put the stream on the app's origin behind the reverse proxy,
+
+    location /stream {
+        proxy_pass http://127.0.0.1:9600;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
+and open `new EventSource("/stream?symbols=...")`, or list the app's origin in
+STREAM_ALLOWED_ORIGINS and open it on the stream's own port with
+`new EventSource(url, {withCredentials: true})`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import deque
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+from apps.monitor.engine import normalize_exchange, normalize_symbol
+
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "4"))
+# Trigger events held per client between frames, the oldest are dropped beyond it
+STREAM_EVENT_BUFFER = int(os.getenv("STREAM_EVENT_BUFFER", "256"))
+# Past this many unsent bytes in a client's socket its frames are skipped
+STREAM_WRITE_HIGH_WATER = int(os.getenv("STREAM_WRITE_HIGH_WATER", str(256 * 1024)))
+# ...and after this many seconds of being stuck there it is disconnected
+STREAM_SLOW_CLIENT_TIMEOUT = float(os.getenv("STREAM_SLOW_CLIENT_TIMEOUT", "30"))
+# Small kernel send buffers keep per-viewer memory down and surface slow clients
+STREAM_SOCKET_SNDBUF = int(os.getenv("STREAM_SOCKET_SNDBUF", str(64 * 1024)))
+STREAM_HEARTBEAT_SECONDS = 15
+# A client gets this long to send its request line and headers...
+STREAM_HEADER_TIMEOUT = float(os.getenv("STREAM_HEADER_TIMEOUT", "5"))
+# ...at most this many headers, each line at most STREAM_MAX_LINE bytes
+STREAM_MAX_HEADERS = 64
+STREAM_MAX_LINE = 8 * 1024
+# Origins allowed to read the stream cross-origin with their cookies, comma-separated
+STREAM_ALLOWED_ORIGINS = frozenset(
+    origin.strip().rstrip("/")
+    for origin in os.getenv("STREAM_ALLOWED_ORIGINS", "").split(",")
+    if origin.strip()
+)
+
+ANY_EXCHANGE = "*"
+
+_RESPONSE_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"X-Accel-Buffering: no\r\n"
+)
+_RESPONSE_START = b"\r\nretry: 3000\n\n"
+
+
+def parse_symbol_filter(value):
+    """'binance:BTCUSDT,ETHUSDT' -> {('binance', 'BTCUSDT'), ('*', 'ETHUSDT')}"""
+    keys = set()
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        exchange, _, symbol = item.rpartition(":")
+        exchange = normalize_exchange(exchange) if exchange else ANY_EXCHANGE
+        keys.add((exchange, normalize_symbol(symbol)))
+    return keys
+
+
+class StreamClient:
+    """One connected dashboard and whatever it has not been sent yet.
+
+    Prices are coalesced, only the newest tick per symbol survives until the next
+    frame, so a client's memory is bounded by the symbols it watches.
+    """
+
+    __slots__ = (
+        "writer",
+        "user_id",
+        "keys",
+        "latest",
+        "events",
+        "dropped_events",
+        "stalled_since",
+        "last_write",
+    )
+
+    def __init__(self, writer, user_id=None, keys=()):
+        self.writer = writer
+        self.user_id = user_id
+        self.keys = frozenset(keys)
+        self.latest = {}
+        self.events = deque(maxlen=STREAM_EVENT_BUFFER)
+        self.dropped_events = 0
+        self.stalled_since = None
+        self.last_write = time.monotonic()
+
+    def push_event(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped_events += 1
+        self.events.append(event)
+
+    @property
+    def has_pending(self):
+        return bool(self.latest or self.events)
+
+    def frame(self):
+        parts = []
+        if self.latest:
+            prices = {
+                f"{tick.exchange}:{tick.symbol}": [tick.price, tick.ts_ms]
+                for tick in self.latest.values()
+            }
+            parts.append(f"event: prices\ndata: {json.dumps(prices)}\n\n")
+            self.latest.clear()
+        while self.events:
+            alert = self.events.popleft()
+            payload = {
+                "task_id": alert.task_id,
+                "exchange": alert.exchange,
+                "symbol": alert.symbol,
+                "direction": alert.direction,
+                "move": round(alert.move, 4),
+                "price": alert.price,
+                "ts": alert.ts_ms,
+            }
+            parts.append(f"event: trigger\ndata: {json.dumps(payload)}\n\n")
+        return "".join(parts).encode()
+
+
+class StreamBroker:
+    """Routes ticks and alerts to the clients that asked for them.
+
+    Publishing only touches the clients subscribed to a symbol (or owning a task);
+    writing happens on a fixed frame clock capped at `max_fps`.
+    """
+
+    def __init__(self, max_fps=STREAM_MAX_FPS):
+        self.frame_interval = 1.0 / max_fps
+        self.clients = set()
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.slow_disconnects = 0
+        self._by_key = {}
+        self._firehose = set()
+        self._by_user = {}
+
+    def register(self, client):
+        self.clients.add(client)
+        if client.keys:
+            for key in client.keys:
+                self._by_key.setdefault(key, set()).add(client)
+        else:
+            self._firehose.add(client)
+        if client.user_id is not None:
+            self._by_user.setdefault(client.user_id, set()).add(client)
+
+    def unregister(self, client):
+        self.clients.discard(client)
+        self._firehose.discard(client)
+        for key in client.keys:
+            subscribers = self._by_key.get(key)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._by_key[key]
+        sessions = self._by_user.get(client.user_id)
+        if sessions is not None:
+            sessions.discard(client)
+            if not sessions:
+                del self._by_user[client.user_id]
+
+    def publish_tick(self, tick):
+        key = (tick.exchange, tick.symbol)
+        by_key = self._by_key
+        for group in (
+            by_key.get(key, ()),
+            by_key.get((ANY_EXCHANGE, tick.symbol), ()),
+            self._firehose,
+        ):
+            for client in group:
+                client.latest[key] = tick
+
+    def publish_alert(self, alert):
+        for client in self._by_user.get(alert.user_id, ()):
+            client.push_event(alert)
+
+    def flush(self, now=None):
+        now = now or time.monotonic()
+        for client in list(self.clients):
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > STREAM_WRITE_HIGH_WATER:
+                # Leave the coalesced state in place, it is simply sent later
+                self.frames_skipped += 1
+                if client.stalled_since is None:
+                    client.stalled_since = now
+                elif now - client.stalled_since > STREAM_SLOW_CLIENT_TIMEOUT:
+                    self.slow_disconnects += 1
+                    transport.abort()
+                continue
+            client.stalled_since = None
+            if client.has_pending:
+                client.writer.write(client.frame())
+                client.last_write = now
+                self.frames_sent += 1
+            elif now - client.last_write > STREAM_HEARTBEAT_SECONDS:
+                client.writer.write(b": keep-alive\n\n")
+                client.last_write = now
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush(started)
+            except Exception as e:
+                logging.exception(e)
+            await asyncio.sleep(
+                max(0.0, self.frame_interval - (time.monotonic() - started))
+            )
+
+
+def session_authenticator(app):
+    """Resolve the logged-in user id from the Flask session cookie."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config.get("SESSION_COOKIE_NAME", "session")
+    max_age = int(app.permanent_session_lifetime.total_seconds())
+
+    def authenticate(cookie_header):
+        if not cookie_header or serializer is None:
+            return None
+        morsel = SimpleCookie(cookie_header).get(cookie_name)
+        if morsel is None:
+            return None
+        try:
+            session = serializer.loads(morsel.value, max_age=max_age)
+        except Exception:
+            return None
+        user_id = session.get("_user_id")
+        return int(user_id) if user_id is not None else None
+
+    return authenticate
+
+
+class StreamServer:
+    """Just enough HTTP/1.1 to serve `GET /stream` as an event stream."""
+
+    def __init__(
+        self,
+        broker,
+        authenticate=None,
+        require_auth=True,
+        allowed_origins=STREAM_ALLOWED_ORIGINS,
+    ):
+        self.broker = broker
+        self.authenticate = authenticate
+        self.require_auth = require_auth
+        self.allowed_origins = frozenset(allowed_origins)
+
+    def _cors_headers(self, origin):
+        """Credentialed CORS for an allowed origin, nothing for any other."""
+        if not origin or origin not in self.allowed_origins:
+            return b""
+        return (
+            f"Access-Control-Allow-Origin: {origin}\r\n"
+            "Access-Control-Allow-Credentials: true\r\n"
+            "Vary: Origin\r\n"
+        ).encode("latin-1")
+
+    async def _reject(self, writer, status, cors=b""):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n".encode()
+            + cors
+            + b"\r\n"
+        )
+        await writer.drain()
+        writer.close()
+
+    async def _read_head(self, reader):
+        """The request line and headers, None past STREAM_MAX_HEADERS."""
+        request_line = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return request_line, headers
+            if len(headers) >= STREAM_MAX_HEADERS:
+                return None
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def handle(self, reader, writer):
+        try:
+            # Bounded, or clients trickling headers would hold sockets forever
+            head = await asyncio.wait_for(
+                self._read_head(reader), STREAM_HEADER_TIMEOUT
+            )
+        except (ConnectionError, ValueError, asyncio.TimeoutError):
+            writer.close()
+            return
+        if head is None:
+            return await self._reject(writer, "431 Request Header Fields Too Large")
+        request_line, headers = head
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or parts[0] != "GET":
+            return await self._reject(writer, "405 Method Not Allowed")
+        url = urlsplit(parts[1])
+        if url.path != "/stream":
+            return await self._reject(writer, "404 Not Found")
+
+        cors = self._cors_headers(headers.get("origin"))
+        user_id = None
+        if self.authenticate is not None:
+            user_id = self.authenticate(headers.get("cookie"))
+        if self.require_auth and user_id is None:
+            return await self._reject(writer, "403 Forbidden", cors)
+
+        sock = writer.get_extra_info("socket")
+        if sock is not None and STREAM_SOCKET_SNDBUF:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, STREAM_SOCKET_SNDBUF)
+
+        symbols = parse_qs(url.query).get("symbols", [""])[0]
+        client = StreamClient(writer, user_id, parse_symbol_filter(symbols))
+        writer.write(_RESPONSE_HEADERS + cors + _RESPONSE_START)
+        self.broker.register(client)
+        try:
+            # Nothing is expected from the client, this only waits for it to leave
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.broker.unregister(client)
+            writer.close()
+
+    async def serve(self, host="0.0.0.0", port=9600):
+        return await asyncio.start_server(
+            self.handle, host, port, backlog=4096, limit=STREAM_MAX_LINE
+        )
@@ -0,0 +1,59 @@
+import threading
+
+from apps.monitor.engine import normalize_exchange, normalize_symbol
+
+
+class SymbolRegistry:
+    """Interns (exchange, symbol) pairs as small, dense integer ids.
+
+    Ids are handed out in order from 0 and never reused, so they can index plain
+    lists on the tick path. Lookups are lock free, only minting a new id locks.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._keys = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def get(self, exchange, symbol):
+        """The id of an already normalised pair, or None if it was never seen."""
+        return self._ids.get((exchange, symbol))
+
+    def intern(self, exchange, symbol):
+        key = (normalize_exchange(exchange), normalize_symbol(symbol))
+        symbol_id = self._ids.get(key)
+        if symbol_id is None:
+            with self._lock:
+                symbol_id = self._ids.get(key)
+                if symbol_id is None:
+                    symbol_id = len(self._keys)
+                    self._keys.append(key)
+                    self._ids[key] = symbol_id
+        return symbol_id
+
+    def key(self, symbol_id):
+        """The (exchange, symbol) pair behind an id."""
+        return self._keys[symbol_id]
+
+
+symbol_registry = SymbolRegistry()
+
+
+def task_ids_for_symbol(exchange, symbol, trade_type="spot"):
+    """Ids of the tasks watching a symbol, answered from the market index."""
+    from apps import db
+    from apps.home.models import PricingTaskSymbol
+
+    return db.session.scalars(
+        db.select(PricingTaskSymbol.task_id).where(
+            PricingTaskSymbol.exchange == normalize_exchange(exchange),
+            PricingTaskSymbol.trade_type == trade_type,
+            PricingTaskSymbol.symbol == normalize_symbol(symbol),
+        )
+    ).all()
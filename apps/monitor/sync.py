@@ -0,0 +1,141 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from apps.monitor.engine import load_task_specs
+
+SYNC_INTERVAL = float(os.getenv("MONITOR_SYNC_INTERVAL", "2"))
+CHANGE_LOG_RETENTION_SECONDS = int(os.getenv("CHANGE_LOG_RETENTION", str(86400)))
+# A sequence number missing from the log may belong to a transaction that has not
+# committed yet, it is looked for again until this long has passed
+GAP_TIMEOUT_SECONDS = 30
+MAX_TRACKED_GAPS = 10000
+
+
+class ChangeTracker:
+    """Follows `jd_change_log` from a position, reporting which rows changed.
+
+    Sequence numbers are assigned at insert but become visible at commit, so a
+    slow transaction can show up behind ones already read. Skipped numbers are
+    remembered as gaps and re-read until they appear or time out. Reading the
+    same change twice is harmless, consumers apply the current row state.
+    """
+
+    def __init__(self):
+        self.last_seq = None
+        self._gaps = {}
+
+    def start(self):
+        """Mark the log's current end, call this before a full load."""
+        from apps import db
+        from apps.home.models import ChangeLogEntry
+
+        self.last_seq = db.session.scalar(
+            db.select(db.func.coalesce(db.func.max(ChangeLogEntry.seq), 0))
+        )
+        self._gaps.clear()
+
+    def pull(self, now=None):
+        """Row ids changed since the previous pull, grouped by table name.
+
+        Returns None when the log was pruned past our position and the caller
+        must reload from scratch (then call `start` again first).
+        """
+        from apps import db
+        from apps.home.models import ChangeLogEntry
+
+        now = now or time.monotonic()
+        if self.last_seq is None:
+            return None
+        Log = ChangeLogEntry
+        oldest = db.session.scalar(db.select(db.func.min(Log.seq)))
+        if oldest is not None and oldest > self.last_seq + 1:
+            db.session.commit()
+            return None
+        wanted = Log.seq > self.last_seq
+        if self._gaps:
+            wanted = db.or_(wanted, Log.seq.in_(list(self._gaps)))
+        entries = db.session.execute(
+            db.select(Log.seq, Log.table_name, Log.row_id)
+            .where(wanted)
+            .order_by(Log.seq)
+        ).all()
+        # End the read transaction so the next pull sees newer commits
+        db.session.commit()
+
+        changed = {}
+        expected = self.last_seq + 1
+        for seq, table_name, row_id in entries:
+            changed.setdefault(table_name, set()).add(row_id)
+            if seq in self._gaps:
+                del self._gaps[seq]
+                continue
+            if seq > expected and len(self._gaps) < MAX_TRACKED_GAPS:
+                for missing in range(expected, min(seq, expected + MAX_TRACKED_GAPS)):
+                    self._gaps[missing] = now
+            expected = max(expected, seq + 1)
+        self.last_seq = expected - 1
+        for seq, seen in list(self._gaps.items()):
+            if now - seen > GAP_TIMEOUT_SECONDS:
+                del self._gaps[seq]
+        return changed
+
+
+def prune_change_log(retention_seconds=CHANGE_LOG_RETENTION_SECONDS):
+    from apps import db
+    from apps.home.models import ChangeLogEntry
+
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    deleted = db.session.execute(
+        db.delete(ChangeLogEntry).where(ChangeLogEntry.date_created < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+class EngineSync:
+    """Keeps a `PriceAlertEngine` in step with `jd_pricing_tasks`.
+
+    `fetch` reads the database and may run on any thread (inside an app
+    context); `apply` mutates the engine and belongs on the thread that feeds
+    it ticks.
+    """
+
+    table_name = "jd_pricing_tasks"
+
+    def __init__(self, engine, tracker=None):
+        self.engine = engine
+        self.tracker = tracker or ChangeTracker()
+        self.full_reloads = 0
+
+    def fetch(self):
+        """Returns (specs, removed ids, full reload?) for the pending changes."""
+        changed = self.tracker.pull()
+        if changed is None:
+            self.tracker.start()
+            return list(load_task_specs()), None, True
+        task_ids = changed.get(self.table_name)
+        if not task_ids:
+            return [], set(), False
+        specs = list(load_task_specs(task_ids))
+        # Deleted, paused or otherwise unevaluable tasks simply leave the engine
+        return specs, task_ids - {spec.id for spec in specs}, False
+
+    def apply(self, specs, removed, full_reload=False):
+        engine = self.engine
+        if full_reload:
+            self.full_reloads += 1
+            loaded = {spec.id for spec in specs}
+            removed = [
+                task_id for task_id in engine.task_ids() if task_id not in loaded
+            ]
+        for task_id in removed:
+            engine.remove_task(task_id)
+        for spec in specs:
+            if not engine.add_task(spec):
+                engine.remove_task(spec.id)
+        return len(specs) + len(removed)
+
+    def sync(self):
+        """fetch + apply in one go, for single threaded callers."""
+        return self.apply(*self.fetch())
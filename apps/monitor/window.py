@@ -0,0 +1,173 @@
+import numpy as np
+
+from apps.monitor.engine import DIRECTION_DOWN, DIRECTION_UP, Alert
+
+# Never let one symbol's history grow past this many ticks
+MAX_RING_CAPACITY = 1 << 20
+
+
+class PriceRingBuffer:
+    """Recent (ts_ms, price) pairs of one symbol.
+
+    Every value is written twice, at `i` and `i + capacity`, so the newest
+    `capacity` entries are always one contiguous, chronological slice and can be
+    handed to NumPy without copying.
+    """
+
+    __slots__ = ("capacity", "stamps", "prices", "head", "size")
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.stamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.prices = np.zeros(2 * capacity, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, ts_ms, price):
+        head = self.head
+        mirror = head + self.capacity
+        self.stamps[head] = self.stamps[mirror] = ts_ms
+        self.prices[head] = self.prices[mirror] = price
+        self.head = (head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def oldest_stamp(self):
+        end = self.head + self.capacity
+        return int(self.stamps[end - self.size])
+
+    def grow(self):
+        stamps, prices = self.view()
+        capacity = self.capacity * 2
+        self.stamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.prices = np.zeros(2 * capacity, dtype=np.float64)
+        self.stamps[: self.size] = self.stamps[capacity : capacity + self.size] = stamps
+        self.prices[: self.size] = self.prices[capacity : capacity + self.size] = prices
+        self.capacity = capacity
+        self.head = self.size
+
+    def view(self):
+        """Chronological (stamps, prices) views of everything held."""
+        end = self.head + self.capacity
+        start = end - self.size
+        return self.stamps[start:end], self.prices[start:end]
+
+
+class VectorizedSymbolBook:
+    """Drop-in replacement for the engine's per-symbol book backed by NumPy.
+
+    Each tick does one block-wise pass over the ring buffer: `searchsorted` finds
+    where every distinct window starts, `minimum/maximum.reduceat` reduces the
+    blocks between consecutive starts and a reversed accumulate turns those into
+    the min/max of every window. All thresholds on the symbol are then checked
+    with one batched comparison instead of a Python loop per task.
+    """
+
+    def __init__(self, exchange, symbol, capacity=1024):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.ring = PriceRingBuffer(capacity)
+        self._tasks = {}
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def add(self, task):
+        self._tasks[task.id] = task
+        self._dirty = True
+
+    def remove(self, task):
+        self._tasks.pop(task.id, None)
+        self._dirty = True
+
+    def _rebuild(self):
+        tasks = list(self._tasks.values())
+        # Longest window first so the window start offsets come out ascending
+        spans = sorted({task.time_ms for task in tasks}, reverse=True)
+        span_index = {span: index for index, span in enumerate(spans)}
+
+        self._task_list = tasks
+        self._spans = np.array(spans, dtype=np.int64)
+        self._max_span = spans[0] if spans else 0
+        self._task_window = np.array(
+            [span_index[task.time_ms] for task in tasks], dtype=np.intp
+        )
+        self._task_span = np.array([task.time_ms for task in tasks], dtype=np.int64)
+        self._thresholds = np.array(
+            [task.percentage for task in tasks], dtype=np.float64
+        )
+        # dtype given so an empty book still masks, np.array([]) is float
+        self._up = np.array(
+            [task.direction != DIRECTION_DOWN for task in tasks], dtype=bool
+        )
+        self._down = np.array(
+            [task.direction != DIRECTION_UP for task in tasks], dtype=bool
+        )
+        self._muted_until = np.array(
+            [task.muted_until for task in tasks], dtype=np.int64
+        )
+        self._min_up = self._thresholds[self._up].min(initial=np.inf)
+        self._min_down = self._thresholds[self._down].min(initial=np.inf)
+        self._dirty = False
+
+    def push(self, ts_ms, price, alerts):
+        if self._dirty:
+            self._rebuild()
+        ring = self.ring
+        if (
+            ring.size == ring.capacity
+            and ring.capacity < MAX_RING_CAPACITY
+            and ring.oldest_stamp() >= ts_ms - self._max_span
+        ):
+            ring.grow()
+        ring.append(ts_ms, price)
+        if not self._task_list:
+            return
+
+        stamps, prices = ring.view()
+        starts = np.searchsorted(stamps, ts_ms - self._spans)
+        lows = np.minimum.accumulate(np.minimum.reduceat(prices, starts)[::-1])[::-1]
+        highs = np.maximum.accumulate(np.maximum.reduceat(prices, starts)[::-1])[::-1]
+
+        # The longest window bounds every other one, so most ticks stop here
+        up_moves = (price - lows) * 100.0 / lows
+        down_moves = (highs - price) * 100.0 / highs
+        if up_moves[0] >= self._min_up:
+            self._fire(up_moves, self._up, DIRECTION_UP, ts_ms, price, alerts)
+        if down_moves[0] >= self._min_down:
+            self._fire(down_moves, self._down, DIRECTION_DOWN, ts_ms, price, alerts)
+
+    def _fire(self, moves, direction_mask, direction, ts_ms, price, alerts):
+        task_moves = moves[self._task_window]
+        hits = np.flatnonzero(
+            direction_mask
+            & (task_moves >= self._thresholds)
+            & (self._muted_until <= ts_ms)
+        )
+        if not hits.size:
+            return
+        # A task that fired stays quiet for one window so it does not re-fire per tick
+        self._muted_until[hits] = ts_ms + self._task_span[hits]
+        for index in hits.tolist():
+            task = self._task_list[index]
+            # Tasks watching several symbols may have just fired on another book
+            if task.muted_until > ts_ms:
+                self._muted_until[index] = task.muted_until
+                continue
+            task.muted_until = ts_ms + task.time_ms
+            alerts.append(
+                Alert(
+                    task.id,
+                    task.user_id,
+                    self.exchange,
+                    self.symbol,
+                    direction,
+                    float(task_moves[index]),
+                    ts_ms,
+                    price,
+                )
+            )
@@ -0,0 +1,294 @@
+import logging
+import os
+import random
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from apps import db, get_mail
+from apps.home.models import OutboundNotification, User
+from apps.home.profiling import external_call
+
+DEFAULT_SENDER = "noreply@app.com"
+
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "200"))
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "2"))
+# Price alerts for one user raised within this many seconds go out as one email
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "30"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_RETRY_BASE_SECONDS = 5
+NOTIFY_RETRY_MAX_SECONDS = 3600
+# A claim older than this belongs to a worker that died mid-batch
+NOTIFY_CLAIM_TIMEOUT_SECONDS = 600
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+KIND_EMAIL = "email"
+KIND_PRICE_ALERT = "price_alert"
+
+# Errors after which the SMTP connection can't be trusted for the rest of the batch
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def enqueue_email(
+    recipient,
+    subject,
+    body,
+    html=None,
+    reply_to=None,
+    user_id=None,
+    kind=KIND_EMAIL,
+    coalesce_key=None,
+):
+    """Queue an email for the background worker, returning its row."""
+    notification = OutboundNotification(
+        user_id=user_id,
+        kind=kind,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        html=html,
+        reply_to=reply_to,
+        coalesce_key=coalesce_key,
+    )
+    db.session.add(notification)
+    db.session.commit()
+    notification_worker.wake()
+    return notification
+
+
+def format_price_alert(alert):
+    return (
+        f"{alert.symbol} on {alert.exchange} moved {alert.direction} "
+        f"{alert.move:.2f}% to {alert.price:g}"
+    )
+
+
+def enqueue_price_alerts(alerts):
+    """Queue engine `Alert`s, they are merged per user by the worker."""
+    if not alerts:
+        return 0
+    user_ids = {alert.user_id for alert in alerts}
+    emails = dict(
+        db.session.query(User.id, User.email).filter(User.id.in_(user_ids)).all()
+    )
+    rows = [
+        {
+            "user_id": alert.user_id,
+            "kind": KIND_PRICE_ALERT,
+            "recipient": emails[alert.user_id],
+            "subject": f"Price alert: {alert.symbol}",
+            "body": format_price_alert(alert),
+            "coalesce_key": f"user:{alert.user_id}",
+        }
+        for alert in alerts
+        if alert.user_id in emails
+    ]
+    if rows:
+        db.session.execute(db.insert(OutboundNotification), rows)
+        db.session.commit()
+        notification_worker.wake()
+    return len(rows)
+
+
+def build_message(notifications):
+    """One email for a group of notifications sharing a recipient."""
+    from flask_mail import Message
+
+    first = notifications[0]
+    if len(notifications) == 1:
+        message = Message(
+            first.subject, sender=DEFAULT_SENDER, recipients=[first.recipient]
+        )
+        message.body = first.body
+        message.html = first.html
+    else:
+        message = Message(
+            f"{len(notifications)} price alerts",
+            sender=DEFAULT_SENDER,
+            recipients=[first.recipient],
+        )
+        message.body = "\n".join(notification.body for notification in notifications)
+    message.reply_to = first.reply_to
+    return message
+
+
+def retry_delay(attempts):
+    delay = min(
+        NOTIFY_RETRY_BASE_SECONDS * 2 ** (attempts - 1), NOTIFY_RETRY_MAX_SECONDS
+    )
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+class NotificationWorker:
+    """Drains `jd_notifications` on a background thread.
+
+    Each batch is delivered over a single SMTP connection. Failed emails are
+    retried with exponential backoff and given up on after NOTIFY_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self, batch_size=NOTIFY_BATCH_SIZE, poll_interval=NOTIFY_POLL_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.coalesce_seconds = NOTIFY_COALESCE_SECONDS
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+    def ensure_started(self, app):
+        # Threads don't survive gunicorn's fork, so check per process
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._app = app
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._loop, name="notification-worker", daemon=True
+            )
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stopping:
+            processed = 0
+            with self._app.app_context():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    logging.exception(e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            # A full batch means there is probably more waiting
+            if processed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self, now):
+        N = OutboundNotification
+        token = uuid.uuid4().hex
+        db.session.execute(
+            db.update(N)
+            .where(
+                N.status == STATUS_SENDING,
+                N.claimed_at < now - timedelta(seconds=NOTIFY_CLAIM_TIMEOUT_SECONDS),
+            )
+            .values(status=STATUS_PENDING, claimed_by=None)
+        )
+
+        due = db.and_(N.status == STATUS_PENDING, N.next_attempt_at <= now)
+        single_ids = db.session.scalars(
+            db.select(N.id)
+            .where(due, N.coalesce_key.is_(None))
+            .order_by(N.next_attempt_at)
+            .limit(self.batch_size)
+        ).all()
+        # A coalesced group is only released once its oldest member is old enough
+        keys = db.session.scalars(
+            db.select(N.coalesce_key)
+            .where(due, N.coalesce_key.is_not(None))
+            .group_by(N.coalesce_key)
+            .having(
+                db.func.min(N.date_created)
+                <= now - timedelta(seconds=self.coalesce_seconds)
+            )
+            .limit(self.batch_size)
+        ).all()
+        if not single_ids and not keys:
+            db.session.commit()
+            return token, []
+
+        db.session.execute(
+            db.update(N)
+            .where(due, db.or_(N.id.in_(single_ids), N.coalesce_key.in_(keys)))
+            .values(status=STATUS_SENDING, claimed_by=token, claimed_at=now)
+        )
+        db.session.commit()
+        claimed = db.session.scalars(
+            db.select(N).where(N.claimed_by == token).order_by(N.id)
+        ).all()
+        return token, claimed
+
+    def run_once(self, now=None):
+        """Claim and deliver one batch, returning how many rows it covered."""
+        now = now or datetime.utcnow()
+        _, claimed = self._claim(now)
+        if not claimed:
+            return 0
+
+        groups = {}
+        for notification in claimed:
+            key = notification.coalesce_key or f"id:{notification.id}"
+            groups.setdefault((key, notification.recipient), []).append(notification)
+        pending = list(groups.values())
+
+        try:
+            with get_mail(current_app).connect() as connection:
+                self.connections += 1
+                while pending:
+                    group = pending[0]
+                    try:
+                        with external_call("smtp"):
+                            connection.send(build_message(group))
+                    except _CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        self._retry(group, e, now)
+                    else:
+                        self._mark_sent(group, now)
+                    pending.pop(0)
+        except Exception as e:
+            logging.warning(f"SMTP delivery interrupted: {e}")
+            # Whatever didn't go out this time counts as a failed attempt
+            for group in pending:
+                self._retry(group, e, now)
+        db.session.commit()
+        return len(claimed)
+
+    def _mark_sent(self, group, now):
+        for notification in group:
+            notification.status = STATUS_SENT
+            notification.date_sent = now
+            notification.claimed_by = None
+        self.sent += 1
+
+    def _retry(self, group, error, now):
+        for notification in group:
+            notification.attempts += 1
+            notification.last_error = str(error)[:256]
+            notification.claimed_by = None
+            if notification.attempts >= NOTIFY_MAX_ATTEMPTS:
+                notification.status = STATUS_FAILED
+            else:
+                notification.status = STATUS_PENDING
+                notification.next_attempt_at = now + retry_delay(notification.attempts)
+        self.failed += 1
+
+
+notification_worker = NotificationWorker()
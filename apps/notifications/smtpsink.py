@@ -0,0 +1,97 @@
+"""A local SMTP sink for exercising the notification worker offline.
+
+    python -m apps.notifications.smtpsink --port 1025
+    MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 MAIL_USE_TLS=False flask run
+
+It speaks just enough SMTP for smtplib, counts connections and messages, and
+can be told to fail a share of messages to exercise the retry path.
+"""
+
+import argparse
+import asyncio
+import random
+
+
+class SMTPSink:
+    def __init__(self, failure_rate=0.0, keep_messages=False):
+        self.failure_rate = failure_rate
+        self.keep_messages = keep_messages
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+        self.received = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+
+        async def reply(line):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 localhost SMTP sink")
+        recipients = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb in ("HELO", "EHLO"):
+                    await reply("250 localhost")
+                elif verb == "MAIL":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command[8:].strip())
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while True:
+                        line = await reader.readline()
+                        if not line or line in (b".\r\n", b".\n"):
+                            break
+                        data.append(line)
+                    if random.random() < self.failure_rate:
+                        self.rejected += 1
+                        await reply("451 Temporary failure, try again later")
+                        continue
+                    self.messages += 1
+                    if self.keep_messages:
+                        self.received.append((recipients, b"".join(data)))
+                    await reply("250 OK queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=1025):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    sink = SMTPSink(failure_rate=args.failure_rate)
+
+    async def run():
+        server = await sink.serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Account-monitor polling throughput against the mock exchange.
+
+    python benchmarks/bench_accounts.py --accounts 5000 --seconds 20
+    python benchmarks/bench_accounts.py --no-limits   # see what the budgets prevent
+
+The mock exchange runs in its own process (apps.monitor.mockexchange) and
+answers for all three exchanges; accounts are spread evenly across them.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps.home.vault import encrypt_secret  # noqa: E402
+from apps.monitor import accounts  # noqa: E402
+from apps.monitor.accounts import AccountScheduler, AccountSpec  # noqa: E402
+from apps.monitor.mockexchange import MockExchange  # noqa: E402
+
+EXCHANGES = ("binance", "kucoin", "okx")
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"mock exchange did not start on port {port}")
+
+
+async def run(args):
+    accounts.ACCOUNT_POLL_MIN_SECONDS = args.min_interval
+    accounts.ACCOUNT_POLL_MAX_SECONDS = args.max_interval
+    if args.no_limits:
+        rate_limits = {exchange: (1e9, 1e9) for exchange in EXCHANGES}
+        key_rate_limit = (1e9, 1e9)
+    else:
+        rate_limits = {exchange: (args.exchange_rate, 10) for exchange in EXCHANGES}
+        key_rate_limit = (args.key_rate, 1)
+
+    polled = []
+    scheduler = AccountScheduler(
+        on_update=lambda account, snapshot, changes: polled.append(account.id),
+        base_url=f"http://127.0.0.1:{args.port}",
+        rate_limits=rate_limits,
+        key_rate_limit=key_rate_limit,
+    )
+    specs = [
+        AccountSpec(
+            id=index,
+            user_id=index,
+            exchange=EXCHANGES[index % len(EXCHANGES)],
+            sealed=(
+                encrypt_secret(f"key-{index}"),
+                encrypt_secret(f"secret-{index}"),
+                encrypt_secret("bench"),
+            ),
+            interval=args.interval,
+        )
+        for index in range(args.accounts)
+    ]
+    scheduler.apply(specs, ())
+    scheduler.preload_credentials()
+    runner = asyncio.ensure_future(scheduler.run())
+    await asyncio.sleep(args.seconds)
+    runner.cancel()
+    await scheduler.close()
+    return scheduler, specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=5, help="starting interval")
+    parser.add_argument("--min-interval", type=float, default=1)
+    parser.add_argument("--max-interval", type=float, default=60)
+    parser.add_argument(
+        "--exchange-rate", type=float, default=300, help="requests/s per exchange"
+    )
+    parser.add_argument("--key-rate", type=float, default=1, help="requests/s per key")
+    parser.add_argument("--mock-key-rate", type=float, default=2)
+    parser.add_argument("--no-limits", action="store_true")
+    parser.add_argument("--port", type=int, default=9700)
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "apps.monitor.mockexchange",
+            "--port",
+            str(args.port),
+            "--key-rate",
+            str(args.mock_key_rate),
+            "--global-rate",
+            str(args.exchange_rate * len(EXCHANGES) * 1.1),
+        ],
+        cwd=ROOT,
+    )
+    try:
+        wait_for_port(args.port)
+        started = time.perf_counter()
+        scheduler, specs = asyncio.run(run(args))
+        elapsed = time.perf_counter() - started
+        with urlopen(f"http://127.0.0.1:{args.port}/stats") as response:
+            stats = json.load(response)
+    finally:
+        server.terminate()
+        server.wait()
+
+    mock = MockExchange(busy_share=0.1)
+    busy = [spec.interval for spec in specs if mock.is_busy(f"key-{spec.id}")]
+    quiet = [spec.interval for spec in specs if not mock.is_busy(f"key-{spec.id}")]
+    budget = args.exchange_rate * len(EXCHANGES)
+    print(f"accounts          : {len(specs)} ({len(busy)} busy)")
+    print(f"polls             : {scheduler.polls} ({scheduler.polls / elapsed:,.0f}/s)")
+    if not args.no_limits:
+        print(f"exchange budget   : {budget:,.0f}/s")
+    print(f"429 from exchange : {stats['rate_limited']} of {stats['requests']}")
+    print(f"errors            : {scheduler.errors}")
+    vault = scheduler.vault
+    print(f"vault             : {vault.hits} hits, {vault.misses} misses")
+    if busy:
+        print(f"busy interval     : median {statistics.median(busy):.1f} s")
+    print(f"quiet interval    : median {statistics.median(quiet):.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Stylesheets and scripts a page loads: separate files vs built bundles.
+
+    python benchmarks/bench_assets.py --repeat 200
+
+Runs `flask build-assets`, then loads the login page with and without the
+manifest and fetches every stylesheet and script it links, the way a browser on
+a first visit would. A repeat visit to the built page needs none of them, they
+are cached as immutable, while the separate files are revalidated one by one.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app  # noqa: E402
+from apps.config import ProductionConfig  # noqa: E402
+from apps.home import assets  # noqa: E402
+
+PAGE = "/login"
+LINKED = re.compile(r"""(?:href|src)="(/static/[^"]+\.(?:css|js)[^"]*)\"""")
+
+
+class BenchConfig(ProductionConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def build(manifest):
+    app = create_app(BenchConfig)
+    assets.init_app(app, manifest)
+    return app.test_client()
+
+
+def visit(client, encoding, headers=None):
+    """Fetch what the page links, returning requests, bytes and cache headers."""
+    urls = LINKED.findall(client.get(PAGE).get_data(as_text=True))
+    found, size, immutable = 0, 0, 0
+    for url in urls:
+        response = client.get(
+            url, headers={"Accept-Encoding": encoding, **(headers or {})}
+        )
+        if response.status_code in (200, 304):
+            found += 1
+        size += len(response.data)
+        immutable += bool(response.cache_control.immutable)
+        response.close()
+    return len(urls), found, size, immutable
+
+
+def measure(client, encoding, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        visit(client, encoding)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    manifest = assets.build_assets()
+    print(f"build: {time.perf_counter() - started:.2f}s, {manifest}")
+
+    before, after = build({}), build(manifest)
+    print(
+        f"{'setup':<18} {'linked':>6} {'found':>6} {'bytes':>10} "
+        f"{'immutable':>9} {'median':>10}"
+    )
+    for label, client, encoding in (
+        ("separate", before, "identity"),
+        ("bundled", after, "identity"),
+        ("bundled, gzip", after, "gzip"),
+        ("bundled, brotli", after, "br, gzip"),
+    ):
+        linked, found, size, immutable = visit(client, encoding)
+        seconds = measure(client, encoding, args.repeat)
+        print(
+            f"{label:<18} {linked:>6} {found:>6} {size:>10} "
+            f"{immutable:>9} {seconds * 1e3:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Checkout session creation under concurrent load against a local Stripe stub.
+
+    python benchmarks/bench_checkout.py --requests 400 --concurrency 8 --cart 10
+
+The stub (apps.home.stripestub) runs in its own process. Each request goes through
+the real /create-checkout-session view on a throwaway SQLite file.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+PORT = int(os.environ.setdefault("STRIPE_STUB_PORT", "12111"))
+os.environ["STRIPE_API_BASE"] = f"http://127.0.0.1:{PORT}"
+
+from sqlalchemy import event  # noqa: E402
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import Order, Product, User  # noqa: E402
+from apps.home.payments import create_checkout_session, get_stripe  # noqa: E402
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix="bench-checkout-"), "db.sqlite3")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + DATABASE
+    WTF_CSRF_ENABLED = False
+    NOTIFICATION_WORKER = False
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"stripe stub did not start on port {port}")
+
+
+def seed(products):
+    db.create_all()
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "first_name": "Bench",
+                "last_name": "User",
+                "username": "bench",
+                "email": "bench@example.com",
+                "biography": "",
+                "password": b"",
+                "is_active": True,
+                "is_admin": False,
+            }
+        ],
+    )
+    db.session.execute(
+        db.insert(Product),
+        [{"name": f"Plan {index}", "price": 9.99 + index} for index in range(products)],
+    )
+    db.session.commit()
+
+
+def run(app, args):
+    cart = [
+        {"product_id": index + 1, "quantity": 1 + index % 3}
+        for index in range(args.cart)
+    ]
+    payload = {"user_id": 1, "total_price": 100, "cart_items": cart}
+    samples = []
+    failures = []
+    per_worker = args.requests // args.concurrency
+
+    def worker():
+        client = app.test_client()
+        for _ in range(per_worker):
+            started = time.perf_counter()
+            response = client.post("/create-checkout-session", json=payload)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures.append(response.get_json())
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, samples, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cart", type=int, default=10, help="items per order")
+    parser.add_argument("--latency", type=float, default=0.15, help="stub seconds")
+    parser.add_argument(
+        "--unpooled", action="store_true", help="the library's own HTTP client"
+    )
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "apps.home.stripestub",
+            "--port",
+            str(PORT),
+            "--latency",
+            str(args.latency),
+        ],
+        cwd=ROOT,
+    )
+    try:
+        wait_for_port(PORT)
+        if args.unpooled:
+            get_stripe().default_http_client = None
+        app = create_app(BenchConfig)
+        statements = []
+        with app.app_context():
+            seed(args.cart)
+            event.listen(
+                db.engine,
+                "before_cursor_execute",
+                lambda *_: statements.append(1),
+            )
+        elapsed, samples, failures = run(app, args)
+
+        # A retried call for the same order must not open a second session
+        with app.app_context():
+            order = db.session.execute(db.select(Order).limit(1)).scalar_one()
+            items = [{"price": "x", "quantity": 1}]
+            first = create_checkout_session(order.id, items, "http://s", "http://c")
+            again = create_checkout_session(order.id, items, "http://s", "http://c")
+        with urlopen(f"http://127.0.0.1:{PORT}/stats") as response:
+            stats = json.load(response)
+    finally:
+        stub.terminate()
+        stub.wait()
+        os.remove(DATABASE)
+
+    samples.sort()
+    print(f"requests          : {len(samples)} ({len(failures)} failed)")
+    print(f"throughput        : {len(samples) / elapsed:8.1f} checkouts/s")
+    print(f"latency           : p50 {statistics.median(samples) * 1000:7.1f} ms")
+    print(
+        f"                    p95 {samples[int(len(samples) * 0.95) - 1] * 1000:7.1f} ms"
+    )
+    print(
+        f"SQL per checkout  : {len(statements) / len(samples):8.1f} ({args.cart} items)"
+    )
+    print(
+        f"stripe sessions   : {stats['created']} created, {stats['replayed']} replayed"
+    )
+    print(f"retried session   : {'same' if first.id == again.id else 'DUPLICATE'}")
+    if failures:
+        print(f"first failure     : {failures[0]}")
+
+
+if __name__ == "__main__":
+    main()
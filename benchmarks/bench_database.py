@@ -0,0 +1,187 @@
+"""Concurrent reads and writes on SQLite: default journal vs WAL and the pragmas.
+
+    python benchmarks/bench_database.py --workers 4 --threads 4 --seconds 10
+
+Each worker is a forked process creating its own app and pool, like a gunicorn
+worker without --preload, and runs a mix of short reads and single-row update
+transactions from every thread. The first setup is SQLite's defaults (rollback
+journal, synchronous=FULL, Python's 5 s busy timeout); the second is the config's
+WAL, synchronous=NORMAL and longer busy timeout.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import User  # noqa: E402
+
+DIRECTORY = tempfile.mkdtemp(prefix="bench-database-")
+
+
+class BenchConfig(Config):
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+    PAGE_CACHE = False
+
+
+SETUPS = {
+    "defaults": {
+        "SQLITE_WAL": False,
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT": 5,
+        "SQLITE_CACHED_STATEMENTS": 128,
+    },
+    "wal": {},
+}
+
+
+def config(name):
+    uri = "sqlite:///" + os.path.join(DIRECTORY, f"{name}.sqlite3")
+    return type(
+        "Config", (BenchConfig,), {"SQLALCHEMY_DATABASE_URI": uri, **SETUPS[name]}
+    )
+
+
+def seed(name, count):
+    app = create_app(config(name))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "first_name": "First",
+                    "last_name": f"Last{index}",
+                    "username": f"user{index}",
+                    "email": f"user{index}@example.com",
+                    "biography": "",
+                    "house_address": "",
+                    "password": b"\0" * 64,
+                    "is_active": True,
+                    "is_admin": False,
+                }
+                for index in range(count)
+            ],
+        )
+        db.session.commit()
+        db.engine.dispose()
+
+
+def read(rng, users):
+    start = rng.randrange(1, users - 20)
+    db.session.execute(
+        db.select(User.id, User.username, User.email).where(
+            User.id.between(start, start + 20)
+        )
+    ).all()
+    db.session.commit()
+
+
+def write(rng, users):
+    db.session.execute(
+        db.update(User)
+        .where(User.id == rng.randrange(1, users))
+        .values(biography=f"updated {rng.random()}")
+    )
+    db.session.commit()
+
+
+def worker(name, args, seed_value, results):
+    app = create_app(config(name))
+    deadline = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    totals = {"reads": 0, "writes": 0, "locked": 0, "read_ms": [], "write_ms": []}
+
+    def run(index):
+        rng = random.Random(seed_value * 1000 + index)
+        counts = {"reads": 0, "writes": 0, "locked": 0, "read_ms": [], "write_ms": []}
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                kind = "writes" if rng.random() < args.writes else "reads"
+                started = time.perf_counter()
+                try:
+                    (write if kind == "writes" else read)(rng, args.users)
+                except OperationalError:
+                    # "database is locked", the busy timeout ran out
+                    db.session.rollback()
+                    counts["locked"] += 1
+                    continue
+                counts[kind] += 1
+                counts[f"{kind[:-1]}_ms"].append((time.perf_counter() - started) * 1e3)
+            db.session.remove()
+        with lock:
+            for key, value in counts.items():
+                totals[key] += value
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(totals)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    return statistics.quantiles(samples, n=100)[int(fraction * 100) - 1]
+
+
+def measure(name, args):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(name, args, index, results))
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    merged = {key: [] if key.endswith("_ms") else 0 for key in totals[0]}
+    for total in totals:
+        for key, value in total.items():
+            merged[key] += value
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.2, help="share of writes")
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(
+        f"{'setup':<9} {'reads/s':>9} {'writes/s':>9} {'locked':>7} "
+        f"{'read p95':>10} {'write p95':>10}"
+    )
+    for name in SETUPS:
+        seed(name, args.users)
+        result = measure(name, args)
+        print(
+            f"{name:<9} {result['reads'] / args.seconds:9.0f} "
+            f"{result['writes'] / args.seconds:9.0f} {result['locked']:7d} "
+            f"{percentile(result['read_ms'], 0.95):8.2f}ms "
+            f"{percentile(result['write_ms'], 0.95):8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Price history store: write throughput and range queries against full scans.
+
+python benchmarks/bench_history.py --ticks 2000000 --days 2
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.monitor.engine import Tick  # noqa: E402
+from apps.monitor.history import HOUR_MS, PriceHistoryStore  # noqa: E402
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=2_000_000)
+    parser.add_argument("--days", type=float, default=2)
+    parser.add_argument(
+        "--live", type=int, default=200_000, help="ticks through the feed sink"
+    )
+    parser.add_argument("--batch", type=int, default=1000, help="ticks per extend")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    span = int(args.days * 24 * HOUR_MS)
+    start = 1_700_000_000_000
+    stamps = np.sort(rng.integers(start, start + span, args.ticks))
+    prices = 30000 + np.cumsum(rng.normal(0, 5, args.ticks))
+    volumes = rng.random(args.ticks)
+
+    root = tempfile.mkdtemp(prefix="price-history-")
+    try:
+        store = PriceHistoryStore(root)
+        live = min(args.live, args.ticks)
+        started = time.perf_counter()
+        for ts, price, volume in zip(
+            stamps[:live].tolist(),
+            prices[:live].tolist(),
+            volumes[:live].tolist(),
+        ):
+            store.append_tick(Tick("binance", "BTCUSDT", ts, price, volume))
+        store.write_pending()
+        sunk = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for offset in range(live, args.ticks, args.batch):
+            end = offset + args.batch
+            store.extend(
+                "binance",
+                "BTCUSDT",
+                stamps[offset:end],
+                prices[offset:end],
+                volumes[offset:end],
+            )
+        extended = time.perf_counter() - started
+        store.flush()
+
+        reader = PriceHistoryStore(root, readonly=True)
+        last = int(stamps[-1])
+
+        def ranged(resolution, length):
+            return lambda: reader.query(
+                "binance", "BTCUSDT", last - length, last, resolution
+            )
+
+        def scanned():
+            # What a single file per symbol would cost: load it all, then filter
+            ticks = reader.query("binance", "BTCUSDT", 0, last, "tick")
+            keep = ticks["ts"] >= last - HOUR_MS
+            return {column: np.array(values[keep]) for column, values in ticks.items()}
+
+        size = sum(
+            os.path.getsize(os.path.join(path, name))
+            for path, _, names in os.walk(root)
+            for name in names
+        )
+        print(f"feed sink         : {live / sunk:12,.0f} ticks/s")
+        if args.ticks > live:
+            print(
+                f"extend ({args.batch:>5})    : {(args.ticks - live) / extended:12,.0f} ticks/s"
+            )
+        print(
+            f"on disk           : {size / 2**20:12,.1f} MiB (sparse files count in full)"
+        )
+        for label, query in (
+            ("last hour, ticks", ranged("tick", HOUR_MS)),
+            ("last hour, 1s", ranged("1s", HOUR_MS)),
+            ("last day, 1m", ranged("1m", 24 * HOUR_MS)),
+            ("everything, 1h", ranged("1h", span)),
+            ("last hour, scan", scanned),
+        ):
+            seconds, result = timed(query, args.queries)
+            rows = len(result["ts"])
+            print(f"{label:<18}: {seconds * 1000:9.2f} ms for {rows:,} rows")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Per-user lookups on large tables, with and without the foreign key indexes.
+
+    python benchmarks/bench_indexes.py --users 20000 --per-user 20
+
+Seeds orders, order items and pricing tasks for every user, times the hot
+queries from apps.home.queryplan, then drops the indexes the user_id/order_id
+lookups rely on and times them again.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import AssignedPricingTask, Order, OrderItem  # noqa: E402
+from apps.home.queryplan import check_hot_queries  # noqa: E402
+
+INDEXES = (
+    "ix_jd_orders_user_date",
+    "ix_jd_order_items_order_id",
+    "ix_jd_pricing_tasks_user_status",
+)
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def seed(users, per_user, batch=50_000):
+    rng = random.Random(7)
+    start = datetime(2023, 1, 1)
+    db.create_all()
+    orders = [
+        {
+            "user_id": user,
+            "order_date": start + timedelta(minutes=rng.randrange(10**6)),
+            "total_price": 10,
+            "payment_status": True,
+        }
+        for user in range(1, users + 1)
+        for _ in range(per_user)
+    ]
+    for offset in range(0, len(orders), batch):
+        db.session.execute(db.insert(Order), orders[offset : offset + batch])
+    items = [
+        {"order_id": order, "quantity": 1, "price": 5}
+        for order in range(1, len(orders) + 1)
+        for _ in range(2)
+    ]
+    for offset in range(0, len(items), batch):
+        db.session.execute(db.insert(OrderItem), items[offset : offset + batch])
+    tasks = [
+        {
+            "user_id": user,
+            "exchange": "binance",
+            "symbols": "BTCUSDT",
+            "status": rng.choice(("active", "stopped")),
+        }
+        for user in range(1, users + 1)
+        for _ in range(per_user // 4 or 1)
+    ]
+    for offset in range(0, len(tasks), batch):
+        db.session.execute(
+            db.insert(AssignedPricingTask), tasks[offset : offset + batch]
+        )
+    db.session.commit()
+
+
+def queries(users, orders):
+    rng = random.Random(11)
+    return {
+        "orders of a user": lambda: Order.query.filter_by(
+            user_id=rng.randrange(1, users)
+        )
+        .order_by(Order.order_date.desc())
+        .all(),
+        "items of an order": lambda: OrderItem.query.filter_by(
+            order_id=rng.randrange(1, orders)
+        ).all(),
+        "active tasks of a user": lambda: AssignedPricingTask.query.filter_by(
+            user_id=rng.randrange(1, users), status="active"
+        ).all(),
+    }
+
+
+def measure(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        db.session.rollback()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users, args.per_user)
+        print(f"seeded in {time.perf_counter() - started:.1f}s")
+        scans = [name for name, (tables, _) in check_hot_queries().items() if tables]
+        print(f"hot queries scanning a table: {scans or 'none'}")
+
+        hot = queries(args.users, args.users * args.per_user)
+        indexed = {name: measure(query, args.repeat) for name, query in hot.items()}
+        for index in INDEXES:
+            db.session.execute(db.text(f"DROP INDEX {index}"))
+        db.session.commit()
+        scans = [name for name, (tables, _) in check_hot_queries().items() if tables]
+        print(f"without the indexes, scanning: {scans}")
+
+        print(f"{'query':<24} {'indexed':>10} {'scan':>10}")
+        for name, query in hot.items():
+            # Fewer repeats, every one reads the whole table
+            scan = measure(query, max(args.repeat // 10, 3))
+            print(f"{name:<24} {indexed[name] * 1e3:8.2f}ms {scan * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
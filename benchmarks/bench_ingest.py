@@ -0,0 +1,97 @@
+"""Load test the market-data ingestion path against the local feed server.
+
+    python benchmarks/bench_ingest.py --seconds 10 --rate 200000 --tasks 30000
+
+The feed server, the FeedHub and the price-alert engine all share one event loop,
+so the reported rate is what a single core sustains end to end. Ticks reach the
+engine by interned symbol id as in the monitor service, --by-name feeds them by
+(exchange, symbol) instead. --drop-after makes the server cut the connection
+periodically to exercise reconnects.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.monitor import ingest  # noqa: E402
+from apps.monitor.engine import PriceAlertEngine  # noqa: E402
+from apps.monitor.feedserver import FeedServer, RandomWalkSource  # noqa: E402
+from apps.monitor.ingest import FeedHub, LocalFeedAdapter  # noqa: E402
+from bench_price_engine import make_symbols, make_tasks  # noqa: E402
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    engine = PriceAlertEngine(make_tasks(args.tasks, make_symbols(args.symbols), rng))
+
+    feed = FeedServer(
+        RandomWalkSource(seed=args.seed),
+        rate=args.rate,
+        batch=args.batch,
+        drop_after=args.drop_after,
+    )
+    server = await feed.serve(port=args.port)
+
+    ingest.RECONNECT_BASE_DELAY = 0.05
+    hub = FeedHub(
+        {
+            exchange: LocalFeedAdapter(port=args.port, exchange=exchange)
+            for exchange in ("binance", "kucoin", "okx")
+        }
+    )
+    if args.by_name:
+        hub.add_sink(engine.process_tick)
+    else:
+        process_id = engine.process_id
+        process_tick = engine.process_tick
+
+        def on_tick(tick, symbol_id):
+            if symbol_id is None:
+                process_tick(tick)
+            else:
+                process_id(symbol_id, tick.ts_ms, tick.price)
+
+        hub.add_sink(on_tick, symbol_id=True)
+    await hub.sync(engine.subscriptions())
+    await hub.wait_connected(timeout=5)
+
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    elapsed = time.perf_counter() - started
+    ticks = hub.tick_count
+
+    reconnects = sum(c.reconnects for c in hub._connections.values())
+    await hub.close()
+    # Let the server notice the disconnects before the loop shuts down
+    await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
+
+    print(f"subscriptions     : {len(hub.subscriptions())}")
+    print(f"upstream sockets  : {feed.connections} ({reconnects} reconnects)")
+    print(f"ticks ingested    : {ticks}")
+    print(f"alerts raised     : {engine.alert_count}")
+    print(f"throughput        : {ticks / elapsed:,.0f} ticks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=int, default=100_000, help="per connection")
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=30_000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--drop-after", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--by-name", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
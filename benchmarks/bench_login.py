@@ -0,0 +1,107 @@
+"""Login's username lookup at 1M users: lower() on every row vs the indexed column.
+
+    python benchmarks/bench_login.py --users 1000000
+
+Times the query login used to run, `lower(username) = lower(?)`, which SQLite
+can only answer by scanning jd_users, against `User.by_username`, and the
+request loader's path through the user cache with the cache cleared each time.
+Usernames are looked up in a different case from the one they were stored in.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from sqlalchemy import func  # noqa: E402
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.cache import user_cache  # noqa: E402
+from apps.home.models import User  # noqa: E402
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix="bench-login-"), "db.sqlite3")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + DATABASE
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def seed(count, batch=50_000):
+    db.create_all()
+    for offset in range(0, count, batch):
+        # username_lower comes from the column default, as for any Core insert
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "first_name": "First",
+                    "last_name": f"Last{index}",
+                    "username": f"User{index}",
+                    "email": f"user{index}@example.com",
+                    "biography": "",
+                    "house_address": "",
+                    "password": b"\0" * 64,
+                    "is_active": True,
+                    "is_admin": False,
+                }
+                for index in range(offset, min(offset + batch, count))
+            ],
+        )
+    db.session.commit()
+
+
+def measure(lookup, names):
+    samples = []
+    for name in names:
+        started = time.perf_counter()
+        user = lookup(name)
+        samples.append(time.perf_counter() - started)
+        assert user is not None and user.username.lower() == name.lower(), name
+        db.session.rollback()
+    return statistics.median(samples), max(samples)
+
+
+def lower_on_every_row(name):
+    return User.query.filter(func.lower(User.username) == func.lower(name)).first()
+
+
+def request_loader(name):
+    user_cache.clear()
+    return user_cache.get_by_username(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users)
+        print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(3)
+        names = [f"user{rng.randrange(args.users)}" for _ in range(args.lookups)]
+        # Every lookup of the old query reads the whole table, a few are enough
+        for label, lookup, sample in (
+            ("lower(username)", lower_on_every_row, names[:10]),
+            ("username_lower", User.by_username, names),
+            ("request loader", request_loader, names),
+        ):
+            median, worst = measure(lookup, sample)
+            print(f"{label:<16}: {median * 1e3:9.3f} ms median {worst * 1e3:9.3f} max")
+
+
+if __name__ == "__main__":
+    main()
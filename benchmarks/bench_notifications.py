@@ -0,0 +1,125 @@
+"""Drain the notification queue into the local SMTP sink.
+
+    python benchmarks/bench_notifications.py --alerts 20000 --users 500
+
+Price alerts are coalesced per user, so the sink should see roughly one email per
+user per batch, delivered over one SMTP connection per batch.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import OutboundNotification, User  # noqa: E402
+from apps.monitor.engine import Alert  # noqa: E402
+from apps.notifications.queue import (  # noqa: E402
+    NotificationWorker,
+    enqueue_email,
+    enqueue_price_alerts,
+)
+from apps.notifications.smtpsink import SMTPSink  # noqa: E402
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+
+
+def start_sink(sink, port):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(sink.serve(port=port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=20_000)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    os.environ.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=str(args.port))
+    os.environ["MAIL_USE_TLS"] = "False"
+    sink = SMTPSink(failure_rate=args.failure_rate)
+    start_sink(sink, args.port)
+
+    app = create_app(BenchConfig)
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "first_name": "First",
+                    "last_name": "Last",
+                    "username": f"user{index}",
+                    "email": f"user{index}@example.com",
+                    "biography": "",
+                }
+                for index in range(1, args.users + 1)
+            ],
+        )
+        db.session.commit()
+
+        started = time.perf_counter()
+        enqueue_price_alerts(
+            [
+                Alert(
+                    n,
+                    rng.randint(1, args.users),
+                    "binance",
+                    "BTCUSDT",
+                    "up",
+                    2.5,
+                    0,
+                    1.0,
+                )
+                for n in range(args.alerts)
+            ]
+        )
+        for index in range(args.emails):
+            enqueue_email(f"admin{index}@example.com", "New Message Received", "Hi")
+        enqueued = time.perf_counter() - started
+
+        worker = NotificationWorker(batch_size=args.batch)
+        worker.coalesce_seconds = 0
+        started = time.perf_counter()
+        rows = 0
+        while True:
+            processed = worker.run_once()
+            if not processed:
+                break
+            rows += processed
+        drained = time.perf_counter() - started
+        left = OutboundNotification.query.filter_by(status="pending").count()
+
+    print(f"rows queued       : {args.alerts + args.emails} in {enqueued:.2f} s")
+    print(f"rows delivered    : {rows} in {drained:.2f} s")
+    print(f"emails accepted   : {sink.messages} ({sink.rejected} rejected)")
+    print(f"smtp connections  : {sink.connections}")
+    print(f"left for retry    : {left}")
+
+
+if __name__ == "__main__":
+    main()
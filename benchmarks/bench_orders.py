@@ -0,0 +1,108 @@
+"""The order listing's queries: relationships loaded row by row vs selectinload.
+
+    python benchmarks/bench_orders.py --orders 200 --items 5
+
+Walks a user's orders, their items and each item's product the way the order
+page does, once with the default lazy loading and once through Order.of_user,
+counting statements with the N+1 detector.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import Order, OrderItem, Product  # noqa: E402
+from apps.home.nplusone import nplusone_detector  # noqa: E402
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+    DB_WARMUP = False
+
+
+def seed(orders, items, products=50):
+    db.create_all()
+    db.session.execute(
+        db.insert(Product),
+        [{"name": f"Product {i}", "price": 5} for i in range(products)],
+    )
+    start = datetime(2023, 1, 1)
+    db.session.execute(
+        db.insert(Order),
+        [
+            {
+                "user_id": 1,
+                "order_date": start + timedelta(hours=i),
+                "total_price": 5 * items,
+                "payment_status": True,
+            }
+            for i in range(orders)
+        ],
+    )
+    db.session.execute(
+        db.insert(OrderItem),
+        [
+            {
+                "order_id": order,
+                "product_id": (order * items + i) % products + 1,
+                "quantity": 1,
+                "price": 5,
+            }
+            for order in range(1, orders + 1)
+            for i in range(items)
+        ],
+    )
+    db.session.commit()
+
+
+def lazy():
+    return Order.query.filter_by(user_id=1).order_by(Order.order_date.desc()).all()
+
+
+def walk(orders):
+    return sum(len(item.product.name) for order in orders for item in order.order_items)
+
+
+def measure(load, repeat):
+    samples = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        with nplusone_detector.watch() as counts:
+            walk(load())
+        samples.append(time.perf_counter() - started)
+        db.session.rollback()
+    return statistics.median(samples), sum(counts.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        seed(args.orders, args.items)
+        print(f"{'loading':<12} {'statements':>10} {'median':>10}")
+        for name, load in (
+            ("lazy", lazy),
+            ("selectinload", lambda: Order.of_user(1)),
+        ):
+            median, statements = measure(load, args.repeat)
+            print(f"{name:<12} {statements:10d} {median * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Catch-all page cost: render and minify per hit vs cached body vs 304.
+
+    python benchmarks/bench_pages.py --repeat 500
+
+Runs the production setup from run.py, Flask-Minify included, once with the page
+cache off (every hit rendered and minified, as before) and once with it on.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from flask_minify import Minify  # noqa: E402
+
+from apps import create_app  # noqa: E402
+from apps.config import ProductionConfig  # noqa: E402
+from apps.home.pages import page_cache  # noqa: E402
+
+PAGES = ("map", "tables", "icons", "pricing")
+
+
+class BenchConfig(ProductionConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def build(cached):
+    config = type("Config", (BenchConfig,), {"PAGE_CACHE": cached})
+    app = create_app(config)
+    bypass = ["home_blueprint.templates"] if cached else []
+    Minify(app=app, html=True, js=False, cssless=False, bypass=bypass)
+    return app
+
+
+def measure(client, page, repeat, headers=None):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(f"/{page}", headers=headers)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    before = build(cached=False).test_client()
+    results = {page: [measure(before, page, args.repeat)[0]] for page in PAGES}
+
+    app = build(cached=True)
+    after = app.test_client()
+    for page in PAGES:
+        seconds, response = measure(after, page, args.repeat)
+        etag = response.headers["ETag"]
+        not_modified, response = measure(
+            after, page, args.repeat, {"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        with app.test_request_context(f"/{page}"):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                page_cache.response(page)
+            direct = (time.perf_counter() - started) / args.repeat
+        results[page] += [seconds, not_modified, direct]
+
+    print(f"{'page':<8} {'before':>10} {'cached':>10} {'304':>10} {'lookup':>10}")
+    for page, (old, new, conditional, direct) in results.items():
+        print(
+            f"{page:<8} {old * 1e3:8.2f}ms {new * 1e3:8.2f}ms "
+            f"{conditional * 1e3:8.2f}ms {direct * 1e6:8.1f}us"
+        )
+    print(f"cache hits / misses: {page_cache.hits} / {page_cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
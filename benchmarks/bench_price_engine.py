@@ -0,0 +1,126 @@
+"""Offline throughput benchmark for the price-alert engine.
+
+    python benchmarks/bench_price_engine.py --tasks 30000 --ticks 1000000
+    python benchmarks/bench_price_engine.py --tick-file ticks.csv
+    python benchmarks/bench_price_engine.py --by-id
+
+Without --tick-file a synthetic random walk is generated (and can be kept with
+--write-tick-file so later runs replay exactly the same input).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.monitor.engine import (  # noqa: E402
+    PriceAlertEngine,
+    TaskSpec,
+    Tick,
+    read_tick_file,
+    write_tick_file,
+)
+
+EXCHANGES = ("binance", "kucoin", "okx")
+WINDOWS_MS = (1_000, 5_000, 30_000, 60_000, 300_000)
+DIRECTIONS = ("up", "down", None)
+
+
+def make_symbols(count):
+    return [f"SYM{index}USDT" for index in range(count)]
+
+
+def make_tasks(count, symbols, rng):
+    tasks = []
+    for task_id in range(1, count + 1):
+        tasks.append(
+            TaskSpec(
+                id=task_id,
+                user_id=task_id % 5000,
+                exchange=rng.choice(EXCHANGES),
+                symbols=",".join(rng.sample(symbols, rng.randint(1, 3))),
+                percentage=rng.randint(1, 10),
+                direction=rng.choice(DIRECTIONS),
+                time_ms=rng.choice(WINDOWS_MS),
+            )
+        )
+    return tasks
+
+
+def make_ticks(count, symbols, rng, volatility=0.0005):
+    prices = {
+        (exchange, symbol): rng.uniform(1, 1000)
+        for exchange in EXCHANGES
+        for symbol in symbols
+    }
+    keys = list(prices)
+    ts_ms = 1_700_000_000_000
+    ticks = []
+    for _ in range(count):
+        ts_ms += rng.randint(0, 2)
+        key = rng.choice(keys)
+        price = prices[key] = prices[key] * (1 + rng.gauss(0, volatility))
+        ticks.append(Tick(key[0], key[1], ts_ms, price))
+    return ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=30_000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=500_000)
+    parser.add_argument(
+        "--volatility", type=float, default=0.0005, help="stddev of each tick's move"
+    )
+    parser.add_argument("--tick-file", help="replay ticks from this CSV file")
+    parser.add_argument("--write-tick-file", help="save the generated ticks here")
+    parser.add_argument(
+        "--by-id",
+        action="store_true",
+        help="intern symbols up front and feed the engine integer ids",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    symbols = make_symbols(args.symbols)
+
+    started = time.perf_counter()
+    engine = PriceAlertEngine(make_tasks(args.tasks, symbols, rng))
+    load_seconds = time.perf_counter() - started
+
+    if args.tick_file:
+        ticks = list(read_tick_file(args.tick_file))
+    else:
+        ticks = make_ticks(args.ticks, symbols, rng, args.volatility)
+        if args.write_tick_file:
+            write_tick_file(args.write_tick_file, ticks)
+
+    if args.by_id:
+        # What a feed adapter interning symbols as it parses would hand over
+        ticks = [
+            (engine.symbol_id(tick[0], tick[1]), tick[2], tick[3]) for tick in ticks
+        ]
+        started = time.perf_counter()
+        process_id = engine.process_id
+        alerts = 0
+        for symbol_id, ts_ms, price in ticks:
+            alerts += len(process_id(symbol_id, ts_ms, price))
+    else:
+        started = time.perf_counter()
+        alerts = engine.replay(ticks)
+    elapsed = time.perf_counter() - started
+
+    print(f"tasks loaded      : {len(engine)} in {load_seconds * 1000:.1f} ms")
+    print(f"subscriptions     : {len(engine.subscriptions())}")
+    print(f"ticks replayed    : {len(ticks)}")
+    print(f"alerts raised     : {alerts}")
+    print(f"elapsed           : {elapsed:.3f} s")
+    print(f"throughput        : {len(ticks) / elapsed:,.0f} ticks/s")
+
+
+if __name__ == "__main__":
+    main()
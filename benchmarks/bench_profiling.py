@@ -0,0 +1,74 @@
+"""Cost of the request metrics and of sampling requests under cProfile.
+
+    python benchmarks/bench_profiling.py --requests 2000
+
+Logs a user in and fetches the login page and the index page repeatedly, first
+with PROFILING off, then with the metrics on, then with every request profiled.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import User  # noqa: E402
+from apps.home.profiling import profiler  # noqa: E402
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+    WTF_CSRF_ENABLED = False
+    DB_WARMUP = False
+
+
+SETUPS = {
+    "off": {"PROFILING": False},
+    "metrics": {"PROFILING": True},
+    "profiled": {"PROFILING": True, "PROFILE_SAMPLE_RATE": 1.0},
+}
+
+
+def measure(name, count):
+    app = create_app(type("Config", (BenchConfig,), SETUPS[name]))
+    with app.app_context():
+        db.create_all()
+        user = User("First", "Last", "bench", "bench@example.com", "password")
+        user.biography = ""
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    client.post("/login", data={"username": "bench", "password": "password"})
+    samples = []
+    for index in range(count):
+        path = "/index" if index % 2 else "/login"
+        started = time.perf_counter()
+        client.get(path)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), count / sum(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'setup':<9} {'median':>10} {'req/s':>8}")
+    for name in SETUPS:
+        median, rate = measure(name, args.requests)
+        print(f"{name:<9} {median * 1e3:8.2f}ms {rate:8.0f}")
+    # The metrics endpoint renders everything the last setup recorded
+    started = time.perf_counter()
+    size = len(profiler.metrics())
+    print(f"metrics: {size} bytes in {(time.perf_counter() - started) * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
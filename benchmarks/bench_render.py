@@ -0,0 +1,100 @@
+"""Template render latency with a large user table.
+
+    python benchmarks/bench_render.py --users 10000 100000
+
+For every table size the same pages are rendered twice: once with the old eager
+`User.query.all()` context processor added back, once with just the lazy summary.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.cache import invalidate_user_summary  # noqa: E402
+from apps.home.models import User  # noqa: E402
+from apps.home.util import hash_pass  # noqa: E402
+
+PAGES = ("/login", "/icons", "/tables")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    WTF_CSRF_ENABLED = False
+
+
+def seed_users(count):
+    # One hash for everybody, 100k rounds of PBKDF2 per row would dominate seeding
+    password = hash_pass("Benchmark-1")
+    db.session.execute(db.delete(User))
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "first_name": "First",
+                "last_name": f"Last{index}",
+                "username": f"user{index}",
+                "email": f"user{index}@example.com",
+                "biography": "",
+                "password": password,
+                "is_active": True,
+                "is_admin": index % 100 == 0,
+            }
+            for index in range(count)
+        ],
+    )
+    db.session.commit()
+    invalidate_user_summary()
+
+
+def eager_users():
+    return dict(users=User.query.all())
+
+
+def measure(client, repeat):
+    samples = []
+    for _ in range(repeat):
+        for page in PAGES:
+            started = time.perf_counter()
+            response = client.get(page)
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, (page, response.status_code)
+    return samples
+
+
+def report(label, count, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<6} users={count:<8} mean={statistics.mean(samples) * 1000:8.2f} ms"
+        f"  p95={p95 * 1000:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    processors = app.template_context_processors[None]
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        for count in args.users:
+            seed_users(count)
+            processors.append(eager_users)
+            report("eager", count, measure(client, args.repeat))
+            processors.remove(eager_users)
+            report("lazy", count, measure(client, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
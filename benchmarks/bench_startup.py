@@ -0,0 +1,136 @@
+"""Worker boot cost: import time by package and time to first response.
+
+    python benchmarks/bench_startup.py --runs 5 --record benchmarks/startup.jsonl
+
+Every run is a fresh interpreter importing run.py, the module gunicorn loads, and
+answering one GET through the test client. The `-X importtime` breakdown comes
+from one more run. With --record the medians are appended as a JSON line tagged
+with the current commit, to compare across changes.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV = {
+    **os.environ,
+    "FERNET_KEY": "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=",
+    "NOTIFICATION_WORKER": "False",
+    "WEBHOOK_WORKER": "False",
+}
+# Printed by the child: seconds to import run.py, then to the first response
+BOOT = """
+import sys, time
+started = time.perf_counter()
+import run
+imported = time.perf_counter()
+response = run.app.test_client().get(sys.argv[1])
+print(imported - started, time.perf_counter() - imported, response.status_code)
+"""
+# Loaded on first use rather than at boot
+LAZY = ("stripe", "cloudinary", "cryptography", "flask_mail")
+
+
+def boot(path):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", BOOT, path],
+        cwd=ROOT,
+        env=ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    total = time.perf_counter() - started
+    return float(output[0]), float(output[1]), int(output[2]), total
+
+
+def import_times():
+    """Microseconds spent in each top-level package's own modules, and every
+    module loaded.
+
+    Self times, not cumulative ones, so a package isn't charged for what it
+    imports from another and the figures add up to the whole import.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import run"],
+        cwd=ROOT,
+        env=ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    packages = Counter()
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        modules.add(name)
+        packages[name.split(".")[0]] += int(own)
+    return packages, modules
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/login")
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--record", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    runs = [boot(args.path) for _ in range(args.runs)]
+    assert all(status == 200 for _, _, status, _ in runs), runs
+    imported, first_response, _, total = (
+        statistics.median(column) for column in zip(*runs)
+    )
+    packages, modules = import_times()
+
+    print(f"import run.py     : {imported * 1e3:8.1f} ms")
+    print(f"first response    : {first_response * 1e3:8.1f} ms")
+    print(f"process total     : {total * 1e3:8.1f} ms (interpreter start included)")
+    print(f"modules imported  : {len(modules)}")
+    print(f"loaded at boot    : {[name for name in LAZY if name in modules]}")
+    print("slowest packages (own modules, -X importtime):")
+    for name, micros in packages.most_common(args.top):
+        print(f"  {name:<20} {micros / 1e3:8.1f} ms")
+
+    if args.record:
+        with open(args.record, "a") as f:
+            record = {
+                "commit": commit(),
+                "recorded": int(time.time()),
+                "import_ms": round(imported * 1e3, 1),
+                "first_response_ms": round(first_response * 1e3, 1),
+                "total_ms": round(total * 1e3, 1),
+                "modules": len(modules),
+                "packages_ms": {
+                    name: round(micros / 1e3, 1)
+                    for name, micros in packages.most_common(args.top)
+                },
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Many dashboards on one process: fan-out load test for the SSE stream.
+
+    python benchmarks/bench_stream.py --clients 3000 --slow-clients 50 --rate 50000
+
+Normal clients read everything they are sent, slow clients never read at all and
+should end up skipped and then disconnected rather than growing memory.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.monitor import stream  # noqa: E402
+from apps.monitor.engine import Tick  # noqa: E402
+from apps.monitor.stream import StreamBroker, StreamServer  # noqa: E402
+
+
+async def viewer(port, symbols, counts, read=True):
+    sock = socket.socket()
+    if not read:
+        # A tiny receive window so a stalled viewer backs up quickly
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(f"GET /stream?symbols={symbols} HTTP/1.1\r\n\r\n".encode())
+    try:
+        await writer.drain()
+        if not read:
+            await reader.read(1)
+            await asyncio.sleep(3600)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"event: prices"):
+                counts[0] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    stream.STREAM_SLOW_CLIENT_TIMEOUT = args.slow_timeout
+    stream.STREAM_WRITE_HIGH_WATER = args.high_water
+    broker = StreamBroker(max_fps=args.fps)
+    server = await StreamServer(broker, require_auth=False).serve(
+        "127.0.0.1", args.port
+    )
+    flusher = asyncio.ensure_future(broker.run())
+
+    rng = random.Random(42)
+    symbols = [f"SYM{index}USDT" for index in range(args.symbols)]
+    counts = [0]
+    viewers = []
+    for index in range(args.clients + args.slow_clients):
+        # Stalled viewers take the unfiltered firehose to back up sooner
+        reading = index < args.clients
+        watched = ",".join(f"binance:{s}" for s in rng.sample(symbols, 5))
+        viewers.append(
+            asyncio.ensure_future(
+                viewer(args.port, watched if reading else "", counts, read=reading)
+            )
+        )
+        if index % 500 == 0:
+            await asyncio.sleep(0.05)
+    while len(broker.clients) < args.clients + args.slow_clients:
+        await asyncio.sleep(0.05)
+
+    prices = {symbol: 100.0 for symbol in symbols}
+    published = 0
+    started = time.perf_counter()
+    batch = max(1, args.rate // 100)
+    while time.perf_counter() - started < args.seconds:
+        now_ms = int(time.time() * 1000)
+        for _ in range(batch):
+            symbol = rng.choice(symbols)
+            prices[symbol] *= 1 + rng.gauss(0, 0.0005)
+            broker.publish_tick(Tick("binance", symbol, now_ms, prices[symbol]))
+        published += batch
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    print(f"viewers           : {args.clients} reading, {args.slow_clients} stalled")
+    print(f"ticks published   : {published / elapsed:,.0f} /s")
+    print(
+        f"frames delivered  : {counts[0]} ({counts[0] / elapsed / args.clients:.2f} /s per viewer, cap {args.fps})"
+    )
+    print(f"frames skipped    : {broker.frames_skipped}")
+    print(f"slow disconnects  : {broker.slow_disconnects}")
+    print(
+        f"max rss           : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+    )
+
+    flusher.cancel()
+    for task in viewers:
+        task.cancel()
+    await asyncio.gather(*viewers, return_exceptions=True)
+    # Let the server see the disconnects before the loop shuts down
+    await asyncio.sleep(0.5)
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=3000)
+    parser.add_argument("--slow-clients", type=int, default=50)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--rate", type=int, default=50_000, help="ticks/s")
+    parser.add_argument("--fps", type=float, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--slow-timeout", type=float, default=5)
+    parser.add_argument("--high-water", type=int, default=32 * 1024)
+    parser.add_argument("--port", type=int, default=9600)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
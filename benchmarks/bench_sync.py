@@ -0,0 +1,144 @@
+"""Full task reload vs incremental change-log sync for the price monitor.
+
+    python benchmarks/bench_sync.py --tasks 100000 --changes 10 100 1000
+
+Each round edits, pauses, deletes and creates a mix of tasks through the ORM,
+then brings an engine up to date both ways and checks they agree.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import AssignedPricingTask, PricingTaskSymbol, User  # noqa: E402
+from apps.monitor.engine import PriceAlertEngine  # noqa: E402
+from apps.monitor.sync import ChangeTracker, EngineSync  # noqa: E402
+
+EXCHANGES = ("binance", "kucoin", "okx")
+WINDOWS_MS = (1_000, 5_000, 30_000, 60_000, 300_000)
+
+
+class BenchConfig(Config):
+    NOTIFICATION_WORKER = False
+
+
+def seed(task_count, symbols, rng):
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "first_name": "First",
+                "last_name": "Last",
+                "username": "bench",
+                "email": "bench@example.com",
+                "biography": "",
+                "password": b"",
+            }
+        ],
+    )
+    tasks, rows = [], []
+    for task_id in range(1, task_count + 1):
+        exchange = rng.choice(EXCHANGES)
+        watched = rng.sample(symbols, rng.randint(1, 3))
+        tasks.append(
+            {
+                "id": task_id,
+                "user_id": 1,
+                "exchange": exchange,
+                "symbols": ",".join(watched),
+                "percentage": rng.randint(1, 10),
+                "time_ms": rng.choice(WINDOWS_MS),
+            }
+        )
+        rows.extend(
+            {"task_id": task_id, "exchange": exchange, "symbol": symbol}
+            for symbol in watched
+        )
+    db.session.execute(db.insert(AssignedPricingTask), tasks)
+    db.session.execute(db.insert(PricingTaskSymbol), rows)
+    db.session.commit()
+
+
+def make_changes(count, symbols, rng):
+    task_ids = db.session.scalars(db.select(AssignedPricingTask.id)).all()
+    for task_id in rng.sample(task_ids, count):
+        task = db.session.get(AssignedPricingTask, task_id)
+        action = rng.random()
+        if action < 0.5:
+            task.percentage = rng.randint(1, 10)
+            task.symbols = ",".join(rng.sample(symbols, rng.randint(1, 3)))
+        elif action < 0.7:
+            task.status = "paused"
+        elif action < 0.85:
+            db.session.delete(task)
+        else:
+            db.session.add(
+                AssignedPricingTask(
+                    user_id=1,
+                    exchange=rng.choice(EXCHANGES),
+                    symbols=rng.choice(symbols),
+                    percentage=rng.randint(1, 10),
+                    time_ms=rng.choice(WINDOWS_MS),
+                )
+            )
+    db.session.commit()
+
+
+def snapshot(engine):
+    return sorted(engine.task_ids()), sorted(engine.subscriptions())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--changes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    symbols = [f"SYM{index}USDT" for index in range(args.symbols)]
+    with tempfile.TemporaryDirectory() as directory:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+            directory, "bench.sqlite3"
+        )
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            seed(args.tasks, symbols, rng)
+
+            tracker = ChangeTracker()
+            tracker.start()
+            engine = PriceAlertEngine.from_database()
+            sync = EngineSync(engine, tracker)
+            print(f"tasks loaded      : {len(engine)}")
+
+            for count in args.changes:
+                make_changes(count, symbols, rng)
+
+                started = time.perf_counter()
+                applied = sync.sync()
+                incremental = time.perf_counter() - started
+
+                started = time.perf_counter()
+                fresh = PriceAlertEngine.from_database()
+                full = time.perf_counter() - started
+
+                assert snapshot(engine) == snapshot(fresh), "engines diverged"
+                print(
+                    f"changes={count:<6} applied={applied:<6} "
+                    f"incremental={incremental * 1000:8.1f} ms  "
+                    f"full reload={full * 1000:8.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
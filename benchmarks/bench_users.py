@@ -0,0 +1,125 @@
+"""Admin user listing: one big JSON body vs keyset pages vs the NDJSON export.
+
+    python benchmarks/bench_users.py --users 200000
+
+Peak memory is what tracemalloc sees Python allocate while serving the request,
+measured in a second run so tracing doesn't skew the timings.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from flask import jsonify  # noqa: E402
+from flask_login import FlaskLoginClient  # noqa: E402
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import User  # noqa: E402
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix="bench-users-"), "db.sqlite3")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + DATABASE
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def seed(count, batch=50_000):
+    db.create_all()
+    for offset in range(0, count, batch):
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "first_name": "First",
+                    "last_name": f"Last{index}",
+                    "username": f"user{index}",
+                    "email": f"user{index}@example.com",
+                    "biography": "x" * 200,
+                    "house_address": f"{index} Some Street",
+                    "password": b"\0" * 64,
+                    "is_active": True,
+                    "is_admin": index == 0,
+                }
+                for index in range(offset, min(offset + batch, count))
+            ],
+        )
+    db.session.commit()
+
+
+def measure(function):
+    started = time.perf_counter()
+    size = function()
+    elapsed = time.perf_counter() - started
+    # Tracing slows every allocation down, so memory gets a run of its own
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def report(label, elapsed, peak, size):
+    print(
+        f"{label:<22}: {elapsed * 1000:9.1f} ms  peak {peak / 2**20:7.1f} MiB"
+        f"  body {size / 2**20:7.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    app.test_client_class = FlaskLoginClient
+    try:
+        with app.app_context():
+            seed(args.users)
+            admin = db.session.get(User, 1)
+        client = app.test_client(user=admin)
+
+        def load_all():
+            # What /all-user used to do
+            with app.test_request_context():
+                users = User.query.all()
+                body = jsonify(
+                    {"data": [user.format() for user in users], "total": len(users)}
+                ).get_data()
+                db.session.remove()
+            return len(body)
+
+        def first_page():
+            return len(client.get(f"/all-user?limit={args.limit}").get_data())
+
+        def deep_page():
+            after = args.users - args.limit * 2
+            return len(
+                client.get(f"/all-user?limit={args.limit}&after={after}").get_data()
+            )
+
+        def export():
+            response = client.get("/all-user?format=ndjson", buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            return size
+
+        report("load all (before)", *measure(load_all))
+        report(f"first page ({args.limit})", *measure(first_page))
+        report("page near the end", *measure(deep_page))
+        report("ndjson export", *measure(export))
+    finally:
+        os.remove(DATABASE)
+
+
+if __name__ == "__main__":
+    main()
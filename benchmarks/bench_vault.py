@@ -0,0 +1,61 @@
+"""Credential vault cost: decrypting per poll vs cached vs bulk preload.
+
+python benchmarks/bench_vault.py --accounts 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps.home.vault import CredentialVault  # noqa: E402
+from apps.home.vault import decrypt_secret, encrypt_secret  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--polls", type=int, default=10, help="polls per account")
+    args = parser.parse_args()
+
+    sealed = [
+        (
+            index,
+            (
+                encrypt_secret(f"api-key-{index:058d}"),
+                encrypt_secret(f"secret-{index:057d}"),
+                encrypt_secret("passphrase"),
+            ),
+        )
+        for index in range(args.accounts)
+    ]
+    polls = args.accounts * args.polls
+
+    started = time.perf_counter()
+    for _ in range(args.polls):
+        for _, values in sealed:
+            [decrypt_secret(value) for value in values]
+    uncached = time.perf_counter() - started
+
+    vault = CredentialVault(max_size=args.accounts)
+    started = time.perf_counter()
+    vault.preload(sealed)
+    preload = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.polls):
+        for account_id, values in sealed:
+            vault.get(account_id, values)
+    cached = time.perf_counter() - started
+
+    print(f"decrypt per poll  : {uncached * 1e6 / polls:8.1f} us/poll")
+    print(f"vault hit         : {cached * 1e6 / polls:8.1f} us/poll")
+    print(f"preload           : {preload * 1000:8.1f} ms for {args.accounts} accounts")
+    print(f"hits / misses     : {vault.hits} / {vault.misses}")
+
+
+if __name__ == "__main__":
+    main()
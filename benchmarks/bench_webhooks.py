@@ -0,0 +1,180 @@
+"""Stripe webhook ingestion and batched order updates.
+
+    python benchmarks/bench_webhooks.py --orders 5000 --duplicates 0.2
+
+Signed checkout.session.completed events, some of them redelivered, are posted
+concurrently to /stripe/webhook. The queue is then drained once in batches and
+once an event per transaction, which is what the success page used to do.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+SECRET = os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import Order, StripeEvent, User  # noqa: E402
+from apps.home.webhooks import WebhookWorker  # noqa: E402
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix="bench-webhooks-"), "db.sqlite3")
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + DATABASE
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+
+
+def seed(orders):
+    db.create_all()
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "first_name": "Bench",
+                "last_name": "User",
+                "username": "bench",
+                "email": "bench@example.com",
+                "biography": "",
+                "password": b"",
+                "is_active": True,
+                "is_admin": False,
+            }
+        ],
+    )
+    db.session.execute(
+        db.insert(Order),
+        [
+            {
+                "user_id": 1,
+                "order_date": datetime.utcnow(),
+                "total_price": 10,
+                "payment_status": False,
+            }
+            for _ in range(orders)
+        ],
+    )
+    db.session.commit()
+
+
+def signed_event(event_id, order_id):
+    payload = json.dumps(
+        {
+            "id": event_id,
+            "object": "event",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "id": f"cs_test_{order_id}",
+                    "object": "checkout.session",
+                    "client_reference_id": str(order_id),
+                    "payment_status": "paid",
+                }
+            },
+        }
+    )
+    timestamp = int(time.time())
+    signature = hmac.new(
+        SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return payload, f"t={timestamp},v1={signature}"
+
+
+def deliver(app, deliveries, concurrency):
+    samples = []
+    statuses = []
+    chunks = [deliveries[index::concurrency] for index in range(concurrency)]
+
+    def worker(chunk):
+        client = app.test_client()
+        for payload, signature in chunk:
+            started = time.perf_counter()
+            response = client.post(
+                "/stripe/webhook",
+                data=payload,
+                headers={"Stripe-Signature": signature},
+                content_type="application/json",
+            )
+            samples.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, samples, statuses
+
+
+def drain(batch_size):
+    db.session.execute(db.update(StripeEvent).values(status="pending"))
+    db.session.execute(db.update(Order).values(payment_status=False))
+    db.session.commit()
+    worker = WebhookWorker(batch_size=batch_size)
+    started = time.perf_counter()
+    while worker.run_once():
+        pass
+    return time.perf_counter() - started, worker.applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    try:
+        with app.app_context():
+            seed(args.orders)
+        deliveries = [
+            signed_event(f"evt_{order_id}", order_id)
+            for order_id in range(1, args.orders + 1)
+        ]
+        # Stripe redelivers on timeouts, the copies carry the same event id
+        deliveries += random.sample(deliveries, int(len(deliveries) * args.duplicates))
+        random.shuffle(deliveries)
+        deliveries.append((deliveries[0][0], "t=1,v1=forged"))
+
+        elapsed, samples, statuses = deliver(app, deliveries, args.concurrency)
+        with app.app_context():
+            queued = db.session.scalar(db.select(db.func.count(StripeEvent.id)))
+            batched, applied = drain(args.batch)
+            single, _ = drain(1)
+    finally:
+        os.remove(DATABASE)
+
+    samples.sort()
+    print(f"deliveries        : {len(deliveries)} ({statuses.count(400)} rejected)")
+    print(f"ingest            : {len(samples) / elapsed:8.0f} events/s")
+    print(f"ingest latency    : p50 {statistics.median(samples) * 1000:6.2f} ms")
+    print(
+        f"                    p95 {samples[int(len(samples) * 0.95) - 1] * 1000:6.2f} ms"
+    )
+    print(
+        f"queued            : {queued} (duplicates dropped: {len(deliveries) - 1 - queued})"
+    )
+    print(
+        f"apply, batch {args.batch:<4} : {queued / batched:8.0f} events/s ({applied} orders paid)"
+    )
+    print(f"apply, one by one : {queued / single:8.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
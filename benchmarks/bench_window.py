@@ -0,0 +1,128 @@
+"""Per-symbol detector benchmark: naive per-task scan vs monotonic vs NumPy.
+
+    python benchmarks/bench_window.py --tasks 1000 5000 20000
+
+All the tasks watch the same symbol, which is the case the vectorized book is
+built for: thousands of thresholds checked against every tick.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps.monitor.engine import (  # noqa: E402
+    DIRECTION_DOWN,
+    DIRECTION_UP,
+    PriceAlertEngine,
+    TaskSpec,
+)
+from apps.monitor.window import VectorizedSymbolBook  # noqa: E402
+
+WINDOWS_MS = (1_000, 5_000, 30_000, 60_000, 300_000)
+DIRECTIONS = ("up", "down", None)
+
+
+def make_tasks(count, rng):
+    return [
+        TaskSpec(
+            id=task_id,
+            user_id=task_id,
+            exchange="binance",
+            symbols="BTCUSDT",
+            percentage=rng.randint(1, 10),
+            direction=rng.choice(DIRECTIONS),
+            time_ms=rng.choice(WINDOWS_MS),
+        )
+        for task_id in range(1, count + 1)
+    ]
+
+
+def make_prices(count, rng, volatility):
+    price = 40_000.0
+    ts_ms = 1_700_000_000_000
+    prices = []
+    for _ in range(count):
+        ts_ms += rng.randint(1, 50)
+        price *= 1 + rng.gauss(0, volatility)
+        prices.append((ts_ms, price))
+    return prices
+
+
+def run_naive(tasks, prices):
+    """Every task rescans its own window on every tick."""
+    history = deque()
+    max_span = max(task.time_ms for task in tasks)
+    alerts = 0
+    for ts_ms, price in prices:
+        history.append((ts_ms, price))
+        while history[0][0] < ts_ms - max_span:
+            history.popleft()
+        for task in tasks:
+            cutoff = ts_ms - task.time_ms
+            window = [value for stamp, value in history if stamp >= cutoff]
+            low, high = min(window), max(window)
+            for direction, move in (
+                (DIRECTION_UP, (price - low) * 100.0 / low),
+                (DIRECTION_DOWN, (high - price) * 100.0 / high),
+            ):
+                if task.direction not in (direction, "both"):
+                    continue
+                if move >= task.percentage and task.muted_until <= ts_ms:
+                    task.muted_until = ts_ms + task.time_ms
+                    alerts += 1
+    return alerts
+
+
+def run_engine(tasks, prices, book_factory=None):
+    engine = PriceAlertEngine(tasks, book_factory=book_factory)
+    alerts = 0
+    for ts_ms, price in prices:
+        alerts += len(engine.process("binance", "BTCUSDT", ts_ms, price))
+    return alerts
+
+
+def timed(label, tasks, prices, run):
+    started = time.perf_counter()
+    alerts = run(tasks, prices)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<12} tasks={len(tasks):<7} ticks={len(prices):<7} "
+        f"alerts={alerts:<7} {elapsed * 1e6 / len(prices):10.1f} us/tick"
+    )
+
+
+def run_vectorized(tasks, prices):
+    return run_engine(tasks, prices, VectorizedSymbolBook)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--ticks", type=int, default=20_000)
+    parser.add_argument(
+        "--naive-ticks",
+        type=int,
+        default=100,
+        help="the naive scan is quadratic, so it only sees a prefix of the ticks",
+    )
+    parser.add_argument("--volatility", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    prices = make_prices(args.ticks, random.Random(args.seed), args.volatility)
+    for task_count in args.tasks:
+        for label, run, ticks in (
+            ("naive", run_naive, prices[: args.naive_ticks]),
+            ("monotonic", run_engine, prices),
+            ("vectorized", run_vectorized, prices),
+        ):
+            timed(label, make_tasks(task_count, random.Random(args.seed)), ticks, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""tables added before migrations
+
+Everything the models gained between the original schema and the first
+migration: the notification queue, change log, Stripe events, products,
+normalized task symbols, order item products and wider encrypted credentials.
+
+Revision ID: 1c6cbefa9b5e
+Revises: 72b5a7ff76f6
+Create Date: 2026-10-18 05:00:31.204117
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "1c6cbefa9b5e"
+down_revision = "72b5a7ff76f6"
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_task_symbols(connection):
+    """One jd_pricing_task_symbols row per symbol packed into a task's column.
+
+    Also rewrites the packed column in the canonical form the models keep it
+    in, upper case and without duplicates.
+    """
+    tasks = sa.table(
+        "jd_pricing_tasks",
+        sa.column("id"),
+        sa.column("exchange"),
+        sa.column("trade_type"),
+        sa.column("symbols"),
+    )
+    task_symbols = sa.table(
+        "jd_pricing_task_symbols",
+        sa.column("task_id"),
+        sa.column("exchange"),
+        sa.column("trade_type"),
+        sa.column("symbol"),
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(tasks)
+            .where(tasks.c.id > last_id)
+            .order_by(tasks.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        symbol_rows = []
+        for task in rows:
+            # The same split as apps.monitor.engine.parse_symbols
+            symbols = dict.fromkeys(
+                symbol.strip().upper()
+                for symbol in (task.symbols or "").split(",")
+                if symbol.strip()
+            )
+            packed = ",".join(symbols)
+            if task.symbols != packed:
+                connection.execute(
+                    tasks.update().where(tasks.c.id == task.id).values(symbols=packed)
+                )
+            symbol_rows.extend(
+                {
+                    "task_id": task.id,
+                    "exchange": task.exchange.strip().lower(),
+                    "trade_type": task.trade_type or "spot",
+                    "symbol": symbol,
+                }
+                for symbol in symbols
+            )
+        if symbol_rows:
+            connection.execute(task_symbols.insert(), symbol_rows)
+
+
+def convert_credentials(connection, encrypt):
+    """Encrypt the plain text account credentials, or decrypt them back.
+
+    Values already in the wanted form are left alone, so a half finished run
+    can simply be repeated.
+    """
+    from apps.home.vault import decrypt_secret, encrypt_secret, is_encrypted
+
+    columns = ("api_key", "secret_key", "passphrase")
+    accounts = sa.table(
+        "jd_monitor_accounts", sa.column("ID"), *(sa.column(c) for c in columns)
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(accounts)
+            .where(accounts.c.ID > last_id)
+            .order_by(accounts.c.ID)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].ID
+        for row in rows:
+            values = {}
+            for column in columns:
+                value = getattr(row, column)
+                if value is None or is_encrypted(value) == encrypt:
+                    continue
+                if encrypt:
+                    values[column] = encrypt_secret(value)
+                else:
+                    values[column] = decrypt_secret(value).decode()
+            if values:
+                connection.execute(
+                    accounts.update().where(accounts.c.ID == row.ID).values(**values)
+                )
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        "jd_change_log",
+        sa.Column("seq", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("table_name", sa.String(length=64), nullable=False),
+        sa.Column("row_id", sa.Integer(), nullable=False),
+        sa.Column("date_created", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("seq"),
+        sqlite_autoincrement=True,
+    )
+    with op.batch_alter_table("jd_change_log", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_jd_change_log_date_created", ["date_created"], unique=False
+        )
+
+    op.create_table(
+        "jd_products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=128), nullable=False),
+        sa.Column("price", sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "jd_stripe_events",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("event_id", sa.String(length=255), nullable=False),
+        sa.Column("event_type", sa.String(length=64), nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("date_created", sa.DateTime(), nullable=False),
+        sa.Column("date_applied", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("jd_stripe_events", schema=None) as batch_op:
+        batch_op.create_index("ix_jd_stripe_events_event_id", ["event_id"], unique=True)
+        batch_op.create_index(
+            "ix_jd_stripe_events_status", ["status", "id"], unique=False
+        )
+
+    op.create_table(
+        "jd_notifications",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("recipient", sa.String(length=128), nullable=False),
+        sa.Column("subject", sa.String(length=256), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("html", sa.Text(), nullable=True),
+        sa.Column("reply_to", sa.String(length=128), nullable=True),
+        sa.Column("coalesce_key", sa.String(length=64), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(length=256), nullable=True),
+        sa.Column("claimed_by", sa.String(length=64), nullable=True),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.Column("date_created", sa.DateTime(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("date_sent", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["jd_users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("jd_notifications", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_jd_notifications_due", ["status", "next_attempt_at"], unique=False
+        )
+
+    op.create_table(
+        "jd_pricing_task_symbols",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("exchange", sa.String(length=16), nullable=False),
+        sa.Column("trade_type", sa.String(length=16), nullable=False),
+        sa.Column("symbol", sa.String(length=32), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["task_id"], ["jd_pricing_tasks.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("task_id", "symbol", name="pts_unique_constraint"),
+    )
+    with op.batch_alter_table("jd_pricing_task_symbols", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_jd_pricing_task_symbols_market",
+            ["exchange", "trade_type", "symbol"],
+            unique=False,
+        )
+        batch_op.create_index(
+            batch_op.f("ix_jd_pricing_task_symbols_task_id"), ["task_id"], unique=False
+        )
+
+    with op.batch_alter_table("jd_monitor_accounts", schema=None) as batch_op:
+        batch_op.alter_column(
+            "api_key",
+            existing_type=sa.VARCHAR(length=256),
+            type_=sa.String(length=512),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "secret_key",
+            existing_type=sa.VARCHAR(length=256),
+            type_=sa.String(length=512),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "passphrase",
+            existing_type=sa.VARCHAR(length=128),
+            type_=sa.String(length=256),
+            existing_nullable=False,
+        )
+
+    with op.batch_alter_table("jd_order_items", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("product_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_jd_order_items_product_id", "jd_products", ["product_id"], ["id"]
+        )
+
+    # ### end Alembic commands ###
+
+    # Tasks created before the table existed, the monitor only reads symbols here
+    backfill_task_symbols(op.get_bind())
+    # The vault only reads encrypted credentials, the columns were widened for them
+    convert_credentials(op.get_bind(), encrypt=True)
+
+
+def downgrade():
+    # Back to plain text before the columns narrow, as the code of that time
+    # expects
+    convert_credentials(op.get_bind(), encrypt=False)
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table("jd_order_items", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_jd_order_items_product_id", type_="foreignkey")
+        batch_op.drop_column("product_id")
+
+    with op.batch_alter_table("jd_monitor_accounts", schema=None) as batch_op:
+        batch_op.alter_column(
+            "passphrase",
+            existing_type=sa.String(length=256),
+            type_=sa.VARCHAR(length=128),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "secret_key",
+            existing_type=sa.String(length=512),
+            type_=sa.VARCHAR(length=256),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "api_key",
+            existing_type=sa.String(length=512),
+            type_=sa.VARCHAR(length=256),
+            existing_nullable=False,
+        )
+
+    with op.batch_alter_table("jd_pricing_task_symbols", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_jd_pricing_task_symbols_task_id"))
+        batch_op.drop_index("ix_jd_pricing_task_symbols_market")
+
+    op.drop_table("jd_pricing_task_symbols")
+    with op.batch_alter_table("jd_notifications", schema=None) as batch_op:
+        batch_op.drop_index("ix_jd_notifications_due")
+
+    op.drop_table("jd_notifications")
+    with op.batch_alter_table("jd_stripe_events", schema=None) as batch_op:
+        batch_op.drop_index("ix_jd_stripe_events_status")
+        batch_op.drop_index("ix_jd_stripe_events_event_id")
+
+    op.drop_table("jd_stripe_events")
+    op.drop_table("jd_products")
+    with op.batch_alter_table("jd_change_log", schema=None) as batch_op:
+        batch_op.drop_index("ix_jd_change_log_date_created")
+
+    op.drop_table("jd_change_log")
+    # ### end Alembic commands ###
@@ -0,0 +1,63 @@
+"""lower-cased usernames
+
+Revision ID: 4b502cebf100
+Revises: 8fda12fbf4e6
+Create Date: 2026-10-18 05:07:32.040843
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "4b502cebf100"
+down_revision = "8fda12fbf4e6"
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    with op.batch_alter_table("jd_users", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("username_lower", sa.String(length=128), nullable=True)
+        )
+
+    # Lower-cased in Python, as the app does, SQLite's lower() only knows ASCII
+    users = sa.table(
+        "jd_users", sa.column("id"), sa.column("username"), sa.column("username_lower")
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(users.c.id, users.c.username)
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            users.update()
+            .where(users.c.id == sa.bindparam("user_id"))
+            .values(username_lower=sa.bindparam("lower")),
+            [{"user_id": row.id, "lower": row.username.lower()} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table("jd_users", schema=None) as batch_op:
+        batch_op.alter_column(
+            "username_lower", existing_type=sa.String(length=128), nullable=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_jd_users_username_lower"), ["username_lower"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("jd_users", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_jd_users_username_lower"))
+        batch_op.drop_column("username_lower")
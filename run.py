@@ -28,7 +28,14 @@ app = create_app(app_config)
 Migrate(app, db)
 
 if not DEBUG:
-    Minify(app=app, html=True, js=False, cssless=False)
+    # The catch-all pages are minified once, when apps.home.pages caches them
+    Minify(
+        app=app,
+        html=True,
+        js=False,
+        cssless=False,
+        bypass=["home_blueprint.templates"],
+    )
 
 if DEBUG:
     app.logger.info("DEBUG            = " + str(DEBUG))
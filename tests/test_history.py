@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from apps.monitor import history
+from apps.monitor.history import HOUR_MS, MINUTE_MS, PriceHistoryStore
+
+START = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+
+
+@pytest.fixture
+def writer(tmp_path):
+    store = PriceHistoryStore(str(tmp_path))
+    # One tick a minute for twelve hours, twelve tick segments
+    stamps = START + np.arange(12 * 60) * MINUTE_MS
+    store.extend("binance", "BTCUSDT", stamps, np.linspace(100, 200, len(stamps)))
+    store.flush()
+    return store
+
+
+def open_starts(store, exchange="binance", symbol="BTCUSDT"):
+    return set(store._symbols[(exchange, symbol)].ticks._open)
+
+
+def test_reader_keeps_a_bounded_number_of_segments_mapped(writer):
+    reader = PriceHistoryStore(writer.root, readonly=True)
+    data = reader.query("binance", "BTCUSDT", START, START + 12 * HOUR_MS, "tick")
+    assert len(data["ts"]) == 12 * 60
+    assert len(open_starts(reader)) <= history.HISTORY_OPEN_SEGMENTS
+
+
+def test_reader_unmaps_segments_the_writer_pruned(writer, monkeypatch):
+    reader = PriceHistoryStore(writer.root, readonly=True)
+    reader.query("binance", "BTCUSDT", START, START + 3 * HOUR_MS, "tick")
+    assert START in open_starts(reader)
+
+    monkeypatch.setitem(history.RETENTION_DAYS, "tick", 2 / 24)
+    assert writer.prune(START + 12 * HOUR_MS) > 0
+    reader.query(
+        "binance", "BTCUSDT", START + 11 * HOUR_MS, START + 12 * HOUR_MS, "tick"
+    )
+    starts = set(reader._symbols[("binance", "BTCUSDT")].ticks.starts)
+    assert START not in starts
+    assert open_starts(reader) <= starts
+
+
+def test_reader_keeps_a_bounded_number_of_symbols(writer, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_READER_SYMBOLS", 2)
+    for symbol in ("ETHUSDT", "SOLUSDT"):
+        writer.extend("binance", symbol, [START], [1.0])
+    writer.flush()
+    reader = PriceHistoryStore(writer.root, readonly=True)
+    for symbol in ("BTCUSDT", "ETHUSDT", "SOLUSDT"):
+        reader.query("binance", symbol, START, START + HOUR_MS, "tick")
+    assert list(reader._symbols) == [("binance", "ETHUSDT"), ("binance", "SOLUSDT")]
+
+
+@pytest.mark.parametrize(
+    "exchange, symbol",
+    [("binance", "../../etc"), ("..", "BTCUSDT"), ("binance", "BTC/USDT"), ("", "X")],
+)
+def test_query_rejects_names_that_are_not_plain(writer, exchange, symbol):
+    reader = PriceHistoryStore(writer.root, readonly=True)
+    with pytest.raises(ValueError):
+        reader.query(exchange, symbol, START, START + HOUR_MS, "tick")
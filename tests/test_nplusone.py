@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home.models import Order, OrderItem, Product, User  # noqa: E402
+from apps.home.nplusone import NPlusOneError, nplusone_detector  # noqa: E402
+
+LIMIT = 3
+ORDERS = 10
+
+
+class NPlusOneConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+    WTF_CSRF_ENABLED = False
+    DB_WARMUP = False
+    PAGE_CACHE = False
+    NPLUSONE_LIMIT = LIMIT
+
+
+@pytest.fixture
+def app():
+    app = create_app(NPlusOneConfig)
+
+    # The order page's loop without Order.of_user, one query per order and item
+    @app.route("/lazy-orders")
+    def lazy_orders():
+        orders = Order.query.filter_by(user_id=1).all()
+        return str(sum(len(i.product.name) for o in orders for i in o.order_items))
+
+    with app.app_context():
+        db.create_all()
+        user = User("First", "Last", "buyer", "buyer@example.com", "password")
+        user.biography = ""
+        db.session.add(user)
+        db.session.add_all(Product(f"Product {i}", 5) for i in range(ORDERS))
+        db.session.flush()
+        for i in range(ORDERS):
+            order = Order(user.id, datetime(2023, 1, 1) + timedelta(hours=i), 10)
+            order.order_items = [OrderItem(None, 1, 5, i + 1), OrderItem(None, 1, 5, 1)]
+            db.session.add(order)
+        db.session.commit()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post("/login", data={"username": "buyer", "password": "password"})
+    return client
+
+
+def test_lazy_loading_fails_the_request(client):
+    with pytest.raises(NPlusOneError):
+        client.get("/lazy-orders")
+
+
+def test_lazy_loading_fails_a_watch_block(app):
+    db.session.expunge_all()
+    with pytest.raises(NPlusOneError):
+        with nplusone_detector.watch(limit=LIMIT):
+            for order in Order.query.filter_by(user_id=1).all():
+                [item.product.name for item in order.order_items]
+
+
+def test_of_user_stays_under_the_limit(app):
+    db.session.expunge_all()
+    with nplusone_detector.watch(limit=LIMIT) as counts:
+        orders = Order.of_user(1)
+        names = [item.product.name for order in orders for item in order.order_items]
+    assert len(names) == 2 * ORDERS
+    assert sum(counts.values()) == 3
+
+
+def test_orders_page_stays_under_the_limit(client):
+    response = client.get("/orders")
+    assert response.status_code == 200
+    assert b"Product 9" in response.data
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("FERNET_KEY", "2pU7bcu2OGQQXwElTRXhQy0Zk6mkbZDzAAnpOF4qSOA=")
+
+from apps import create_app, db  # noqa: E402
+from apps.config import Config  # noqa: E402
+from apps.home import webhooks  # noqa: E402
+from apps.home.models import StripeEvent  # noqa: E402
+
+PAYLOAD = json.dumps(
+    {
+        "id": "evt_forged",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {"client_reference_id": "1", "payment_status": "paid"}},
+    }
+)
+
+
+class WebhookConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    NOTIFICATION_WORKER = False
+    WEBHOOK_WORKER = False
+    DB_WARMUP = False
+
+
+def signature(secret, payload=PAYLOAD):
+    timestamp = int(time.time())
+    signed = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signed}"
+
+
+@pytest.fixture
+def app():
+    app = create_app(WebhookConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def post(app, secret):
+    return app.test_client().post(
+        "/stripe/webhook",
+        data=PAYLOAD,
+        headers={"Stripe-Signature": signature(secret)},
+        content_type="application/json",
+    )
+
+
+def queued():
+    return db.session.scalar(db.select(db.func.count()).select_from(StripeEvent))
+
+
+@pytest.mark.parametrize("configured", ["", None])
+def test_no_secret_rejects_a_self_signed_event(app, monkeypatch, configured):
+    monkeypatch.setattr(webhooks, "STRIPE_WEBHOOK_SECRET", configured)
+    assert post(app, "").status_code == 503
+    assert queued() == 0
+
+
+def test_configured_secret_verifies_events(app, monkeypatch):
+    monkeypatch.setattr(webhooks, "STRIPE_WEBHOOK_SECRET", "whsec_test")
+    assert post(app, "").status_code == 400
+    assert queued() == 0
+    assert post(app, "whsec_test").status_code == 200
+    assert queued() == 1